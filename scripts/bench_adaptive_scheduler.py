@@ -0,0 +1,124 @@
+import argparse
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from scheduler import AdaptiveScheduler
+
+# Simulated detection latency of STREAM_START/STREAM_END for round-robin vs AdaptiveScheduler
+# under the same request budget (one request every interval / channels seconds).
+#
+# Channel mix: regular streamers (daily at a fixed hour, most with a reservation posted
+# a few hours ahead), occasional streamers (random days and hours) and dormant channels.
+
+DAY = 86400
+
+def make_timeline(kind, days, rng):
+    """Returns (streams, reservations): [(start, end)] and [(posted_at, start_ts)]."""
+    streams, reservations = [], []
+    hour = rng.randrange(24)
+    reserves = rng.random() < 0.7
+    for day in range(days):
+        if kind == "regular" and rng.random() < 0.8:
+            start = day * DAY + hour * 3600 + rng.randint(-900, 900)
+            if reserves:
+                reservations.append((start - 6 * 3600, start - start % 1800))
+        elif kind == "occasional" and rng.random() < 0.15:
+            start = day * DAY + rng.randrange(DAY)
+        else:
+            continue
+        start = max(start, 1)
+        streams.append((start, start + rng.randint(3600, 3 * 3600)))
+    return streams, reservations
+
+def simulate(mode, timelines, interval, days):
+    channels = len(timelines)
+    step = interval / channels
+    scheduler = AdaptiveScheduler(list(range(channels)), interval=interval) if mode == "adaptive" else None
+    if scheduler:
+        for activity in scheduler._activity.values():
+            activity['last_active'] = 0
+
+    # flatten transitions per channel: (ts, live)
+    transitions = [[(s, True) for s, _ in t[0]] + [(e, False) for _, e in t[0]] for t in timelines]
+    for tr in transitions:
+        tr.sort()
+    cursor = [0] * channels
+    known = [False] * channels
+    reservations = sorted((posted, uid, start) for uid, t in enumerate(timelines) for posted, start in t[1])
+    next_res = 0
+
+    latencies = {True: [], False: []}
+    missed = 0
+    rr_index = 0
+    now = 0.0
+    end = days * DAY
+    while now < end:
+        # the announcement poller would have picked these up
+        while next_res < len(reservations) and reservations[next_res][0] <= now:
+            _, uid, start_ts = reservations[next_res]
+            if scheduler:
+                scheduler.observe({'event_type': 'RESERVATION', 'uid': uid, 'details': {'start_ts': start_ts}}, now=now)
+            next_res += 1
+
+        if scheduler:
+            uid = scheduler.pop_batch(1, now)[0]
+        else:
+            uid = rr_index
+            rr_index = (rr_index + 1) % channels
+
+        tr = transitions[uid]
+        changed_at = None
+        state = known[uid]
+        while cursor[uid] < len(tr) and tr[cursor[uid]][0] <= now:
+            ts, state = tr[cursor[uid]]
+            if changed_at is not None:
+                missed += 1
+            changed_at = ts
+            cursor[uid] += 1
+
+        if changed_at is not None:
+            if state != known[uid]:
+                latencies[state].append(now - changed_at)
+                known[uid] = state
+                if scheduler:
+                    event_type = 'STREAM_START' if state else 'STREAM_END'
+                    scheduler.observe({'event_type': event_type, 'uid': uid, 'timestamp': now}, now=now)
+            else:
+                missed += 1
+        now += step
+
+    return latencies, missed
+
+def summary(values):
+    if not values:
+        return "n/a"
+    values = sorted(values)
+    p95 = values[int(len(values) * 0.95)]
+    return f"mean {statistics.mean(values):6.0f}s  p50 {statistics.median(values):6.0f}s  p95 {p95:6.0f}s"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=300)
+    parser.add_argument("--interval", type=int, default=300)
+    parser.add_argument("--days", type=int, default=14)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    kinds = rng.choices(["regular", "occasional", "dormant"], weights=[2, 4, 4], k=args.channels)
+    timelines = [make_timeline(kind, args.days, rng) for kind in kinds]
+
+    budget = args.channels / args.interval
+    print(f"{args.channels} channels, {args.days} days, budget {budget:.2f} req/s")
+    for mode in ("round-robin", "adaptive"):
+        latencies, missed = simulate(mode, timelines, args.interval, args.days)
+        print(f"  {mode}")
+        print(f"    STREAM_START {summary(latencies[True])}")
+        print(f"    STREAM_END   {summary(latencies[False])}")
+        print(f"    missed transitions: {missed}")
+
+if __name__ == "__main__":
+    main()
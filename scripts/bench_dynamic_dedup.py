@@ -0,0 +1,65 @@
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from seen_dynamics import SeenDynamics
+
+# Compares the old global seen_dynamic_ids set with the per-channel SeenDynamics windows.
+# Memory is measured with sys.getsizeof over the containers and their contents.
+
+def set_size(s):
+    return sys.getsizeof(s) + sum(sys.getsizeof(x) for x in s)
+
+def windows_size(seen):
+    total = sys.getsizeof(seen._recent)
+    for uid, ids in seen._recent.items():
+        total += sys.getsizeof(uid) + sys.getsizeof(ids) + sum(sys.getsizeof(x) for x in ids)
+    return total
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--channels", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--posts-per-day", type=float, default=2.0)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    args = parser.parse_args()
+
+    posts = int(args.days * args.posts_per_day)
+    total = args.channels * posts
+    print(f"Simulating {args.channels} channels x {posts} posts = {total} dynamics")
+
+    # dynamic IDs are a global, increasing sequence shared by all channels
+    base = 900000000000000000
+    seen_set = set()
+    seen = SeenDynamics()
+    next_id = base
+    for day in range(posts):
+        for uid in range(args.channels):
+            next_id += random.randint(1, 1000)
+            seen_set.add(str(next_id))
+            seen.add(uid, next_id)
+
+    print(f"  set():        {set_size(seen_set) / 1e6:9.1f} MB")
+    print(f"  SeenDynamics: {windows_size(seen) / 1e6:9.1f} MB")
+
+    # a poll looks up the ~12 items of the first feed page, mostly already seen
+    probes = [(random.randrange(args.channels), str(next_id - random.randint(0, 10**6))) for _ in range(args.lookups)]
+
+    start = time.perf_counter()
+    for uid, dynamic_id in probes:
+        dynamic_id in seen_set
+    set_ns = (time.perf_counter() - start) / args.lookups * 1e9
+
+    start = time.perf_counter()
+    for uid, dynamic_id in probes:
+        seen.is_new(uid, dynamic_id)
+    window_ns = (time.perf_counter() - start) / args.lookups * 1e9
+
+    print(f"  lookup set():        {set_ns:7.0f} ns")
+    print(f"  lookup SeenDynamics: {window_ns:7.0f} ns")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+import dynamic_parser
+
+# Per-item parse cost of the previous inline parsing in AnnouncementPoller vs dynamic_parser,
+# over recorded get_dynamics_new() items (the debug_dynamics_new.json dumps written by
+# scripts/debug_reservation.py). Falls back to a synthetic feed when no dump is given.
+
+def legacy_parse(item):
+    """The parsing AnnouncementPoller.check_channel did for every item before dynamic_parser."""
+    modules = item.get('modules', {})
+    module_dynamic = modules.get('module_dynamic', {})
+    module_author = modules.get('module_author', {})
+    pub_ts = module_author.get('pub_ts', int(time.time()))
+
+    additional = module_dynamic.get('additional')
+    if additional and additional.get('type') == 'ADDITIONAL_TYPE_RESERVE':
+        reserve = additional.get('reserve')
+        start_ts = reserve.get('stime')
+        desc_text = ""
+        if not start_ts:
+            desc1 = reserve.get('desc1', {}).get('text', '')
+            desc2 = reserve.get('desc2', {}).get('text', '')
+            desc_text = f"{desc1} {desc2}"
+            match = re.search(r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2})', desc_text)
+            if match:
+                dt = datetime.strptime(match.group(1), "%Y-%m-%d %H:%M")
+                start_ts = int(dt.replace(tzinfo=timezone(timedelta(hours=8))).timestamp())
+        return ('RESERVATION', pub_ts, reserve.get('title'), start_ts)
+
+    major = module_dynamic.get('major')
+    if major and major.get('type') == 'MAJOR_TYPE_LIVE_RCMD':
+        content = json.loads(major.get('live_rcmd').get('content', '{}'))
+        return ('ANNOUNCEMENT_LIVE_START', pub_ts, content.get('live_play_info', {}).get('title'), None)
+    return None
+
+def new_parse(item):
+    kind = dynamic_parser.classify(item)
+    if kind is None:
+        return None
+    if kind == dynamic_parser.KIND_RESERVATION:
+        details = dynamic_parser.parse_reservation(item)
+        return ('RESERVATION', dynamic_parser.pub_ts(item), details['title'], details['start_ts'])
+    details = dynamic_parser.parse_live_rcmd(item)
+    return ('ANNOUNCEMENT_LIVE_START', dynamic_parser.pub_ts(item), details['title'], None)
+
+def synthetic_feed(count):
+    items = []
+    for i in range(count):
+        item = {'id_str': str(900000000000000000 + i), 'modules': {
+            'module_author': {'pub_ts': 1714700000 + i, 'name': 'hololive官方', 'mid': 286700005},
+            'module_dynamic': {'desc': {'text': '今天也辛苦了！' * 5}, 'additional': None, 'major': {'type': 'MAJOR_TYPE_DRAW', 'draw': {'items': [{'src': 'x.jpg'}] * 3}}},
+        }}
+        if i % 10 == 3:
+            item['modules']['module_dynamic']['additional'] = {'type': 'ADDITIONAL_TYPE_RESERVE', 'reserve': {
+                'title': f'直播预约：测试 {i}', 'stime': 0, 'stotal': 1234,
+                'desc1': {'text': f'预计2024-05-{i % 28 + 1:02d} 20:00发布'}, 'desc2': {'text': '1234人预约'}}}
+        elif i % 10 == 7:
+            content = json.dumps({'live_play_info': {'title': f'直播中 {i}', 'room_id': 21000000 + i, 'live_status': 1, 'link': 'https://live.bilibili.com/1'}}, ensure_ascii=False)
+            item['modules']['module_dynamic']['major'] = {'type': 'MAJOR_TYPE_LIVE_RCMD', 'live_rcmd': {'content': content}}
+        items.append(item)
+    return items
+
+def load_items(paths):
+    items = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        items.extend(data['items'] if isinstance(data, dict) else data)
+    return items
+
+def bench(fn, items, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) / (rounds * len(items)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("fixtures", nargs="*", help="debug_dynamics_new.json dumps (default: ./debug_dynamics_new.json if present)")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = args.fixtures or [p for p in ["debug_dynamics_new.json"] if os.path.exists(p)]
+    items = load_items(paths) if paths else synthetic_feed(100)
+    print(f"{len(items)} items from {', '.join(paths) if paths else 'synthetic feed'}")
+
+    mismatches = sum(1 for item in items if legacy_parse(item) != new_parse(item))
+    print(f"  results differ on {mismatches} items")
+
+    legacy = bench(legacy_parse, items, args.rounds)
+    new = bench(new_parse, items, args.rounds)
+    print(f"  inline parsing:  {legacy:6.2f} us/item")
+    print(f"  dynamic_parser:  {new:6.2f} us/item  ({legacy / new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import functools
+import json
+import math
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPTS_DIR), "src"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+# End-to-end throughput of main.main() against scripts/fake_bilibili_server.py.
+#
+# Each channel count runs in its own process (main reads TRACKED_UIDS at import) with
+# the fake server in a separate process, so CPU and RSS are those of the service alone.
+# The polling config is shrunk so a live status cycle takes --cycle seconds or as little
+# as the scheduler allows. One row is reported per cycle:
+#   req/s     requests the server received (live status + feed + auxiliary calls)
+#   events/s  events that reached the sinks
+#   cpu       CPU time of the service per wall second
+#   rss       resident memory at the end of the cycle
+#
+# Example: python scripts/bench_end_to_end.py --uids 10 1000 10000 --cycles 3
+# A scenario file for the server (see fake_bilibili_server.py) adds 412 bursts or latency.
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def cpu_seconds():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+def server_stats(url):
+    with urllib.request.urlopen(f"{url}/_stats") as resp:
+        return json.load(resp)
+
+class CountingSink:
+    def __init__(self):
+        self.count = 0
+
+    async def start(self):
+        pass
+
+    async def send(self, event):
+        self.count += 1
+
+    async def close(self):
+        pass
+
+def cycle_length(count, args):
+    # the schedulers sleep at least 0.1s per batch
+    batches = math.ceil(count / args.batch_size)
+    return args.cycle or max(5.0, batches * 0.1 * 1.2)
+
+async def run_service(args):
+    """Child process: runs main.main() for a number of cycles and prints a JSON line per cycle."""
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+    os.environ["TRACKED_UIDS"] = ",".join(str(100000 + i) for i in range(args.count))
+    os.environ.setdefault("SESSDATA", "fake-sessdata")
+    os.environ.setdefault("BILI_JCT", "fake-bili-jct")
+    os.environ.setdefault("DEDEUSERID", "1")
+
+    from bilibili_api import request_settings
+    from fake_bilibili_server import install_client
+    from scheduler import GlobalRateLimiter
+
+    # AuthManager.setup() selects "curl_cffi" by name, which now points at the fake server
+    install_client(args.server)
+    request_settings.set_enable_auto_buvid(False)
+
+    # the service still logs as usual (records are queued and formatted by the logging thread), but its
+    # stdout goes nowhere instead of being piped to the parent
+    sys.stdout = open(os.devnull, "w")
+    import main
+
+    cycle = cycle_length(args.count, args)
+    main.TARGET_CYCLE_INTERVAL = cycle
+    main.ANNOUNCEMENT_CYCLE_INTERVAL = cycle
+    main.MIN_REQUEST_DELAY = args.min_delay
+    main.JITTER = 0
+    main.LIVE_BATCH_SIZE = args.batch_size
+    main.ADAPTIVE_LIVE_SCHEDULING = args.adaptive
+    main.PUSH_MAX_CONNECTIONS = 0
+    main.STATE_DB = os.path.join(workdir, "state.db")
+    main.event_writer.path = os.path.join(workdir, f"stream_events.{main.EVENT_FORMAT}")
+    if main.event_writer.index:
+        main.event_writer.index.log_path = main.event_writer.path
+    main.event_writer.encoder.raw_store.path = os.path.join(workdir, "raw")
+    main.GlobalRateLimiter = functools.partial(GlobalRateLimiter, backoff_base=args.backoff_base, backoff_max=args.backoff_base * 4)
+    counter = CountingSink()
+    main.sinks.sinks.append(counter)
+
+    service = asyncio.create_task(main.main())
+    last_stats = await asyncio.to_thread(server_stats, args.server)
+    last_events, last_cpu, last_time = 0, cpu_seconds(), time.perf_counter()
+    try:
+        for index in range(args.cycles):
+            await asyncio.sleep(cycle)
+            if service.done():
+                service.result()
+                break
+            stats = await asyncio.to_thread(server_stats, args.server)
+            now, cpu = time.perf_counter(), cpu_seconds()
+            elapsed = now - last_time
+            row = {
+                "cycle": index + 1,
+                "seconds": elapsed,
+                "req_per_s": (stats["requests"] - last_stats["requests"]) / elapsed,
+                "errors": stats["errors"] - last_stats["errors"],
+                "events_per_s": (counter.count - last_events) / elapsed,
+                "cpu": (cpu - last_cpu) / elapsed,
+                "rss_mb": rss_mb(),
+            }
+            sys.__stdout__.write(json.dumps(row) + "\n")
+            sys.__stdout__.flush()
+            last_stats, last_events, last_cpu, last_time = stats, counter.count, cpu, now
+    finally:
+        service.cancel()
+        await asyncio.gather(service, return_exceptions=True)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def run_size(count, args):
+    server = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIR, "fake_bilibili_server.py"), "serve"]
+                              + (["--scenario", args.scenario] if args.scenario else []),
+                              stdout=subprocess.PIPE, text=True)
+    try:
+        url = server.stdout.readline().strip()
+        child = [sys.executable, os.path.abspath(__file__), "--child", "--count", str(count), "--server", url,
+                 "--cycles", str(args.cycles), "--batch-size", str(args.batch_size), "--min-delay", str(args.min_delay),
+                 "--backoff-base", str(args.backoff_base)]
+        if args.cycle:
+            child += ["--cycle", str(args.cycle)]
+        if args.adaptive:
+            child.append("--adaptive")
+
+        print(f"\n{count} UIDs, {cycle_length(count, args):.1f}s cycle, batch size {args.batch_size}")
+        print(f"{'cycle':>5} {'req/s':>8} {'errors':>7} {'events/s':>9} {'cpu':>6} {'rss MB':>7}")
+        proc = subprocess.Popen(child, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        for line in proc.stdout:
+            if not line.startswith("{"):
+                continue
+            row = json.loads(line)
+            print(f"{row['cycle']:>5} {row['req_per_s']:>8.1f} {row['errors']:>7} {row['events_per_s']:>9.1f} "
+                  f"{row['cpu']:>6.1%} {row['rss_mb']:>7.1f}")
+        proc.wait()
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end throughput of the service against the fake Bilibili API")
+    parser.add_argument("--uids", type=int, nargs="+", default=[10, 1000, 10000], help="channel counts to run")
+    parser.add_argument("--cycles", type=int, default=3, help="live status cycles per run")
+    parser.add_argument("--cycle", type=float, default=0, help="cycle length in seconds (default: as fast as the scheduler allows)")
+    parser.add_argument("--batch-size", type=int, default=50, help="LIVE_BATCH_SIZE (1 polls get_live_info per UID)")
+    parser.add_argument("--min-delay", type=float, default=0.001, help="MIN_REQUEST_DELAY per account")
+    parser.add_argument("--backoff-base", type=float, default=5, help="rate limiter backoff after a 412/429")
+    parser.add_argument("--adaptive", action="store_true", help="use AdaptiveScheduler for live status")
+    parser.add_argument("--scenario", help="scenario file passed to the fake server")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--count", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(run_service(args))
+        return
+    for count in args.uids:
+        run_size(count, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from event_codec import (EventEncoder, RawStore, read_events, FORMAT_JSONL, FORMAT_MSGPACK,
+                         RAW_INLINE, RAW_DROP, RAW_STORE)
+
+# Bytes on disk and encode time per RESERVATION event for each encoding mode.
+# The raw item is a synthetic dynamic shaped like get_dynamics_new() output.
+
+def make_item(i):
+    return {
+        'id_str': str(900000000000000000 + i),
+        'type': 'DYNAMIC_TYPE_WORD',
+        'visible': True,
+        'basic': {'comment_id_str': str(300000000 + i), 'comment_type': 17, 'rid_str': str(300000000 + i)},
+        'modules': {
+            'module_author': {
+                'face': 'https://i0.hdslb.com/bfs/face/0123456789abcdef0123456789abcdef01234567.jpg',
+                'mid': 286700005, 'name': 'hololive官方', 'pub_action': '', 'pub_time': '05-03',
+                'pub_ts': 1714700000 + i, 'type': 'AUTHOR_TYPE_NORMAL',
+                'decorate': {'card_url': 'https://i0.hdslb.com/bfs/garb/item/abcdef.png', 'fan': {'color': '#ff7373', 'num_str': '000001'}},
+                'pendant': {'image': 'https://i0.hdslb.com/bfs/garb/item/pendant.png', 'name': '', 'pid': 0},
+                'vip': {'status': 1, 'type': 2, 'label': {'text': '年度大会员', 'bg_color': '#FB7299'}},
+            },
+            'module_dynamic': {
+                'desc': {'text': '【直播预告】今晚8点一起来玩游戏吧！' * 8, 'rich_text_nodes': [
+                    {'type': 'RICH_TEXT_NODE_TYPE_TEXT', 'text': '【直播预告】今晚8点一起来玩游戏吧！', 'orig_text': '【直播预告】今晚8点一起来玩游戏吧！'}
+                ] * 8},
+                'additional': {
+                    'type': 'ADDITIONAL_TYPE_RESERVE',
+                    'reserve': {
+                        'title': f'直播预约：测试直播 {i}', 'stime': 1714737600, 'stotal': 12345, 'rid': 4000000 + i,
+                        'desc1': {'text': '预计今天 20:00发布', 'style': 0}, 'desc2': {'text': '1.2万人预约', 'style': 0},
+                        'jump_url': f'https://live.bilibili.com/{21000000 + i}', 'state': 0, 'up_mid': 286700005,
+                        'button': {'type': 2, 'uncheck': {'text': '预约', 'icon_url': ''}, 'check': {'text': '已预约', 'icon_url': ''}},
+                    },
+                },
+                'major': None,
+            },
+            'module_stat': {'comment': {'count': 120}, 'forward': {'count': 30}, 'like': {'count': 4567}},
+        },
+    }
+
+def make_event(i):
+    return {
+        'event_type': 'RESERVATION',
+        'uid': 286700005,
+        'dynamic_id': str(900000000000000000 + i),
+        'timestamp': 1714700000 + i,
+        'details': {'title': f'直播预约：测试直播 {i}', 'start_ts': 1714737600, 'description': '预计今天 20:00发布', 'total_count': 12345},
+        'raw_data': make_item(i),
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    args = parser.parse_args()
+
+    events = [make_event(i) for i in range(args.events)]
+    modes = [
+        (FORMAT_JSONL, RAW_INLINE), (FORMAT_JSONL, RAW_DROP), (FORMAT_JSONL, RAW_STORE),
+        (FORMAT_MSGPACK, RAW_INLINE), (FORMAT_MSGPACK, RAW_DROP), (FORMAT_MSGPACK, RAW_STORE),
+    ]
+    print(f"{args.events} RESERVATION events (log bytes exclude the raw store)")
+    with tempfile.TemporaryDirectory() as tmp:
+        for fmt, raw in modes:
+            name = f"{fmt}/{raw}"
+            store = RawStore(os.path.join(tmp, name.replace("/", "-") + "-raw"))
+            encoder = EventEncoder(fmt, raw_data=raw, raw_store=store)
+            path = os.path.join(tmp, name.replace("/", "-"))
+
+            start = time.perf_counter()
+            with open(path, "wb") as f:
+                for event in events:
+                    f.write(encoder.encode(event))
+            elapsed = time.perf_counter() - start
+
+            count = sum(1 for _ in read_events(path, raw_store=store))
+            assert count == args.events
+            size = os.path.getsize(path)
+            print(f"  {name:18s} {size / args.events:8.0f} B/event   {elapsed / args.events * 1e6:7.1f} us/event")
+
+if __name__ == "__main__":
+    main()
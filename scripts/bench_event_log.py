@@ -0,0 +1,72 @@
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from event_codec import EventEncoder, read_events
+from event_log import EventLog, import_events
+
+# Query time of the segmented event log vs. scanning a single file, for growing log sizes.
+# Events arrive at a constant rate, so "the last week" is the same amount of data at every
+# size and the indexed queries should take the same time regardless of how much older history there is.
+
+DAY = 86400
+
+def make_events(count, channels, rate, end):
+    start = end - count / rate
+    for i in range(count):
+        uid = random.randrange(channels)
+        yield {'event_type': random.choice(('STATE_SYNC', 'STREAM_START', 'STREAM_END', 'TITLE_CHANGE')),
+               'uid': uid, 'room_id': 20000000 + uid, 'timestamp': int(start + i / rate),
+               'details': {'title': f"stream {uid} #{i}", 'room_id': 20000000 + uid, 'live_status': i % 2}}
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 400_000, 1_600_000])
+    parser.add_argument("--channels", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=0.5, help="events per second of simulated time")
+    parser.add_argument("--segment-bytes", type=int, default=8 * 1024 * 1024)
+    parser.add_argument("--scan", action="store_true", help="also time a full scan of a single unsegmented file")
+    args = parser.parse_args()
+
+    end = int(time.time())
+    uid = 7
+    print(f"{'events':>10} {'segments':>8} {'uid, last week':>16} {'all, last hour':>16} {'full scan':>10}")
+    for size in args.sizes:
+        workdir = tempfile.mkdtemp(prefix="bench_event_log_")
+        try:
+            random.seed(size)
+            log_path = os.path.join(workdir, "stream_events.jsonl")
+            import_events(log_path, make_events(size, args.channels, args.rate, end), EventEncoder(),
+                          segment_bytes=args.segment_bytes, name="bench")
+            log = EventLog(log_path)
+
+            week, week_count = timed(lambda: sum(1 for _ in log.query(uid=uid, since=end - 7 * DAY)))
+            hour, hour_count = timed(lambda: sum(1 for _ in log.query(since=end - 3600)))
+            scan = ""
+            if args.scan:
+                flat = os.path.join(workdir, "flat.jsonl")
+                with open(flat, "wb") as f:
+                    for event in make_events(size, args.channels, args.rate, end):
+                        f.write(EventEncoder().encode(event))
+                seconds, _ = timed(lambda: sum(1 for e in read_events(flat) if e['uid'] == uid and e['timestamp'] >= end - 7 * DAY), repeat=1)
+                scan = f"{seconds * 1000:.0f}ms"
+            print(f"{size:>10} {len(log.segments()):>8} {week * 1000:>9.1f}ms ({week_count:>3}) "
+                  f"{hour * 1000:>9.1f}ms ({hour_count:>3}) {scan:>10}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
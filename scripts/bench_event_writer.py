@@ -0,0 +1,66 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from event_writer import EventWriter
+
+# Compares the old open/append/close per event against EventWriter.
+# "loop stall" is the longest time a single event write kept the event loop busy.
+
+def make_event(i):
+    return {
+        'event_type': 'STATE_SYNC',
+        'uid': 100000 + i,
+        'room_id': 200000 + i,
+        'timestamp': int(time.time()),
+        'details': {'title': f"【直播】测试标题 {i}", 'live_status': 0, 'link': f"https://live.bilibili.com/{200000 + i}"}
+    }
+
+async def per_event(path, events):
+    stall = 0
+    start = time.perf_counter()
+    for event in events:
+        t = time.perf_counter()
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        stall = max(stall, time.perf_counter() - t)
+        await asyncio.sleep(0)
+    return time.perf_counter() - start, stall
+
+async def batched(path, events, fsync):
+    writer = EventWriter(path, max_queue=len(events) + 1, fsync=fsync)
+    await writer.start()
+    stall = 0
+    start = time.perf_counter()
+    for event in events:
+        t = time.perf_counter()
+        await writer.write(event)
+        stall = max(stall, time.perf_counter() - t)
+        await asyncio.sleep(0)
+    await writer.close()
+    return time.perf_counter() - start, stall
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=50000)
+    args = parser.parse_args()
+
+    events = [make_event(i) for i in range(args.events)]
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [
+            ("open per event", lambda: per_event(os.path.join(tmp, "a.jsonl"), events)),
+            ("EventWriter", lambda: batched(os.path.join(tmp, "b.jsonl"), events, False)),
+            ("EventWriter + fsync", lambda: batched(os.path.join(tmp, "c.jsonl"), events, True)),
+        ]
+        print(f"{args.events} events")
+        for name, run in runs:
+            elapsed, stall = asyncio.run(run())
+            print(f"  {name:22s} {args.events / elapsed:10.0f} events/s   max loop stall {stall * 1e3:6.2f} ms")
+
+if __name__ == "__main__":
+    main()
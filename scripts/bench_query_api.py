@@ -0,0 +1,106 @@
+import argparse
+import asyncio
+import http.client
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from http_server import HttpServer
+from query_api import QueryApi
+
+# Request throughput of the query API, served on the event loop like in main.py, with
+# client processes sending keep-alive requests. Meanwhile a task that sleeps 10ms at a time
+# stands in for the polling loops and reports how late its wakeups were, and events keep
+# invalidating bodies like a running service would.
+
+class FakeMonitor:
+    def __init__(self, channels):
+        self.states = {uid: {'room_id': 20000000 + uid, 'live_status': 1 if uid % 10 == 0 else 0, 'title': f"stream {uid}"}
+                       for uid in range(1, channels + 1)}
+
+def client(port, paths, duration, conditional, results):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    etags = {}
+    count = not_modified = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        path = random.choice(paths)
+        headers = {"If-None-Match": etags[path]} if conditional and path in etags else {}
+        conn.request("GET", path, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        etags[path] = resp.getheader("ETag")
+        count += 1
+        not_modified += resp.status == 304
+    results.put((count, not_modified))
+
+async def loop_lag(stop):
+    """Returns the worst and mean overshoot of 10ms sleeps while the benchmark runs."""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - start - 0.01)
+    return max(lags), sum(lags) / len(lags)
+
+async def churn(query, monitor, rate, stop):
+    """Emits TITLE_CHANGE events for random channels at the given rate."""
+    uids = list(monitor.states)
+    while not stop.is_set():
+        uid = random.choice(uids)
+        monitor.states[uid]['title'] += "!"
+        query.observe({'event_type': 'TITLE_CHANGE', 'uid': uid, 'timestamp': int(time.time())})
+        await asyncio.sleep(1 / rate)
+
+async def run(args, conditional):
+    monitor = FakeMonitor(args.channels)
+    query = QueryApi(monitor)
+    now = int(time.time())
+    for uid in range(1, args.channels + 1, 7):
+        query.observe({'event_type': 'RESERVATION', 'uid': uid, 'dynamic_id': str(uid),
+                       'details': {'title': f"reservation {uid}", 'start_ts': now + uid * 60}})
+    server = HttpServer(port=0)
+    query.routes(server)
+    await server.start()
+
+    paths = ["/live", "/upcoming", f"/upcoming?before={now + 86400}"] + [f"/channel/{uid}" for uid in range(1, 101)]
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=client, args=(server.port, paths, args.duration, conditional, results))
+             for _ in range(args.clients)]
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    churn_task = asyncio.create_task(churn(query, monitor, args.event_rate, stop))
+
+    start = time.perf_counter()
+    for proc in procs:
+        proc.start()
+    counts = [await asyncio.to_thread(results.get) for _ in procs]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    worst_lag, mean_lag = await lag_task
+    await churn_task
+    for proc in procs:
+        proc.join()
+    await server.close()
+
+    total = sum(c for c, _ in counts)
+    not_modified = sum(n for _, n in counts)
+    print(f"{'If-None-Match' if conditional else 'plain':>14}: {total / elapsed:>8.0f} req/s "
+          f"({not_modified / max(total, 1):.0%} 304), loop lag mean {mean_lag * 1000:.2f}ms max {worst_lag * 1000:.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description="Query API throughput")
+    parser.add_argument("--channels", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--event-rate", type=float, default=50, help="state changes per second")
+    args = parser.parse_args()
+    print(f"{args.channels} channels, {args.clients} clients, {args.event_rate:.0f} events/s")
+    for conditional in (False, True):
+        asyncio.run(run(args, conditional))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+# Local stand-in for the Bilibili endpoints the service uses, for benchmarks and tests
+# that must not touch the real API.
+#
+# Responses are built from recorded fixtures (scripts/fixtures/*.json, refresh them with
+# `record <uid>`), with the UID, room and titles filled in per channel. Each channel has
+# a simulated state that changes as it is polled, so a run produces real events.
+#
+# Requests are routed by host as the first path segment: https://api.bilibili.com/x/...
+# is served at <server>/api.bilibili.com/x/... (see FakeHostClient). Simulations in virtual
+# time skip the server and answer requests in process (see install_inprocess_client).
+#
+# Behaviour can be changed while running by POSTing a JSON object to /_control, or up
+# front with a scenario file: a list of {"at": seconds, ...} steps with the same keys:
+#   latency       seconds added to every request
+#   error_status  HTTP status of injected failures (412 or 429, or e.g. 503 for an outage)
+#   error_paths   only fail requests whose path contains one of these strings, e.g. ["feed/space"] (empty = all)
+#   error_for     fail every request for this many seconds from now (a rate limit burst)
+#   error_rate    fraction of requests that fail
+#   flip_prob     chance per live status poll that a channel goes live / offline
+#   title_prob    chance per live status poll that a live channel changes its title
+#   dynamic_prob  chance per feed poll that a channel posts a new dynamic
+#   live          {uid: 0 or 1} to set channels live / offline directly
+# GET /_stats returns request counts per endpoint.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+NAV = {"code": 0, "message": "0", "ttl": 1, "data": {
+    "isLogin": True,
+    "wbi_img": {"img_url": "https://i0.hdslb.com/bfs/wbi/7cd084941338484aae1ad9425b84077c.png",
+                "sub_url": "https://i0.hdslb.com/bfs/wbi/4932caff0ff746eab6f01bf08b70ac45.png"}}}
+EMPTY = {"code": 0, "message": "0", "ttl": 1, "data": {}}
+
+def _load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+class Channel:
+    def __init__(self, uid, rng):
+        self.uid = uid
+        self.room_id = 20000000 + uid % 10000000
+        self.live_status = 1 if rng.random() < 0.1 else 0
+        self.title = f"stream {uid}"
+        self.title_rev = 0
+        # (id, template index, pub_ts), newest first
+        self.dynamics = []
+        self.next_dynamic = uid * 1000
+
+    def post(self, kind, now):
+        self.next_dynamic += 1
+        self.dynamics.insert(0, (self.next_dynamic, kind, int(now)))
+        del self.dynamics[50:]
+
+class FakeBilibili:
+    """Simulated channels and failure injection, shared by the request handler threads."""
+    def __init__(self, seed=0, page_size=12, history=5, clock=time.time):
+        self.rng = random.Random(seed)
+        # simulated time for pub_ts and error_for (see install_inprocess_client)
+        self.clock = clock
+        self.page_size = page_size
+        self.history = history
+        self.live_template = _load_fixture("live_info.json")["data"]
+        self.dynamic_templates = _load_fixture("dynamics.json")["data"]["items"]
+
+        self.latency = 0.0
+        self.error_status = 412
+        self.error_until = 0
+        self.error_rate = 0.0
+        self.error_paths = []
+        self.flip_prob = 0.02
+        self.title_prob = 0.05
+        self.dynamic_prob = 0.05
+
+        self.channels = {}
+        self.stats = {"requests": 0, "errors": 0, "endpoints": {}}
+        self.lock = threading.Lock()
+
+    def channel(self, uid):
+        channel = self.channels.get(uid)
+        if channel is None:
+            channel = self.channels[uid] = Channel(uid, self.rng)
+            now = self.clock()
+            for i in range(self.history):
+                channel.post(self.rng.randrange(len(self.dynamic_templates)), now - (self.history - i) * 3600)
+        return channel
+
+    def control(self, settings):
+        with self.lock:
+            for key in ("latency", "error_status", "error_rate", "error_paths", "flip_prob", "title_prob", "dynamic_prob"):
+                if key in settings:
+                    setattr(self, key, settings[key])
+            if "error_for" in settings:
+                self.error_until = self.clock() + settings["error_for"]
+            for uid, status in settings.get("live", {}).items():
+                self.channel(int(uid)).live_status = int(status)
+
+    def run_scenario(self, steps):
+        def run():
+            start = time.monotonic()
+            for step in sorted(steps, key=lambda s: s.get("at", 0)):
+                time.sleep(max(0, start + step.get("at", 0) - time.monotonic()))
+                print(f"[FakeBilibili] Scenario step: {step}")
+                self.control(step)
+        threading.Thread(target=run, daemon=True).start()
+
+    def should_fail(self, endpoint):
+        if self.error_paths and not any(path in endpoint for path in self.error_paths):
+            return False
+        return self.clock() < self.error_until or (self.error_rate and self.rng.random() < self.error_rate)
+
+    def _poll_live(self, channel):
+        if self.rng.random() < self.flip_prob:
+            channel.live_status = 0 if channel.live_status == 1 else 1
+        elif channel.live_status == 1 and self.rng.random() < self.title_prob:
+            channel.title_rev += 1
+            channel.title = f"stream {channel.uid} #{channel.title_rev}"
+
+    def live_info(self, uid):
+        with self.lock:
+            channel = self.channel(uid)
+            self._poll_live(channel)
+            live_room = dict(self.live_template["live_room"], liveStatus=channel.live_status, title=channel.title,
+                             roomid=channel.room_id, url=f"https://live.bilibili.com/{channel.room_id}")
+        return dict(self.live_template, mid=uid, live_room=live_room)
+
+    def live_status_batch(self, uids):
+        rooms = {}
+        with self.lock:
+            for uid in uids:
+                channel = self.channel(uid)
+                self._poll_live(channel)
+                rooms[str(uid)] = {"uid": uid, "room_id": channel.room_id, "short_id": 0, "title": channel.title,
+                                   "live_status": channel.live_status, "live_time": 0, "online": 0,
+                                   "cover_from_user": "", "keyframe": "", "area_v2_name": "虚拟主播"}
+        return rooms
+
+    def dynamics(self, uid, offset):
+        with self.lock:
+            channel = self.channel(uid)
+            if not offset and self.rng.random() < self.dynamic_prob:
+                channel.post(self.rng.randrange(len(self.dynamic_templates)), self.clock())
+            entries = channel.dynamics
+            if offset:
+                entries = [entry for entry in entries if entry[0] < int(offset)]
+            page = entries[:self.page_size]
+            has_more = len(entries) > len(page)
+
+        items = []
+        for dynamic_id, kind, pub_ts in page:
+            template = self.dynamic_templates[kind]
+            modules = dict(template["modules"], module_author=dict(template["modules"]["module_author"], mid=uid, pub_ts=pub_ts))
+            items.append(dict(template, id_str=str(dynamic_id), modules=modules))
+        return {"has_more": has_more, "items": items,
+                "offset": items[-1]["id_str"] if items else "", "update_baseline": "", "update_num": 0}
+
+    def handle(self, method, path, query, body):
+        """Returns (status, JSON-serializable body or bytes)."""
+        if path == "/_stats":
+            with self.lock:
+                return 200, copy.deepcopy(self.stats)
+        if path == "/_control":
+            self.control(json.loads(body or b"{}"))
+            return 200, {"ok": True}
+
+        if self.latency:
+            time.sleep(self.latency)
+        endpoint = path.split("?")[0]
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["endpoints"][endpoint] = self.stats["endpoints"].get(endpoint, 0) + 1
+        if self.should_fail(endpoint):
+            with self.lock:
+                self.stats["errors"] += 1
+            return self.error_status, b"<html><body>request was rejected</body></html>"
+
+        if endpoint.startswith("/space.bilibili.com/"):
+            # no render data, so the client requests without w_webid
+            return 200, b"<html><head><title>space</title></head><body></body></html>"
+        if endpoint == "/api.bilibili.com/x/web-interface/nav":
+            return 200, NAV
+        if endpoint == "/api.bilibili.com/x/space/wbi/acc/info":
+            return 200, {"code": 0, "message": "0", "ttl": 1, "data": self.live_info(int(query["mid"][0]))}
+        if endpoint == "/api.bilibili.com/x/polymer/web-dynamic/v1/feed/space":
+            data = self.dynamics(int(query["host_mid"][0]), query.get("offset", [""])[0])
+            return 200, {"code": 0, "message": "0", "ttl": 1, "data": data}
+        if endpoint == "/api.live.bilibili.com/room/v1/Room/get_status_info_by_uids":
+            uids = json.loads(body or b"{}").get("uids", []) or [int(u) for u in query.get("uids[]", [])]
+            return 200, {"code": 0, "msg": "success", "message": "success", "data": self.live_status_batch(uids)}
+        if endpoint == "/api.bilibili.com/x/frontend/finger/spi":
+            return 200, {"code": 0, "message": "ok", "data": {"b_3": "00000000-0000-0000-0000-000000000000infoc", "b_4": "fake-buvid4"}}
+        return 200, EMPTY
+
+def serve(fake, host="127.0.0.1", port=0, certfile=None):
+    """
+    Starts the server in a background thread and returns it. The base URL is server.url.
+    With certfile (a PEM file with certificate and key) it serves HTTPS.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _respond(self, method):
+            parts = urlsplit(self.path)
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            status, payload = fake.handle(method, parts.path, parse_qs(parts.query), body)
+            data = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header('Content-Type', "text/html" if isinstance(payload, bytes) else "application/json")
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._respond("GET")
+
+        def do_POST(self):
+            self._respond("POST")
+
+        def log_message(self, *args):
+            pass
+
+    class Server(ThreadingHTTPServer):
+        # the default backlog of 5 drops connection attempts of a client opening many at once
+        request_queue_size = 128
+
+    server = Server((host, port), Handler)
+    server.daemon_threads = True
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    server.url = f"{scheme}://{host}:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def install_client(base_url):
+    """
+    Registers a curl_cffi client that sends every request to the fake server instead.
+    AuthManager.setup() selects "curl_cffi" by name, so the service needs no changes.
+    """
+    from bilibili_api import register_client
+    import http_client
+
+    class FakeHostClient(http_client.PooledCurlClient):
+        async def request(self, method="", url="", *args, **kwargs):
+            parts = urlsplit(url)
+            url = f"{base_url}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+            return await super().request(method, url, *args, **kwargs)
+
+    register_client("curl_cffi", FakeHostClient, {"impersonate": "", "http2": False})
+    return FakeHostClient
+
+def install_inprocess_client(fake):
+    """
+    Registers a curl_cffi client that answers every request from `fake` directly, without
+    a server or sockets, for simulations in virtual time (see src/virtual_clock.py).
+    Select it with select_client("curl_cffi") or AuthManager.setup().
+    """
+    from bilibili_api import register_client
+    from bilibili_api.clients.CurlCFFIClient import CurlCFFIClient
+    from bilibili_api.utils.network import BiliAPIResponse
+
+    class InProcessClient(CurlCFFIClient):
+        async def request(self, method="", url="", params={}, data={}, files={}, headers={}, cookies={},
+                          allow_redirects=True):
+            parts = urlsplit(url)
+            query = parse_qs(parts.query)
+            for key, value in (params or {}).items():
+                query.setdefault(key, []).extend(value if isinstance(value, list) else [value])
+            if isinstance(data, dict):
+                body = urlencode(data).encode("utf-8")
+            else:
+                body = data.encode("utf-8") if isinstance(data, str) else data
+            status, payload = fake.handle(method, f"/{parts.netloc}{parts.path}", query, body)
+            raw = payload if isinstance(payload, bytes) else json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            content_type = "text/html" if isinstance(payload, bytes) else "application/json"
+            return BiliAPIResponse(code=status, headers={"Content-Type": content_type}, cookies={}, raw=raw, url=url)
+
+    register_client("curl_cffi", InProcessClient, {"impersonate": "", "http2": False})
+    return InProcessClient
+
+async def record(uid):
+    """Saves live info and the first dynamics page of a real channel as fixtures."""
+    from auth_manager import AuthManager
+    from bilibili_api import user
+
+    auth = AuthManager()
+    u = user.User(uid, credential=auth.setup())
+    for name, data in (("live_info.json", await u.get_live_info()), ("dynamics.json", await u.get_dynamics_new())):
+        with open(os.path.join(FIXTURES_DIR, name), "w", encoding="utf-8") as f:
+            json.dump({"code": 0, "message": "0", "ttl": 1, "data": data}, f, ensure_ascii=False, indent=2)
+        print(f"Recorded {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Bilibili API server")
+    sub = parser.add_subparsers(dest="command")
+    run = sub.add_parser("serve", help="run the fake API server")
+    run.add_argument("--port", type=int, default=0)
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--scenario", help="JSON file with a list of timed control steps")
+    rec = sub.add_parser("record", help="refresh the fixtures from a real channel (uses .env credentials)")
+    rec.add_argument("uid", type=int)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        asyncio.run(record(args.uid))
+        return
+
+    fake = FakeBilibili(seed=getattr(args, "seed", 0))
+    server = serve(fake, port=getattr(args, "port", 0))
+    if getattr(args, "scenario", None):
+        with open(args.scenario, "r", encoding="utf-8") as f:
+            fake.run_scenario(json.load(f))
+    print(server.url, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from bilibili_api import live
+from curl_cffi.requests import AsyncSession
+from live_monitor import LiveMonitor
+from push_monitor import PushMonitor
+
+# Local stand-in for Bilibili's live room WebSocket servers, for checking PushMonitor
+# without the real API.
+#
+# The server speaks the room protocol: packets with a 16-byte header (packet length,
+# header length, protocol version, operation, sequence) and a JSON body. A client joins a
+# room by sending an auth packet (operation 7) and gets operation 8 back, heartbeats (2)
+# are answered with a view count (3), and push messages go out as operation 5. The test
+# code pushes messages to a room with push() and cuts its connections with drop().
+#
+# StandInConnection is the matching client, with the interface PushMonitor expects of
+# LiveDanmaku (add_event_listener/connect/disconnect/get_status), so
+# PushMonitor(connection_factory=server.connection_factory()) connects here.
+#
+# Run directly, it checks PushMonitor against the server and exits non-zero if a check
+# fails: LIVE / PREPARING / ROOM_CHANGE pushes, no duplicates with polling, the connection
+# cap and eviction for priority channels, and the fallback to polling when a connection drops.
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+HEADER = struct.Struct(">IHHII")
+
+OP_HEARTBEAT = 2
+OP_HEARTBEAT_REPLY = 3
+OP_MESSAGE = 5
+OP_AUTH = 7
+OP_AUTH_REPLY = 8
+
+def pack(op, body):
+    data = body if isinstance(body, bytes) else json.dumps(body, ensure_ascii=False).encode("utf-8")
+    return HEADER.pack(HEADER.size + len(data), HEADER.size, 0, op, 1) + data
+
+def unpack(data):
+    """Splits a WebSocket message into (op, body) packets."""
+    packets = []
+    while data:
+        length, header_length, _, op, _ = HEADER.unpack_from(data)
+        packets.append((op, data[header_length:length]))
+        data = data[length:]
+    return packets
+
+async def _read_frame(reader):
+    """Reads one client frame. Returns (opcode, payload)."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack(">H", await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack(">Q", await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else b"\0\0\0\0"
+    payload = await reader.readexactly(length)
+    return first & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+def _frame(opcode, payload):
+    if len(payload) < 126:
+        header = struct.pack(">BB", 0x80 | opcode, len(payload))
+    elif len(payload) < 65536:
+        header = struct.pack(">BBH", 0x80 | opcode, 126, len(payload))
+    else:
+        header = struct.pack(">BBQ", 0x80 | opcode, 127, len(payload))
+    return header + payload
+
+class FakePushServer:
+    """WebSocket server holding room connections, on the running event loop."""
+    def __init__(self):
+        # room_id -> set of StreamWriters
+        self.rooms = {}
+        self.server = None
+        self.url = None
+        # every StandInConnection built by connection_factory(), to check how they were closed
+        self.clients = []
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._serve, host, port)
+        self.url = f"ws://{host}:{self.server.sockets[0].getsockname()[1]}/sub"
+
+    async def close(self):
+        for writers in self.rooms.values():
+            for writer in writers:
+                writer.close()
+        self.server.close()
+        await self.server.wait_closed()
+
+    def connections(self, room_id):
+        return len(self.rooms.get(room_id, ()))
+
+    async def push(self, room_id, cmd, data=None):
+        """Sends a push message to every connection of a room."""
+        message = {"cmd": cmd, "roomid": room_id}
+        if data is not None:
+            message["data"] = data
+        for writer in list(self.rooms.get(room_id, ())):
+            writer.write(_frame(0x2, pack(OP_MESSAGE, message)))
+            await writer.drain()
+
+    def drop(self, room_id):
+        """Cuts a room's connections without a close frame, like a network failure."""
+        for writer in self.rooms.pop(room_id, set()):
+            writer.transport.abort()
+
+    def connection_factory(self):
+        def factory(room_id, credential):
+            conn = StandInConnection(self.url, room_id)
+            self.clients.append(conn)
+            return conn
+        return factory
+
+    async def _serve(self, reader, writer):
+        room_id = None
+        try:
+            request = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+            headers = dict(line.split(": ", 1) for line in request.split("\r\n")[1:] if ": " in line)
+            key = {k.lower(): v for k, v in headers.items()}["sec-websocket-key"]
+            accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+            writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                          f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+            while True:
+                opcode, payload = await _read_frame(reader)
+                if opcode == 0x8:
+                    writer.write(_frame(0x8, payload[:2]))
+                    break
+                if opcode == 0x9:
+                    writer.write(_frame(0xA, payload))
+                    continue
+                for op, body in unpack(payload):
+                    if op == OP_AUTH:
+                        room_id = json.loads(body)["roomid"]
+                        self.rooms.setdefault(room_id, set()).add(writer)
+                        writer.write(_frame(0x2, pack(OP_AUTH_REPLY, {"code": 0})))
+                    elif op == OP_HEARTBEAT:
+                        writer.write(_frame(0x2, pack(OP_HEARTBEAT_REPLY, struct.pack(">I", 1))))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            # client gone, or the server is shutting down
+            pass
+        finally:
+            if room_id is not None:
+                self.rooms.get(room_id, set()).discard(writer)
+            writer.close()
+
+class StandInConnection:
+    """
+    Room connection to FakePushServer, with the part of LiveDanmaku's interface PushMonitor uses.
+    Like LiveDanmaku, cancelling connect() leaves the websocket and heartbeat running until disconnect().
+    """
+    def __init__(self, url, room_id, heartbeat_interval=30):
+        self.url = url
+        self.room_id = room_id
+        self.heartbeat_interval = heartbeat_interval
+        self._listeners = {}
+        self._status = live.LiveDanmaku.STATUS_INIT
+        self._ws = None
+        self._heartbeat_task = None
+        self.disconnected = False
+
+    def add_event_listener(self, name, handler):
+        self._listeners.setdefault(name, []).append(handler)
+
+    def get_status(self):
+        return self._status
+
+    async def connect(self):
+        """Runs until the connection is closed or fails, like LiveDanmaku.connect()."""
+        self._status = live.LiveDanmaku.STATUS_CONNECTING
+        # closing the session leaves the socket of a cancelled connection open, as with LiveDanmaku
+        async with AsyncSession() as session:
+            try:
+                self._ws = await session.ws_connect(self.url)
+                await self._ws.send_binary(pack(OP_AUTH, {"uid": 0, "roomid": self.room_id, "protover": 0,
+                                                          "platform": "web", "type": 2, "key": "stand-in"}))
+                self._heartbeat_task = asyncio.create_task(self._heartbeat())
+                while self._status != live.LiveDanmaku.STATUS_CLOSED:
+                    data, _ = await self._ws.recv()
+                    for op, body in unpack(data):
+                        await self._handle(op, body)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if self._status != live.LiveDanmaku.STATUS_CLOSED:
+                    self._status = live.LiveDanmaku.STATUS_ERROR
+            self._close()
+
+    async def disconnect(self):
+        if self._status != live.LiveDanmaku.STATUS_ESTABLISHED:
+            raise live.LiveException("not connected")
+        self.disconnected = True
+        self._status = live.LiveDanmaku.STATUS_CLOSED
+        self._close()
+
+    def _close(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+        if self._ws:
+            self._ws.terminate()
+
+    async def _heartbeat(self):
+        while True:
+            await self._ws.send_binary(pack(OP_HEARTBEAT, b"[object Object]"))
+            await asyncio.sleep(self.heartbeat_interval)
+
+    async def _handle(self, op, body):
+        if op == OP_AUTH_REPLY and json.loads(body).get("code") == 0:
+            self._status = live.LiveDanmaku.STATUS_ESTABLISHED
+        elif op == OP_MESSAGE:
+            message = json.loads(body)
+            info = {"room_display_id": self.room_id, "room_real_id": self.room_id,
+                    "type": message["cmd"], "data": message}
+            for handler in self._listeners.get(message["cmd"], ()):
+                await handler(info)
+
+def room(uid):
+    return 1000 + uid
+
+async def wait_until(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.01)
+    return True
+
+def check(name, ok, detail=""):
+    print(f"  {'ok  ' if ok else 'FAIL'} {name} {detail}")
+    return ok
+
+async def run_checks(max_connections):
+    server = FakePushServer()
+    await server.start()
+    monitor = LiveMonitor(auth_manager=None)
+    events = []
+
+    async def on_event(event):
+        events.append(event)
+
+    push = PushMonitor(monitor, on_event, credential_for=lambda uid: None, priority_uids={1},
+                       max_connections=max_connections, reconnect_delay=0.2,
+                       connection_factory=server.connection_factory())
+
+    def poll(uid, status, title="stream"):
+        """What LiveMonitor does with a polled room, fed back into the push monitor like dispatch() does."""
+        for event in monitor.apply_state(uid, room(uid), status, title, f"https://live.bilibili.com/{room(uid)}"):
+            events.append(event)
+            push.observe(event)
+
+    async def pushed(uid, cmd, data=None):
+        """Pushes a message and returns the events it produced."""
+        before = len(events)
+        await server.push(room(uid), cmd, data)
+        await asyncio.sleep(0.1)
+        return [(e['event_type'], e.get('source')) for e in events[before:]]
+
+    results = []
+    print(f"PushMonitor (stand-in server, max_connections={max_connections})")
+
+    # priority channel: connected from its first state sync, while offline
+    poll(1, 0)
+    results.append(check("priority channel connects while offline", await wait_until(lambda: push.is_connected(1))))
+    got = await pushed(1, "LIVE")
+    results.append(check("LIVE emits STREAM_START", got == [('STREAM_START', 'push')], got))
+    got = await pushed(1, "ROOM_CHANGE", {"title": "new title"})
+    results.append(check("ROOM_CHANGE emits TITLE_CHANGE", got == [('TITLE_CHANGE', 'push')], got))
+    got = await pushed(1, "PREPARING")
+    results.append(check("PREPARING emits STREAM_END", got == [('STREAM_END', 'push')], got))
+    poll(1, 1, "new title")
+    got = await pushed(1, "LIVE")
+    results.append(check("push does not repeat a start polling reported", got == [], got))
+
+    # non-priority channels: connected while live, up to the cap
+    for uid in range(2, 2 + max_connections):
+        poll(uid, 0)
+        poll(uid, 1)
+    await wait_until(lambda: push.connected_count() == max_connections)
+    over = 1 + max_connections
+    results.append(check("live channels connect up to the cap",
+                         push.connected_count() == max_connections and not push.is_connected(over),
+                         f"connected={push.connected_count()}"))
+
+    # a dropped connection falls back to polling: not connected, so live_loop polls it again
+    server.drop(room(2))
+    results.append(check("dropped connection falls back to polling",
+                         await wait_until(lambda: not push.is_connected(2) and 2 not in push._tasks)))
+    server.drop(room(1))
+    dropped = await wait_until(lambda: not push.is_connected(1))
+    results.append(check("dropped priority connection reconnects",
+                         dropped and await wait_until(lambda: push.is_connected(1) and server.connections(room(1)) == 1)))
+
+    # a priority channel takes the slot of a non-priority one
+    poll(over, 0)
+    poll(over, 1)
+    await wait_until(lambda: push.is_connected(over))
+    push.priority_uids.add(99)
+    poll(99, 0)
+    evicted = [uid for uid in range(3, over + 1) if uid not in push._tasks]
+    results.append(check("priority channel evicts a non-priority one",
+                         await wait_until(lambda: push.is_connected(99)) and len(evicted) == 1
+                         and len(push._tasks) == max_connections, f"evicted={evicted}"))
+
+    # going offline releases the slot
+    live_uid = next(uid for uid in range(3, over + 1) if uid in push._tasks and uid != 99 and uid != 1)
+    live_conn = next(c for c in server.clients if c.room_id == room(live_uid) and c.get_status() == live.LiveDanmaku.STATUS_ESTABLISHED)
+    poll(live_uid, 0)
+    results.append(check("STREAM_END releases a non-priority connection",
+                         await wait_until(lambda: server.connections(room(live_uid)) == 0) and live_conn.disconnected))
+
+    open_conns = [c for c in server.clients if c.get_status() == live.LiveDanmaku.STATUS_ESTABLISHED]
+    await push.close()
+    results.append(check("close() disconnects every room",
+                         await wait_until(lambda: sum(map(len, server.rooms.values())) == 0)
+                         and all(c.disconnected for c in open_conns), f"open={len(open_conns)}"))
+    await server.close()
+    return all(results)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check PushMonitor against a stand-in room WebSocket server")
+    parser.add_argument("--max-connections", type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run_checks(max(args.max_connections, 3))) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+from event_codec import EventEncoder, read_events, FORMAT_JSONL, FORMAT_MSGPACK
+from event_log import import_events
+
+# Imports existing event log files (e.g. a pre-segmentation stream_events.jsonl or old
+# rotated files) into the segmented log as indexed segments. The input files are left as is;
+# move them out of output/ afterwards so they are not imported twice.
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("files", nargs="+", help="event log files in jsonl or msgpack format")
+    parser.add_argument("--log", default=os.path.join(BASE_DIR, "output", "stream_events.jsonl"),
+                        help="active event log file of the segmented log to import into")
+    parser.add_argument("--segment-bytes", type=int, default=64 * 1024 * 1024)
+    args = parser.parse_args()
+
+    fmt = FORMAT_MSGPACK if args.log.endswith(".msgpack") else FORMAT_JSONL
+    encoder = EventEncoder(fmt)
+    for path in args.files:
+        if os.path.abspath(path) == os.path.abspath(args.log):
+            print(f"Skipping {path}: it is the active log itself, rename it first")
+            continue
+        name = f"import-{os.path.splitext(os.path.basename(path))[0]}"
+        count = import_events(args.log, read_events(path), encoder, segment_bytes=args.segment_bytes, name=name)
+        print(f"Imported {count} events from {path}")
+
+if __name__ == "__main__":
+    main()
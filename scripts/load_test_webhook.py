@@ -0,0 +1,104 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from sinks import WebhookSink
+
+# Load test for WebhookSink against a local stub receiver.
+# Phase 1 sends at full speed to a healthy receiver, phase 2 takes the receiver down
+# halfway through and brings it back, so spilled events have to be replayed.
+
+class Receiver:
+    def __init__(self):
+        self.received = 0
+        self.status = 200
+        self.delay = 0.0
+        self.lock = threading.Lock()
+
+        receiver = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                if receiver.delay:
+                    time.sleep(receiver.delay)
+                if receiver.status == 200:
+                    with receiver.lock:
+                        receiver.received += len(json.loads(body)['events'])
+                self.send_response(receiver.status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/events"
+
+def make_event(i):
+    return {'event_type': 'STREAM_START', 'uid': i, 'room_id': i, 'timestamp': int(time.time()),
+            'details': {'title': f"stream {i}", 'room_id': i, 'link': f"https://live.bilibili.com/{i}"}}
+
+async def emit(sink, count, rate):
+    """Sends count events at the given rate (0 = as fast as possible). Returns the slowest send()."""
+    slowest = 0
+    start = time.perf_counter()
+    for i in range(count):
+        t = time.perf_counter()
+        await sink.send(make_event(i))
+        slowest = max(slowest, time.perf_counter() - t)
+        if rate:
+            ahead = start + (i + 1) / rate - time.perf_counter()
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+        elif i % 100 == 0:
+            await asyncio.sleep(0)
+    return slowest
+
+async def wait_for(receiver, count, timeout):
+    deadline = time.monotonic() + timeout
+    while receiver.received < count and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+async def run(args):
+    receiver = Receiver()
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = WebhookSink(receiver.url, os.path.join(tmp, "spill.jsonl"), batch_size=args.batch_size,
+                           flush_interval=0.2, backoff_base=0.1, backoff_max=1.0, max_retries=1)
+        await sink.start()
+
+        start = time.perf_counter()
+        slowest = await emit(sink, args.events, 0)
+        await wait_for(receiver, args.events, 60)
+        elapsed = time.perf_counter() - start
+        print(f"healthy:  {receiver.received}/{args.events} delivered, {receiver.received / elapsed:8.0f} events/s, "
+              f"slowest send() {slowest * 1e3:.2f} ms")
+
+        receiver.received = 0
+        receiver.status = 503
+        slowest = await emit(sink, args.events // 2, args.rate)
+        receiver.status = 200
+        slowest = max(slowest, await emit(sink, args.events - args.events // 2, args.rate))
+        await wait_for(receiver, args.events, 60)
+        print(f"outage:   {receiver.received}/{args.events} delivered, {sink.spilled} spilled and replayed, {sink.dropped} dropped, "
+              f"slowest send() {slowest * 1e3:.2f} ms")
+
+        await sink.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--rate", type=int, default=5000, help="events/s during the outage phase")
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
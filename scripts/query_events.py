@@ -0,0 +1,40 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+from event_log import EventLog
+
+# Queries the segmented event log by channel and/or time range, printing JSON lines.
+# Only segments overlapping the range are opened, and only their indexed records are decoded.
+#   python scripts/query_events.py --uid 434334701 --since 2024-05-01 --until 2024-05-08
+
+def timestamp(value):
+    """Unix timestamp or an ISO date/datetime (local time)."""
+    if value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(value).timestamp())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--log", default=os.path.join(BASE_DIR, "output", "stream_events.jsonl"),
+                        help="active event log file (segments and index are found next to it)")
+    parser.add_argument("--uid", type=int, help="only events of this channel")
+    parser.add_argument("--since", type=timestamp, help="unix timestamp or ISO date")
+    parser.add_argument("--until", type=timestamp, help="unix timestamp or ISO date")
+    parser.add_argument("--type", help="only events of this event_type")
+    parser.add_argument("--count", action="store_true", help="print the number of matches only")
+    args = parser.parse_args()
+
+    events = EventLog(args.log).query(uid=args.uid, since=args.since, until=args.until, event_type=args.type)
+    if args.count:
+        print(sum(1 for _ in events))
+        return
+    for event in events:
+        print(json.dumps(event, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import argparse
+import json
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "src"))
+from event_codec import RawStore, read_events
+
+# Prints an event log (jsonl or msgpack, with inline, dropped or stored raw_data) as JSON lines.
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="event log file")
+    parser.add_argument("--raw-store", default=os.path.join(BASE_DIR, "output", "raw"),
+                        help="raw_data store directory used to resolve raw_ref")
+    parser.add_argument("--resolve-raw", action="store_true", help="replace raw_ref with the stored raw_data")
+    parser.add_argument("--type", help="only print events of this event_type")
+    args = parser.parse_args()
+
+    raw_store = RawStore(args.raw_store) if args.resolve_raw else None
+    for event in read_events(args.path, raw_store=raw_store):
+        if args.type and event.get('event_type') != args.type:
+            continue
+        print(json.dumps(event, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPTS_DIR), "src"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+# Runs a coordinator and several workers as separate processes on this machine.
+#
+# By default everything polls scripts/fake_bilibili_server.py with --uids
+# made-up channels and a short cycle; --real uses TRACKED_UIDS and the accounts from .env.
+# Output of every process is prefixed with its name. --kill-after stops the first worker
+# after that many seconds, so its channels can be seen moving to the others
+# (cluster_worker_channels on the coordinator's /metrics).
+#
+# Example: python scripts/run_cluster.py --workers 3 --uids 300 --kill-after 20
+
+def run_role(args):
+    """Child process: runs main.main() as coordinator or worker."""
+    os.environ["SERVICE_MODE"] = args.role
+    os.environ["WORKER_NAME"] = args.name
+    os.environ["COORDINATOR_PORT"] = str(args.port)
+    import main
+
+    main.STATE_DB = os.path.join(args.workdir, f"state.{args.name}.db")
+    main.event_writer.path = os.path.join(args.workdir, f"stream_events.{main.EVENT_FORMAT}")
+    if main.event_writer.index:
+        main.event_writer.index.log_path = main.event_writer.path
+    main.event_writer.encoder.raw_store.path = os.path.join(args.workdir, "raw")
+    main.WORKER_HEARTBEAT_TIMEOUT = 10
+    if args.role == "worker":
+        main.PUSH_MAX_CONNECTIONS = 0
+    if args.server:
+        from bilibili_api import request_settings
+        from fake_bilibili_server import install_client
+
+        install_client(args.server)
+        request_settings.set_enable_auto_buvid(False)
+        main.TARGET_CYCLE_INTERVAL = args.cycle
+        main.ANNOUNCEMENT_CYCLE_INTERVAL = args.cycle
+        main.MIN_REQUEST_DELAY = 0.01
+        main.JITTER = 0
+        main.LIVE_BATCH_SIZE = 20
+    try:
+        asyncio.run(main.main())
+    except KeyboardInterrupt:
+        pass
+
+def forward(name, stream):
+    for line in stream:
+        sys.stdout.write(f"{name:>12} | {line}")
+        sys.stdout.flush()
+
+def spawn(name, command, env=None):
+    proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+    threading.Thread(target=forward, args=(name, proc.stdout), daemon=True).start()
+    return proc
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a coordinator and several workers on this machine")
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--uids", type=int, default=100, help="channels of the fake server")
+    parser.add_argument("--real", action="store_true", help="poll the real API with TRACKED_UIDS and accounts from .env")
+    parser.add_argument("--cycle", type=float, default=10, help="polling cycle against the fake server (seconds)")
+    parser.add_argument("--port", type=int, default=9109, help="coordinator port")
+    parser.add_argument("--duration", type=float, default=0, help="stop after this many seconds (default: until Ctrl+C)")
+    parser.add_argument("--kill-after", type=float, default=0, help="stop the first worker after this many seconds")
+    parser.add_argument("--role", help=argparse.SUPPRESS)
+    parser.add_argument("--name", help=argparse.SUPPRESS)
+    parser.add_argument("--server", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role:
+        run_role(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="cluster_")
+    env = dict(os.environ, PYTHONUNBUFFERED="1")
+    procs = []
+    try:
+        server = None
+        if not args.real:
+            server = subprocess.Popen([sys.executable, os.path.join(SCRIPTS_DIR, "fake_bilibili_server.py"), "serve"],
+                                      stdout=subprocess.PIPE, text=True)
+            procs.append(server)
+            env.update(TRACKED_UIDS=",".join(str(100000 + i) for i in range(args.uids)),
+                       SESSDATA="fake-sessdata", BILI_JCT="fake-bili-jct", DEDEUSERID="1")
+        child = [sys.executable, os.path.abspath(__file__), "--port", str(args.port), "--workdir", workdir,
+                 "--cycle", str(args.cycle)]
+        if server:
+            child += ["--server", server.stdout.readline().strip()]
+
+        procs.append(spawn("coordinator", child + ["--role", "coordinator", "--name", "coordinator"], env))
+        time.sleep(1)
+        workers = [spawn(f"worker-{i + 1}", child + ["--role", "worker", "--name", f"worker-{i + 1}"], env)
+                   for i in range(args.workers)]
+        procs += workers
+
+        started = time.monotonic()
+        while not args.duration or time.monotonic() - started < args.duration:
+            time.sleep(0.5)
+            if args.kill_after and workers[0].poll() is None and time.monotonic() - started >= args.kill_after:
+                print(f"--- stopping worker-1 after {args.kill_after:.0f}s ---", flush=True)
+                workers[0].kill()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for proc in reversed(procs):
+            if proc.poll() is None:
+                proc.send_signal(signal.SIGINT)
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
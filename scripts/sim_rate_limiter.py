@@ -0,0 +1,111 @@
+import asyncio
+import heapq
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+from scheduler import GlobalRateLimiter
+
+# Drives GlobalRateLimiter with a fake clock to check FIFO release, burst, backoff and AIMD recovery
+# without waiting in real time. Exits non-zero if a check fails.
+
+class FakeClock:
+    """Virtual time: sleep() parks the caller until run() advances the clock to its wake time."""
+    def __init__(self):
+        self.now = 0.0
+        self._sleepers = []
+        self._seq = itertools.count()
+
+    def time(self):
+        return self.now
+
+    async def sleep(self, delay):
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + max(0, delay), next(self._seq), fut))
+        await fut
+
+    async def run(self, *coros):
+        tasks = [asyncio.ensure_future(c) for c in coros]
+        while not all(t.done() for t in tasks):
+            for _ in range(5):
+                await asyncio.sleep(0)
+            if self._sleepers:
+                wake, _, fut = heapq.heappop(self._sleepers)
+                self.now = max(self.now, wake)
+                fut.set_result(None)
+        return [t.result() for t in tasks]
+
+def check(name, ok, detail=""):
+    print(f"  {'ok  ' if ok else 'FAIL'} {name} {detail}")
+    return ok
+
+async def fifo_and_spacing():
+    clock = FakeClock()
+    limiter = GlobalRateLimiter(min_delay=5, clock=clock.time, sleep=clock.sleep)
+    released = []
+
+    async def waiter(i):
+        await limiter.wait()
+        released.append((i, clock.now))
+
+    await clock.run(*(waiter(i) for i in range(5)))
+    order = [i for i, _ in released]
+    times = [t for _, t in released]
+    return (check("waiters released in FIFO order", order == list(range(5)), order)
+            and check("requests spaced by min_delay", times == [0, 5, 10, 15, 20], times))
+
+async def burst():
+    clock = FakeClock()
+    limiter = GlobalRateLimiter(min_delay=5, burst=3, clock=clock.time, sleep=clock.sleep)
+    clock.now = 100
+    times = []
+
+    async def waiter():
+        await limiter.wait()
+        times.append(clock.now)
+
+    await clock.run(*(waiter() for _ in range(5)))
+    return check("burst of 3 goes out immediately, then min_delay spacing", times == [100, 100, 100, 105, 110], times)
+
+async def backoff_while_waiting():
+    clock = FakeClock()
+    limiter = GlobalRateLimiter(min_delay=5, backoff_base=60, clock=clock.time, sleep=clock.sleep)
+    times = []
+
+    async def waiter():
+        await limiter.wait()
+        times.append(clock.now)
+
+    async def hit_412():
+        await clock.sleep(1)
+        limiter.trigger_backoff()
+
+    await clock.run(waiter(), waiter(), waiter(), hit_412())
+    return check("waiters already queued respect a later backoff", times[0] == 0 and all(t >= 61 for t in times[1:]), times)
+
+async def aimd_recovery():
+    clock = FakeClock()
+    limiter = GlobalRateLimiter(min_delay=5, max_delay=30, backoff_base=60, recovery_successes=10,
+                                clock=clock.time, sleep=clock.sleep)
+    limiter.trigger_backoff()
+    limiter.trigger_backoff()
+    after_errors = limiter.current_min_delay
+
+    requests = 0
+    while limiter.current_min_delay > limiter.min_delay and requests < 1000:
+        await clock.run(limiter.wait())
+        limiter.report_success()
+        requests += 1
+
+    return (check("rate halves per rate limit error", after_errors == 20, f"min_delay={after_errors}")
+            and check("rate recovers to its ceiling", limiter.current_min_delay == 5,
+                      f"after {requests} successes, t={clock.now:.0f}s"))
+
+async def main():
+    print("GlobalRateLimiter (fake clock)")
+    results = [await fifo_and_spacing(), await burst(), await backoff_while_waiting(), await aimd_recovery()]
+    sys.exit(0 if all(results) else 1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,285 @@
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(SCRIPTS_DIR), "src"))
+sys.path.insert(0, SCRIPTS_DIR)
+
+from bench_adaptive_scheduler import DAY, make_timeline
+from fake_bilibili_server import FakeBilibili, install_inprocess_client
+import api_errors
+import dynamic_parser
+from announcement_poller import AnnouncementPoller
+from auth_manager import AuthManager
+from endpoint_budget import CircuitBreaker, EndpointBudget
+from event_codec import read_events
+from live_monitor import LiveMonitor
+from scheduler import AdaptiveScheduler, GlobalRateLimiter, Scheduler
+from virtual_clock import VirtualClock
+
+# Runs LiveMonitor and AnnouncementPoller with the service's schedulers and rate limiters on
+# virtual time (src/virtual_clock.py), against the fake API answering in process, so a day
+# of polling takes seconds. Channels follow a timeline of streams and reservations instead
+# of random changes, and every detected change is compared with when it really happened.
+#
+# The timeline is synthetic (--uids channels over --days, the channel mix of
+# bench_adaptive_scheduler.py), a JSON file (--timeline, as written by --save-timeline) or
+# rebuilt from an event log (--events: STREAM_START/STREAM_END/RESERVATION events).
+#
+# --interval, --min-delay and --jitter (TARGET_CYCLE_INTERVAL, MIN_REQUEST_DELAY and JITTER in
+# main.py) take several values; every combination is run on the same timeline. Per run:
+#   live/h       live status requests per hour
+#   feed/h       feed requests per hour
+#   start, end   STREAM_START / STREAM_END detection latency p50/p90/p99/max in seconds
+#   missed       streams that started and ended between two polls of their channel
+#   reserve      RESERVATION detection latency after the reservation was posted
+#
+# Example: python scripts/sim_service.py --uids 300 --days 3 --interval 120 300 --min-delay 1 5
+
+LIVE_ENDPOINTS = ("/api.bilibili.com/x/space/wbi/acc/info", "/api.live.bilibili.com/room/v1/Room/get_status_info_by_uids")
+FEED_ENDPOINT = "/api.bilibili.com/x/polymer/web-dynamic/v1/feed/space"
+
+# 2025-01-06 00:00 UTC+8, day boundaries of the synthetic timeline fall on local midnight
+START = 1736092800
+
+class TimelineBilibili(FakeBilibili):
+    """
+    FakeBilibili whose channels go live and post reservations as a timeline says.
+    Times in the timeline are seconds from `start`.
+    """
+    def __init__(self, timelines, start, clock):
+        super().__init__(history=0, clock=clock)
+        self.flip_prob = self.title_prob = self.dynamic_prob = 0
+        self.start = start
+        self.starts, self.ends, self.pending = {}, {}, {}
+        for uid, (streams, reservations) in timelines.items():
+            streams = sorted(streams)
+            self.starts[uid] = [s for s, _ in streams]
+            self.ends[uid] = [e for _, e in streams]
+            self.pending[uid] = sorted(reservations)
+        self.reserve_kind = next(i for i, item in enumerate(self.dynamic_templates)
+                                 if dynamic_parser.classify(item) == dynamic_parser.KIND_RESERVATION)
+        # dynamic ID -> (rid, start_ts)
+        self.reservations = {}
+        self._rids = itertools.count(1)
+
+    def is_live(self, uid, now):
+        starts = self.starts.get(uid, ())
+        i = bisect.bisect_right(starts, now) - 1
+        return i >= 0 and now < self.ends[uid][i]
+
+    def _poll_live(self, channel):
+        channel.live_status = 1 if self.is_live(channel.uid, self.clock() - self.start) else 0
+
+    def dynamics(self, uid, offset):
+        with self.lock:
+            channel = self.channel(uid)
+            pending = self.pending.get(uid, [])
+            now = self.clock() - self.start
+            while pending and pending[0][0] <= now:
+                posted_at, start_ts = pending.pop(0)
+                channel.post(self.reserve_kind, self.start + posted_at)
+                self.reservations[channel.next_dynamic] = (next(self._rids), self.start + start_ts)
+
+        data = super().dynamics(uid, offset)
+        for item in data["items"]:
+            reservation = self.reservations.get(int(item["id_str"]))
+            if reservation is None:
+                continue
+            rid, start_ts = reservation
+            module = item["modules"]["module_dynamic"]
+            reserve = dict(module["additional"]["reserve"], rid=rid, stime=start_ts, title=f"直播预约：{uid} #{rid}")
+            item["modules"] = dict(item["modules"], module_dynamic=dict(module, additional=dict(module["additional"], reserve=reserve)))
+        return data
+
+def synthetic_timeline(count, days, seed):
+    rng = random.Random(seed)
+    kinds = rng.choices(["regular", "occasional", "dormant"], weights=[2, 4, 4], k=count)
+    return {100000 + i: make_timeline(kind, days, rng) for i, kind in enumerate(kinds)}
+
+def load_timeline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    timelines = {int(uid): ([tuple(s) for s in t["streams"]], [tuple(r) for r in t["reservations"]])
+                 for uid, t in data["channels"].items()}
+    return data["start"], data["duration"], timelines
+
+def save_timeline(path, start, duration, timelines):
+    channels = {str(uid): {"streams": streams, "reservations": reservations}
+                for uid, (streams, reservations) in timelines.items()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"start": start, "duration": duration, "channels": channels}, f)
+
+def timeline_from_events(path):
+    """Rebuilds streams and reservations from the events of a log, relative to its first event."""
+    events = [e for e in read_events(path) if e.get('uid') and e.get('timestamp')]
+    if not events:
+        raise SystemExit(f"{path}: no events")
+    start = min(e['timestamp'] for e in events)
+    end = max(e['timestamp'] for e in events)
+    timelines, live_since = {}, {}
+    for event in sorted(events, key=lambda e: e['timestamp']):
+        uid, ts, event_type = int(event['uid']), event['timestamp'] - start, event['event_type']
+        streams, reservations = timelines.setdefault(uid, ([], []))
+        details = event.get('details') or {}
+        if event_type == 'STREAM_START' or (event_type == 'STATE_SYNC' and details.get('live_status') == 1):
+            live_since.setdefault(uid, ts)
+        elif event_type == 'STREAM_END' and uid in live_since:
+            streams.append((live_since.pop(uid), ts))
+        elif event_type == 'RESERVATION' and details.get('start_ts'):
+            reservations.append((ts, details['start_ts'] - start))
+    for uid, since in live_since.items():
+        timelines[uid][0].append((since, end - start))
+    return start, end - start, timelines
+
+class Recorder:
+    """Matches the events the pollers emit against the timeline."""
+    def __init__(self, fake, clock):
+        self.fake = fake
+        self.clock = clock
+        self.latency = {'start': [], 'end': [], 'reserve': []}
+        self.detected = set()
+
+    def observe(self, event):
+        uid = event['uid']
+        now = self.clock.time() - self.fake.start
+        event_type = event['event_type']
+        details = event.get('details', {})
+        if event_type in ('STREAM_START', 'STATE_SYNC') and details.get('live_status', 1) == 1:
+            i = bisect.bisect_right(self.fake.starts.get(uid, ()), now) - 1
+            if i >= 0 and (uid, i) not in self.detected:
+                self.detected.add((uid, i))
+                if event_type == 'STREAM_START':
+                    self.latency['start'].append(now - self.fake.starts[uid][i])
+        elif event_type == 'STREAM_END':
+            i = bisect.bisect_right(self.fake.ends.get(uid, ()), now) - 1
+            if i >= 0:
+                self.latency['end'].append(now - self.fake.ends[uid][i])
+        elif event_type == 'RESERVATION':
+            posted_at = dynamic_parser.pub_ts(event['raw_data']) - self.fake.start
+            if posted_at >= 0:
+                self.latency['reserve'].append(now - posted_at)
+
+    def missed(self, duration):
+        return sum(1 for uid, ends in self.fake.ends.items() for i, end in enumerate(ends)
+                   if self.fake.starts[uid][i] >= 0 and end < duration and (uid, i) not in self.detected)
+
+async def simulate(timelines, start, duration, clock, args, interval, min_delay, jitter):
+    fake = TimelineBilibili(timelines, start, clock.time)
+    install_inprocess_client(fake)
+    auth = AuthManager()
+    auth.setup()
+    recorder = Recorder(fake, clock)
+    uids = sorted(timelines)
+
+    monitor = LiveMonitor(auth, clock=clock.time)
+    poller = AnnouncementPoller(auth, clock=clock.time)
+    if args.adaptive:
+        live_scheduler = AdaptiveScheduler(uids, interval=interval, min_delay=min_delay, jitter=jitter, clock=clock.time)
+    else:
+        live_scheduler = Scheduler(uids, interval=interval, min_delay=min_delay, jitter=jitter, clock=clock.monotonic)
+    announce_scheduler = Scheduler(uids, interval=args.announce_interval, min_delay=min_delay, jitter=jitter,
+                                   clock=clock.monotonic)
+
+    def make_budget(family):
+        limiter = GlobalRateLimiter(min_delay=min_delay, clock=clock.monotonic)
+        return EndpointBudget(family, limiter, CircuitBreaker(clock=clock.monotonic))
+
+    async def poll_loop(scheduler, budget, size, poll):
+        while True:
+            batch = await scheduler.next_batch(size)
+            if not batch:
+                continue
+            try:
+                await budget.wait()
+                async for event in poll(batch, budget):
+                    live_scheduler.observe(event)
+                    recorder.observe(event)
+                budget.report_success()
+            except Exception as e:
+                budget.report_error(api_errors.classify(e))
+
+    def poll_live(batch, budget):
+        if args.batch_size > 1:
+            return monitor.check_batch(batch)
+        return monitor.check_channel(batch[0])
+
+    def poll_dynamics(batch, budget):
+        return poller.check_channel(batch[0], limiter=budget.limiter)
+
+    loops = [asyncio.ensure_future(poll_loop(live_scheduler, make_budget("live"), args.batch_size, poll_live)),
+             asyncio.ensure_future(poll_loop(announce_scheduler, make_budget("dynamics"), 1, poll_dynamics))]
+    await asyncio.sleep(duration)
+    for task in loops:
+        task.cancel()
+    await asyncio.gather(*loops, return_exceptions=True)
+    return fake.stats, recorder
+
+def percentiles(values):
+    if not values:
+        return "n/a"
+    values = sorted(values)
+    pick = lambda q: values[min(int(len(values) * q), len(values) - 1)]
+    return "/".join(f"{v:.0f}" for v in (pick(0.5), pick(0.9), pick(0.99), values[-1]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the pollers in virtual time against a timeline")
+    parser.add_argument("--uids", type=int, default=300, help="channels in the synthetic timeline")
+    parser.add_argument("--days", type=float, default=1, help="length of the synthetic timeline")
+    parser.add_argument("--timeline", help="JSON timeline to play instead (see --save-timeline)")
+    parser.add_argument("--events", help="event log to rebuild the timeline from instead")
+    parser.add_argument("--save-timeline", help="write the timeline to this JSON file")
+    parser.add_argument("--interval", type=float, nargs="+", default=[300], help="TARGET_CYCLE_INTERVAL values")
+    parser.add_argument("--min-delay", type=float, nargs="+", default=[5], help="MIN_REQUEST_DELAY values")
+    parser.add_argument("--jitter", type=float, nargs="+", default=[3.0], help="JITTER values")
+    parser.add_argument("--announce-interval", type=float, default=1800, help="ANNOUNCEMENT_CYCLE_INTERVAL")
+    parser.add_argument("--batch-size", type=int, default=1, help="LIVE_BATCH_SIZE")
+    parser.add_argument("--adaptive", action=argparse.BooleanOptionalAction, default=True,
+                        help="ADAPTIVE_LIVE_SCHEDULING")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.timeline:
+        start, duration, timelines = load_timeline(args.timeline)
+    elif args.events:
+        start, duration, timelines = timeline_from_events(args.events)
+    else:
+        start, duration = START, args.days * DAY
+        timelines = synthetic_timeline(args.uids, int(-(-args.days // 1)), args.seed)
+    if args.save_timeline:
+        save_timeline(args.save_timeline, start, duration, timelines)
+
+    # requests never leave the process, any credential will do
+    for key, value in (("SESSDATA", "sim-sessdata"), ("BILI_JCT", "sim-bili-jct"), ("DEDEUSERID", "1")):
+        os.environ.setdefault(key, value)
+
+    streams = sum(len(t[0]) for t in timelines.values())
+    reservations = sum(len(t[1]) for t in timelines.values())
+    print(f"{len(timelines)} channels, {duration / 3600:.0f}h, {streams} streams, {reservations} reservations, "
+          f"{'adaptive' if args.adaptive else 'round-robin'}, batch size {args.batch_size}")
+    print("latency p50/p90/p99/max in seconds")
+    print(f"{'interval':>8} {'delay':>6} {'jitter':>6} {'live/h':>7} {'feed/h':>7} {'start':>18} {'end':>18} {'missed':>6} "
+          f"{'reserve':>18} {'speed':>7}")
+    for interval, min_delay, jitter in itertools.product(args.interval, args.min_delay, args.jitter):
+        random.seed(args.seed)
+        clock = VirtualClock(start)
+        started = time.perf_counter()
+        stats, recorder = clock.run(simulate(timelines, start, duration, clock, args, interval, min_delay, jitter))
+        elapsed = time.perf_counter() - started
+        hours = duration / 3600
+        live = sum(count for endpoint, count in stats["endpoints"].items() if endpoint in LIVE_ENDPOINTS)
+        feed = stats["endpoints"].get(FEED_ENDPOINT, 0)
+        print(f"{interval:>8.0f} {min_delay:>6.1f} {jitter:>6.1f} {live / hours:>7.0f} {feed / hours:>7.0f} "
+              f"{percentiles(recorder.latency['start']):>18} {percentiles(recorder.latency['end']):>18} "
+              f"{recorder.missed(duration):>6} {percentiles(recorder.latency['reserve']):>18} "
+              f"{duration / elapsed:>6.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -1,100 +1,149 @@
 import asyncio
 import time
-import json
-import re
-from datetime import datetime, timezone, timedelta
-from bilibili_api import user
+import dynamic_parser
+import http_client
+import metrics
+from logging_setup import get_logger
+from reservation_store import ReservationStore
+from seen_dynamics import SeenDynamics
+
+log = get_logger("announce")
 
 class AnnouncementPoller:
-    def __init__(self, auth_manager):
+    def __init__(self, auth_manager, store=None, dedup_window=32, max_pages=3, clock=time.time):
+        """
+        Args:
+            auth_manager (AuthManager): Provides the credential used for requests.
+            store (StateStore, optional): Checkpoint store to resume from and persist seen dynamics to.
+            dedup_window (int): Number of recent dynamic IDs remembered per channel.
+            max_pages (int): Max feed pages fetched per poll while catching up on new items.
+            clock (callable): Unix time source, replaceable for simulation.
+        """
         self.auth = auth_manager
-        self.seen_dynamic_ids = set()
+        self.store = store
+        self.clock = clock
+        self.max_pages = max_pages
+        self.seen = SeenDynamics(window=dedup_window)
+        self.reservations = ReservationStore(store)
+        if store:
+            self.seen.load(store.load_dynamic_windows())
+            self.seen.load_legacy(store.load_legacy_seen())
+            self.reservations.load(store.load_reservations())
         
-    async def check_channel(self, uid):
+    async def check_channel(self, uid, credential=None, limiter=None):
         """
         Check specific channel dynamics for stream announcements using V2 API.
+        Uses the given credential, or the AuthManager's one if not set.
+
+        Checks every item of a fetched page against the channel's window, so an item that
+        shows up behind already processed ones is still picked up. Only when a whole page is
+        new (pinned items aside), e.g. after downtime, does it fetch the next page, waiting on
+        the limiter before each extra request.
+        Already processed items are only checked for changes to the reservations they hold.
         Returns a generator of announcement events.
         """
-        if True:
-            print(f"[Announce] Polling channel {uid}...")
-            u = user.User(uid=uid, credential=self.auth.credential)
-            data = await u.get_dynamics_new()
+        log.debug("Polling channel %s...", uid)
+        u = http_client.users.get(uid, credential or self.auth.credential)
+        known = self.seen.watermark(uid) is not None
+        # items older than everything remembered predate the tracking (or moved up after a deletion)
+        floor = self.seen.recent(uid)[0] if known else None
+        offset = ""
+        # before the membership tests below, or a reservation past its grace period would come back as new
+        self.reservations.evict(int(self.clock()))
+        
+        for page in range(self.max_pages):
+            if page > 0:
+                if limiter:
+                    await limiter.wait()
+                log.debug("Fetching page %d for %s...", page + 1, uid)
+            with metrics.REQUEST_SECONDS.time("dynamics"):
+                data = await u.get_dynamics_new(offset)
             
             if 'items' not in data:
                 return
 
+            caught_up = False
             for item in data['items']:
                 dynamic_id = item.get('id_str')
+                if not dynamic_id:
+                    continue
                 
-                if dynamic_id in self.seen_dynamic_ids:
+                if not known and self.seen.adopt(uid, dynamic_id):
+                    # processed before the upgrade to per-channel windows
+                    if self.store:
+                        self.store.save_dynamic_window(uid, self.seen.recent(uid))
+                    is_new = False
+                elif known:
+                    is_new = int(dynamic_id) > floor and self.seen.is_new(uid, dynamic_id)
+                else:
+                    # only the migration above can catch up a channel seen for the first time
+                    is_new = not caught_up and self.seen.is_new(uid, dynamic_id)
+
+                if not is_new:
+                    if not self._is_pinned(item):
+                        caught_up = True
+                    if dynamic_id in self.reservations:
+                        event = self._reservation_event(uid, dynamic_id, item)
+                        if event:
+                            yield event
                     continue
-                self.seen_dynamic_ids.add(dynamic_id)
+                self.seen.add(uid, dynamic_id)
+                if self.store:
+                    self.store.save_dynamic_window(uid, self.seen.recent(uid))
 
-                modules = item.get('modules', {})
-                module_dynamic = modules.get('module_dynamic', {})
-                module_author = modules.get('module_author', {})
-                pub_ts = module_author.get('pub_ts', int(time.time()))
+                event = self._item_event(uid, dynamic_id, item)
+                if event:
+                    yield event
 
-                additional = module_dynamic.get('additional')
-                if additional and additional.get('type') == 'ADDITIONAL_TYPE_RESERVE':
-                    reserve = additional.get('reserve')
-                    start_ts = reserve.get('stime')
-                    
-                    # text format like "预计2024-05-03 12:00发布" (UTC+8)
-                    desc_text = ""
-                    if not start_ts:
-                         desc1 = reserve.get('desc1', {}).get('text', '')
-                         desc2 = reserve.get('desc2', {}).get('text', '')
-                         desc_text = f"{desc1} {desc2}"
-                         
-                         match = re.search(r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2})', desc_text)
-                         if match:
-                             dt_str = match.group(1)
-                             try:
-                                 dt = datetime.strptime(dt_str, "%Y-%m-%d %H:%M")
-                                 tz = timezone(timedelta(hours=8))
-                                 dt = dt.replace(tzinfo=tz)
-                                 start_ts = int(dt.timestamp())
-                             except Exception as e:
-                                 print(f"[Announce] Failed to parse date '{dt_str}': {e}")
+            # a channel seen for the first time only gets its first page, like before
+            if caught_up or not known or not data.get('has_more') or not data.get('offset'):
+                return
+            offset = data['offset']
 
-                    now_ts = int(time.time())
-                    if start_ts and start_ts < (now_ts - 86400):
-                         print(f"[Announce] Ignoring old reservation: {reserve.get('title')} (TS: {start_ts})")
-                         continue
+    def _reservation_event(self, uid, dynamic_id, item):
+        """
+        Returns RESERVATION for a reservation seen for the first time, RESERVATION_UPDATED or
+        RESERVATION_CANCELLED when a known one changed, or None.
+        """
+        details = dynamic_parser.parse_reservation(item)
+        start_ts = details['start_ts']
+        now_ts = int(self.clock())
+        if start_ts and start_ts < (now_ts - 86400) and dynamic_id not in self.reservations:
+             log.debug("Ignoring old reservation: %s (TS: %s)", details['title'], start_ts, extra={'uid': uid})
+             return None
 
-                    yield {
-                        'event_type': 'RESERVATION',
-                        'uid': uid,
-                        'dynamic_id': dynamic_id,
-                        'timestamp': pub_ts,
-                        'details': {
-                            'title': reserve.get('title'),
-                            'start_ts': start_ts,
-                            'description': desc_text or reserve.get('desc1', {}).get('text', ''),
-                            'total_count': reserve.get('stotal'),
-                        },
-                        'raw_data': item
-                    }
-                    continue
+        event_type, previous = self.reservations.check(uid, dynamic_id, details, now_ts)
+        if event_type is None:
+            return None
+        if previous:
+            details['previous'] = {'start_ts': previous['start_ts'], 'title': previous['title']}
+        return {
+            'event_type': event_type,
+            'uid': uid,
+            'dynamic_id': previous['dynamic_id'] if previous else dynamic_id,
+            'timestamp': dynamic_parser.pub_ts(item) if event_type == 'RESERVATION' else now_ts,
+            'details': details,
+            'raw_data': item
+        }
 
-                major = module_dynamic.get('major')
-                if major and major.get('type') == 'MAJOR_TYPE_LIVE_RCMD':
-                    live_rcmd = major.get('live_rcmd')
-                    content = json.loads(live_rcmd.get('content', '{}'))
-                    live_info = content.get('live_play_info', {})
-                    
-                    yield {
-                        'event_type': 'ANNOUNCEMENT_LIVE_START',
-                        'uid': uid,
-                        'dynamic_id': dynamic_id,
-                        'timestamp': pub_ts,
-                        'details': {
-                            'title': live_info.get('title'),
-                            'room_id': live_info.get('room_id'),
-                            'live_status': live_info.get('live_status'),
-                            'link': live_info.get('link'),
-                        },
-                        'raw_data': item
-                    }
-                    continue
+    @staticmethod
+    def _is_pinned(item):
+        return item.get('modules', {}).get('module_tag', {}).get('text') == '置顶'
+
+    def _item_event(self, uid, dynamic_id, item):
+        """Returns the announcement event for a dynamic item, or None if it is not an announcement."""
+        kind = dynamic_parser.classify(item)
+        if kind is None:
+            return None
+
+        if kind == dynamic_parser.KIND_RESERVATION:
+            return self._reservation_event(uid, dynamic_id, item)
+
+        return {
+            'event_type': 'ANNOUNCEMENT_LIVE_START',
+            'uid': uid,
+            'dynamic_id': dynamic_id,
+            'timestamp': dynamic_parser.pub_ts(item),
+            'details': dynamic_parser.parse_live_rcmd(item),
+            'raw_data': item
+        }
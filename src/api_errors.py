@@ -0,0 +1,44 @@
+import asyncio
+from bilibili_api.exceptions import NetworkException, ResponseCodeException
+from curl_cffi.curl import CurlError
+
+# Bilibili rejects requests it considers too many with HTTP 412 (risk control) or 429, or with
+# one of these codes in an otherwise normal response: -412 request intercepted, -352 risk
+# control check failed, -509 and -799 requests too frequent
+RATE_LIMIT_STATUSES = (412, 429)
+RATE_LIMIT_CODES = (-412, -352, -509, -799)
+# API codes meaning the cookies were not accepted: not logged in, CSRF token rejected
+AUTH_ERROR_CODES = (-101, -111)
+
+# error kinds returned by classify()
+RATE_LIMITED = "rate_limited"
+AUTH = "auth"
+# the endpoint did not answer: connection errors, timeouts, 5xx
+UNAVAILABLE = "unavailable"
+# the endpoint answered, but not with what was asked for
+OTHER = "other"
+
+def classify(e):
+    """Sorts an exception raised by a Bilibili request into one of the error kinds above."""
+    if isinstance(e, NetworkException):
+        if e.status in RATE_LIMIT_STATUSES:
+            return RATE_LIMITED
+        return UNAVAILABLE if e.status >= 500 else OTHER
+    if isinstance(e, ResponseCodeException):
+        if e.code in RATE_LIMIT_CODES:
+            return RATE_LIMITED
+        return AUTH if e.code in AUTH_ERROR_CODES else OTHER
+    if isinstance(e, (CurlError, OSError, asyncio.TimeoutError)):
+        return UNAVAILABLE
+    return OTHER
+
+def is_auth_error(e):
+    return classify(e) == AUTH
+
+def error_code(e):
+    """The HTTP status or API code of an error, as a string for metric labels. Empty for other exceptions."""
+    if isinstance(e, NetworkException):
+        return str(e.status)
+    if isinstance(e, ResponseCodeException):
+        return str(e.code)
+    return ""
@@ -1,48 +1,106 @@
 import json
 import os
 import asyncio
-from dotenv import load_dotenv, set_key
+import time
+from urllib.parse import unquote
+from dotenv import load_dotenv, set_key, find_dotenv
 from bilibili_api import Credential, select_client, request_settings
+from logging_setup import get_logger
+
+log = get_logger("auth")
+
+def sessdata_expiry(sessdata):
+    """SESSDATA reads "<token>,<expiry unix ts>,<hash>" once URL-decoded. Returns the expiry, or None."""
+    parts = unquote(sessdata or "").split(",")
+    return int(parts[1]) if len(parts) > 2 and parts[1].isdigit() else None
 
 class AuthManager:
-    def __init__(self, config_path="cookies.json"):
+    """
+    Loads an account's credential and tracks whether it still works.
+
+    Health is inferred from the service's own requests: report_success() after a request
+    made with the credential succeeded, report_auth_error() after one was rejected as
+    not logged in. health() turns these signals into valid / invalid / unknown, and only
+    the unknown case calls for an active check with verify(). A success on the public
+    endpoints shows the account still works for polling, not that it is logged in, so
+    expiry is read from SESSDATA itself.
+    """
+    def __init__(self, config_path="cookies.json", env_suffix=""):
+        """
+        Args:
+            config_path (str): Fallback cookie file for the primary account.
+            env_suffix (str): Reads SESSDATA_<suffix>, BILI_JCT_<suffix>, ... for additional accounts.
+        """
         self.config_path = config_path
+        self.env_suffix = env_suffix
         self.credential = None
+        self.env_path = ""
+        self._env_stamp = None
+
+        # time of the last active check and refresh attempt
+        self.last_check = 0
+        self.last_refresh_attempt = 0
+        self._reset_health()
+
+    def _reset_health(self):
+        # last time the credential worked, last time it was confirmed not to, and
+        # whether a request was rejected since the last active check
+        self._ok_at = None
+        self._failed_at = None
+        self._suspect = False
+
+    def _env_key(self, name):
+        return f"{name}_{self.env_suffix}" if self.env_suffix else name
         
     def setup(self):
         """Loads credentials and configures the API client."""
         load_dotenv()
+        self.env_path = find_dotenv()
+        self._env_stamp = self._stat_env()
         
-        print("Configuring network client...")
+        log.info("Configuring network client...")
         try:
             select_client("curl_cffi")
             request_settings.set("impersonate", "chrome131")
         except Exception as e:
-            print(f"Warning: Failed to set up curl_cffi client: {e}")
-            print("Falling back to default client, which may be more susceptible to rate limits.")
+            log.warning("Failed to set up curl_cffi client: %s", e)
+            log.warning("Falling back to default client, which may be more susceptible to rate limits.")
 
         self.credential = self._load_from_file()
         return self.credential
 
     def reload(self):
         """Forces a reload of credentials from the environment."""
-        print("Reloading credentials...")
+        log.info("Reloading credentials...")
         load_dotenv(override=True)
+        self._env_stamp = self._stat_env()
         self.credential = self._load_from_file()
+        self._reset_health()
         return self.credential
+
+    def _stat_env(self):
+        try:
+            st = os.stat(self.env_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def env_changed(self):
+        """True if .env was modified since the credentials were last loaded, e.g. by login_service.py."""
+        return self._stat_env() != self._env_stamp
     
     def _load_from_file(self):
-        if os.getenv("SESSDATA"):
-            print("Loading credentials from Environment Variables (.env)...")
+        if os.getenv(self._env_key("SESSDATA")):
+            log.info("Loading credentials from Environment Variables (.env)%s...", f" for account {self.env_suffix}" if self.env_suffix else "")
             return Credential(
-                sessdata=os.getenv("SESSDATA"),
-                bili_jct=os.getenv("BILI_JCT") or "",
-                buvid3=os.getenv("BUVID3"),
-                dedeuserid=os.getenv("DEDEUSERID"),
-                ac_time_value=os.getenv("AC_TIME_VALUE")
+                sessdata=os.getenv(self._env_key("SESSDATA")),
+                bili_jct=os.getenv(self._env_key("BILI_JCT")) or "",
+                buvid3=os.getenv(self._env_key("BUVID3")),
+                dedeuserid=os.getenv(self._env_key("DEDEUSERID")),
+                ac_time_value=os.getenv(self._env_key("AC_TIME_VALUE"))
             )
 
-        if os.path.exists(self.config_path):
+        if not self.env_suffix and os.path.exists(self.config_path):
             try:
                 with open(self.config_path, 'r', encoding='utf-8') as f:
                     cookies = json.load(f)
@@ -54,14 +112,14 @@ class AuthManager:
                     dedeuserid=cookies.get("dedeuserid"),
                     ac_time_value=cookies.get("ac_time_value")
                 )
-                print(f"Loaded credentials for DedeUserID: {cookies.get('dedeuserid')}")
+                log.info("Loaded credentials for DedeUserID: %s", cookies.get('dedeuserid'))
                 return cred
             except Exception as e:
-                print(f"Error loading {self.config_path}: {e}")
+                log.error("Error loading %s: %s", self.config_path, e)
                 return None
         
-        print("No credentials found in .env or cookies.json.")
-        print("Please copy .env.example to .env and fill in your values.")
+        log.warning("No credentials found in .env or cookies.json.")
+        log.warning("Please copy .env.example to .env and fill in your values.")
         return None
 
     async def check_validity(self):
@@ -70,27 +128,84 @@ class AuthManager:
             return False
         return await self.credential.check_valid()
 
+    def expires_at(self):
+        return sessdata_expiry(self.credential.sessdata) if self.credential else None
+
+    def report_success(self, now=None):
+        """Records a request that succeeded with this credential. Ignored once it is confirmed invalid."""
+        if self._failed_at is None:
+            self._ok_at = time.time() if now is None else now
+            self._suspect = False
+
+    def report_auth_error(self):
+        """Records a request rejected as not logged in. The next health() asks for an active check."""
+        self._suspect = True
+
+    def health(self, max_silence, now=None, recheck_after=None):
+        """
+        Returns True if the credential recently worked, False if it is known not to, and
+        None if an active check is needed: after an auth error, or when nothing confirmed it for max_silence seconds.
+        A credential that failed an active check is due for another one after recheck_after seconds, if set.
+        """
+        now = time.time() if now is None else now
+        if not self.credential:
+            return False
+        expires = self.expires_at()
+        if expires and expires <= now:
+            return False
+        if self._suspect:
+            return None
+        if self._failed_at is not None:
+            if recheck_after is not None and now - self._failed_at >= recheck_after:
+                return None
+            return False
+        if self._ok_at is not None and now - self._ok_at < max_silence:
+            return True
+        return None
+
+    async def verify(self):
+        """Active check against the API. The result replaces the passive signals."""
+        now = time.time()
+        self.last_check = now
+        valid = await self.check_validity()
+        self._suspect = False
+        if valid:
+            self._ok_at, self._failed_at = now, None
+        else:
+            self._failed_at = now
+        return valid
+
+    def refresh_due(self, before, retry_interval, now=None):
+        """True if SESSDATA expires within `before` seconds and can be refreshed, at most once per retry_interval."""
+        now = time.time() if now is None else now
+        expires = self.expires_at()
+        return bool(expires and expires - now < before and self.credential.ac_time_value
+                    and now - self.last_refresh_attempt >= retry_interval)
+
     async def refresh_cookies(self):
         """Attempts to refresh the session using the stored refresh token."""
         if not self.credential:
-            print("No credential loaded, cannot refresh.")
+            log.warning("No credential loaded, cannot refresh.")
             return False
             
         try:
-            print("Refreshing session cookies...")
+            log.info("Refreshing session cookies...")
+            self.last_refresh_attempt = time.time()
             await self.credential.refresh()
             
-            print("Saving new cookies to .env...")
-            env_path = ".env"
-            set_key(env_path, "SESSDATA", self.credential.sessdata)
-            set_key(env_path, "BILI_JCT", self.credential.bili_jct)
-            set_key(env_path, "DEDEUSERID", self.credential.dedeuserid)
-            set_key(env_path, "BUVID3", self.credential.buvid3)
+            log.info("Saving new cookies to .env...")
+            env_path = self.env_path or ".env"
+            set_key(env_path, self._env_key("SESSDATA"), self.credential.sessdata)
+            set_key(env_path, self._env_key("BILI_JCT"), self.credential.bili_jct)
+            set_key(env_path, self._env_key("DEDEUSERID"), self.credential.dedeuserid)
+            set_key(env_path, self._env_key("BUVID3"), self.credential.buvid3)
             
             if self.credential.ac_time_value:
-                set_key(env_path, "AC_TIME_VALUE", self.credential.ac_time_value)
-                
+                set_key(env_path, self._env_key("AC_TIME_VALUE"), self.credential.ac_time_value)
+
+            self._env_stamp = self._stat_env()
+            self._ok_at, self._failed_at, self._suspect = time.time(), None, False
             return True
         except Exception as e:
-            print(f"Failed to refresh session: {e}")
+            log.error("Failed to refresh session: %s", e)
             return False
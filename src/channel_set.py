@@ -0,0 +1,125 @@
+import asyncio
+import json
+import os
+from dotenv import dotenv_values
+from logging_setup import get_logger
+
+log = get_logger("channels")
+
+def parse_uids(text):
+    """Reads UIDs separated by commas or whitespace, ignoring anything that is not a number."""
+    return [int(u) for u in text.replace(",", " ").split() if u.isdigit()]
+
+def load_uids(path):
+    """
+    Reads UIDs from a .env file (its TRACKED_UIDS value) or a channel file with one or more
+    UIDs per line and # comments. Returns None if a .env file has no TRACKED_UIDS.
+    """
+    if os.path.basename(path).endswith(".env"):
+        value = dotenv_values(path).get("TRACKED_UIDS")
+        return parse_uids(value) if value is not None else None
+    with open(path, encoding="utf-8") as f:
+        return parse_uids(" ".join(line.split("#", 1)[0] for line in f))
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+def _uid_list(values):
+    if not isinstance(values, list):
+        raise TypeError("expected a list of UIDs")
+    return [int(uid) for uid in values]
+
+def _json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class ChannelSet:
+    """
+    The tracked channels, changeable while the service runs. Changes are diffed against the
+    current set and passed to on_change(added, removed), so channels that are not part of a
+    change keep their schedule and state.
+
+    Changes come from:
+        watch(path)             re-reads a channel file or .env whenever it changes
+        GET /admin/channels     lists the tracked UIDs
+        POST /admin/channels    {"add": [uid, ...], "remove": [uid, ...]}
+        PUT /admin/channels     {"uids": [uid, ...]} replaces the whole set
+
+    A change to the watched file replaces the set, including channels added over the API.
+    """
+    def __init__(self, uids, on_change=None):
+        """
+        Args:
+            uids (iterable): Channels tracked at startup.
+            on_change (callable, optional): Called with (added, removed) lists of UIDs after each change.
+        """
+        self.uids = set(uids)
+        self.on_change = on_change
+
+    def __len__(self):
+        return len(self.uids)
+
+    def __contains__(self, uid):
+        return uid in self.uids
+
+    def __iter__(self):
+        return iter(self.uids)
+
+    def update(self, add=(), remove=()):
+        """Adds and removes channels. Returns the (added, removed) UIDs that actually changed."""
+        remove = set(remove)
+        added = [uid for uid in dict.fromkeys(add) if uid not in self.uids and uid not in remove]
+        removed = [uid for uid in remove if uid in self.uids]
+        if not added and not removed:
+            return [], []
+
+        self.uids.update(added)
+        self.uids.difference_update(removed)
+        log.info("Channels changed: %d added, %d removed, %d tracked", len(added), len(removed), len(self.uids))
+        if self.on_change:
+            self.on_change(added, removed)
+        return added, removed
+
+    def replace(self, uids):
+        """Makes `uids` the tracked set, applying only the difference."""
+        uids = list(dict.fromkeys(uids))
+        keep = set(uids)
+        return self.update(add=uids, remove=[uid for uid in self.uids if uid not in keep])
+
+    async def watch(self, path, interval=5):
+        """Replaces the set with the UIDs in `path` whenever its modification time or size changes."""
+        last = _stat(path)
+        while True:
+            await asyncio.sleep(interval)
+            current = _stat(path)
+            if current == last or current is None:
+                continue
+            last = current
+            try:
+                uids = load_uids(path)
+            except Exception as e:
+                log.error("Error reading channels from %s: %s", path, e)
+                continue
+            if uids is None:
+                log.warning("No TRACKED_UIDS in %s, keeping the current channels", path)
+                continue
+            self.replace(uids)
+
+    def routes(self, server, path="/admin/channels"):
+        server.route(path, self.handle, methods=("GET", "POST", "PUT"))
+
+    def handle(self, request):
+        if request.method in ("GET", "HEAD"):
+            return 200, {"Content-Type": "application/json"}, _json({'uids': sorted(self.uids)})
+        try:
+            body = json.loads(request.body or b"{}")
+            if request.method == "PUT":
+                added, removed = self.replace(_uid_list(body['uids']))
+            else:
+                added, removed = self.update(_uid_list(body.get('add', [])), _uid_list(body.get('remove', [])))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return 400, {"Content-Type": "text/plain"}, f"invalid request: {e}\n".encode("utf-8")
+        return 200, {"Content-Type": "application/json"}, _json({'added': added, 'removed': removed, 'tracked': len(self.uids)})
@@ -0,0 +1,327 @@
+import asyncio
+import json
+import time
+from hash_ring import HashRing
+from logging_setup import get_logger
+
+log = get_logger("cluster")
+
+# Coordinator <-> worker protocol: one JSON object per line over TCP.
+#   worker -> coordinator   {"type": "hello", "worker": name}
+#                           {"type": "event", "event": {...}}
+#                           {"type": "live_state", "uid": uid, "state": {...}}
+#                           {"type": "dynamic_window", "uid": uid, "ids": [...]}
+#                           {"type": "reservation", "entry": {...}}
+#                           {"type": "reservation_deleted", "rid": rid}
+#                           {"type": "heartbeat"}
+#   coordinator -> worker   {"type": "assign", "uids": [...], "states": {uid: state}, "windows": {uid: ids},
+#                            "reservations": [entry, ...]}
+# An assignment lists all channels of the worker; states, windows and reservations only cover the newly assigned ones.
+
+# events can carry a whole raw dynamic item
+LINE_LIMIT = 16 * 1024 * 1024
+
+def _encode(message):
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+async def _read(reader):
+    line = await reader.readline()
+    return json.loads(line) if line else None
+
+class _Worker:
+    def __init__(self, name, writer):
+        self.name = name
+        self.writer = writer
+        # None until the first assignment, which is always sent
+        self.uids = None
+        self.last_seen = time.monotonic()
+
+class Coordinator:
+    """
+    Splits the tracked channels across worker processes, which may run on other machines
+    with their own accounts and egress IPs. Channels are assigned with a consistent hash ring
+    over the names of the connected workers, so a worker joining or leaving only moves its
+    own share, and a worker that reconnects under the same name gets the same share back.
+
+    Workers stream their events and every change of their channel state back. The coordinator
+    keeps that state, so when a worker disconnects or misses its heartbeats, its channels move
+    to the remaining workers together with their live state, dynamic windows and tracked
+    reservations and continue without a re-sync.
+    """
+    def __init__(self, channels, on_event, monitor, store, host="127.0.0.1", port=9109,
+                 heartbeat_timeout=30, replicas=100):
+        """
+        Args:
+            channels (ChannelSet): Channels to distribute. Set its on_change to rebalance().
+            on_event (callable): Async callback for events received from workers.
+            monitor (LiveMonitor): Holds the channel states, kept up to date from the workers.
+            store (StateStore): Checkpoint store for the channel states and dynamic windows.
+            host (str): Interface to listen on.
+            port (int): Port to listen on (0 = any free port, see .port after start()).
+            heartbeat_timeout (float): Seconds without any message after which a worker is dropped.
+            replicas (int): Virtual points per worker on the hash ring.
+        """
+        self.channels = channels
+        self.on_event = on_event
+        self.monitor = monitor
+        self.store = store
+        self.host = host
+        self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.replicas = replicas
+
+        self.windows = store.load_dynamic_windows()
+        self.reservations = {entry['rid']: entry for entry in store.load_reservations()}
+        self.workers = {}
+        self._ring = HashRing([], replicas)
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port, limit=LINE_LIMIT)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            for worker in list(self.workers.values()):
+                worker.writer.close()
+            self.workers.clear()
+            await self._server.wait_closed()
+            self._server = None
+
+    def shares(self):
+        """Returns {worker name: number of assigned channels}."""
+        return {name: len(worker.uids or ()) for name, worker in self.workers.items()}
+
+    def rebalance(self, added=(), removed=()):
+        """
+        Recomputes every worker's share and sends those that changed.
+        Takes the (added, removed) arguments of ChannelSet.on_change, but always looks at the whole set.
+        """
+        names = sorted(self.workers)
+        if names != self._ring.nodes:
+            self._ring = HashRing(names, self.replicas)
+        shares = {name: set() for name in names}
+        if names:
+            for uid in self.channels:
+                shares[names[self._ring.owner(uid)]].add(uid)
+        for name, share in shares.items():
+            worker = self.workers[name]
+            if share != worker.uids:
+                self._assign(worker, share)
+
+    def _assign(self, worker, share):
+        new = share - (worker.uids or set())
+        worker.uids = share
+        states = self.monitor.states
+        worker.writer.write(_encode({
+            'type': 'assign',
+            'uids': sorted(share),
+            'states': {uid: states[uid] for uid in new if uid in states},
+            'windows': {uid: self.windows[uid] for uid in new if uid in self.windows},
+            'reservations': [entry for entry in self.reservations.values() if entry['uid'] in new],
+        }))
+        log.info("Assigned %d channels to worker %s (%d new)", len(share), worker.name, len(new))
+
+    def _drop(self, worker, reason):
+        if self.workers.get(worker.name) is not worker:
+            return
+        del self.workers[worker.name]
+        worker.writer.close()
+        log.warning("Worker %s %s, moving its %d channels", worker.name, reason, len(worker.uids or ()))
+        self.rebalance()
+
+    async def _serve(self, reader, writer):
+        worker = None
+        try:
+            hello = await _read(reader)
+            if not hello or hello.get('type') != 'hello':
+                return
+            name = str(hello['worker'])
+            previous = self.workers.get(name)
+            if previous:
+                # the worker restarted before its old connection timed out
+                previous.writer.close()
+            worker = self.workers[name] = _Worker(name, writer)
+            log.info("Worker %s connected from %s", name, writer.get_extra_info('peername'))
+            self.rebalance()
+
+            while (message := await _read(reader)) is not None:
+                worker.last_seen = time.monotonic()
+                await self._handle(message)
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, KeyError) as e:
+            log.warning("Bad connection from %s: %s", worker.name if worker else writer.get_extra_info('peername'), e)
+        finally:
+            writer.close()
+            if worker:
+                self._drop(worker, "disconnected")
+
+    async def _handle(self, message):
+        kind = message.get('type')
+        if kind == 'event':
+            await self.on_event(message['event'])
+        elif kind == 'live_state':
+            uid, state = message['uid'], message['state']
+            self.monitor.states[uid] = state
+            self.store.save_live_state(uid, state)
+        elif kind == 'dynamic_window':
+            uid, ids = message['uid'], message['ids']
+            self.windows[uid] = ids
+            self.store.save_dynamic_window(uid, ids)
+        elif kind == 'reservation':
+            entry = message['entry']
+            self.reservations[entry['rid']] = entry
+            self.store.save_reservation(entry)
+        elif kind == 'reservation_deleted':
+            self.reservations.pop(message['rid'], None)
+            self.store.delete_reservation(message['rid'])
+
+    async def watch_heartbeats(self):
+        """Drops workers that have not sent anything for heartbeat_timeout."""
+        while True:
+            await asyncio.sleep(self.heartbeat_timeout / 3)
+            cutoff = time.monotonic() - self.heartbeat_timeout
+            for worker in list(self.workers.values()):
+                if worker.last_seen < cutoff:
+                    self._drop(worker, "missed its heartbeats")
+
+class WorkerLink:
+    """
+    A worker's connection to the coordinator. It serves as the worker's sink, forwarding
+    events, and as its state store: state changes are forwarded, and the state of newly
+    assigned channels arrives with the assignment. While disconnected the worker has no
+    channels, since the coordinator has moved them to the other workers.
+    """
+    def __init__(self, name, host="127.0.0.1", port=9109, on_assign=None, heartbeat_interval=5, reconnect_delay=5):
+        """
+        Args:
+            name (str): Worker name. Decides the worker's share, keep it stable across restarts.
+            host (str): Coordinator address.
+            port (int): Coordinator port.
+            on_assign (callable, optional): Called with (uids, states, windows, reservations) for every assignment after the first.
+            heartbeat_interval (float): Seconds between heartbeats.
+            reconnect_delay (float): Seconds between connection attempts.
+        """
+        self.name = name
+        self.host = host
+        self.port = port
+        self.on_assign = on_assign
+        self.heartbeat_interval = heartbeat_interval
+        self.reconnect_delay = reconnect_delay
+
+        self.assigned = []
+        self._pending = ({}, {}, [])
+        self._reader = None
+        self._writer = None
+
+    @property
+    def connected(self):
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def connect(self):
+        """Connects and waits for the first assignment, retrying until the coordinator is reachable."""
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT)
+                self._writer.write(_encode({'type': 'hello', 'worker': self.name}))
+                message = await _read(self._reader)
+                if message and message.get('type') == 'assign':
+                    log.info("Connected to coordinator at %s:%s as %s", self.host, self.port, self.name)
+                    self._apply(message)
+                    return
+                log.warning("Coordinator at %s:%s closed the connection", self.host, self.port)
+            except (OSError, ValueError) as e:
+                log.warning("Cannot reach coordinator at %s:%s: %s", self.host, self.port, e)
+            self._disconnect()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def run(self):
+        """Applies assignments and sends heartbeats, reconnecting whenever the connection drops."""
+        while True:
+            if not self.connected:
+                await self.connect()
+            heartbeat = asyncio.create_task(self._heartbeat())
+            try:
+                while (message := await _read(self._reader)) is not None:
+                    if message.get('type') == 'assign':
+                        self._apply(message)
+            except (ConnectionError, ValueError) as e:
+                log.warning("Connection to coordinator failed: %s", e)
+            finally:
+                heartbeat.cancel()
+            log.warning("Lost connection to coordinator, releasing all channels")
+            self._disconnect()
+            self._apply({'uids': []})
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            self._write({'type': 'heartbeat'})
+
+    def _apply(self, message):
+        self.assigned = message.get('uids', [])
+        states = {int(uid): state for uid, state in message.get('states', {}).items()}
+        windows = {int(uid): ids for uid, ids in message.get('windows', {}).items()}
+        reservations = message.get('reservations', [])
+        if self.on_assign:
+            self.on_assign(self.assigned, states, windows, reservations)
+        else:
+            self._pending = (states, windows, reservations)
+
+    def _disconnect(self):
+        if self._writer:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    def _write(self, message):
+        if self.connected:
+            self._writer.write(_encode(message))
+
+    # sink interface
+
+    async def start(self):
+        pass
+
+    async def send(self, event):
+        self._write({'type': 'event', 'event': event})
+        if self.connected:
+            try:
+                await self._writer.drain()
+            except ConnectionError:
+                pass
+
+    async def close(self):
+        self._disconnect()
+
+    # state store interface, for LiveMonitor, AnnouncementPoller and its ReservationStore
+
+    def load_live_states(self):
+        return self._pending[0]
+
+    def load_dynamic_windows(self):
+        return self._pending[1]
+
+    def save_live_state(self, uid, state):
+        self._write({'type': 'live_state', 'uid': uid, 'state': state})
+
+    def save_dynamic_window(self, uid, dynamic_ids):
+        self._write({'type': 'dynamic_window', 'uid': uid, 'ids': dynamic_ids})
+
+    def load_reservations(self):
+        return self._pending[2]
+
+    def load_legacy_seen(self):
+        # the coordinator's checkpoint is in the current format
+        return []
+
+    def drop_legacy_seen(self):
+        pass
+
+    def save_reservation(self, entry):
+        self._write({'type': 'reservation', 'entry': entry})
+
+    def delete_reservation(self, rid):
+        self._write({'type': 'reservation_deleted', 'rid': rid})
+
+    def flush(self):
+        pass
@@ -0,0 +1,87 @@
+import os
+import re
+from auth_manager import AuthManager
+from hash_ring import HashRing
+
+class Account:
+    """One Bilibili account with its validity state and a request budget per API family."""
+    def __init__(self, name, auth, budget_factory):
+        """
+        Args:
+            name (str): Account name, "primary" or the .env suffix.
+            auth (AuthManager): The account's credential.
+            budget_factory (callable): Called with (account name, family) to create an EndpointBudget.
+        """
+        self.name = name
+        self.auth = auth
+        self.budget_factory = budget_factory
+        self.budgets = {}
+        self.valid = True
+
+    @property
+    def credential(self):
+        return self.auth.credential
+
+    def budget(self, family):
+        budget = self.budgets.get(family)
+        if budget is None:
+            budget = self.budgets[family] = self.budget_factory(self.name, family)
+        return budget
+
+    def is_healthy(self, family):
+        return self.valid and self.auth.credential is not None and self.budget(family).available()
+
+class CredentialPool:
+    """
+    Shards polling across several accounts.
+    UIDs are assigned to accounts with a consistent hash ring, so adding or removing an
+    account only moves the UIDs of that account. While an account is invalid or backed off,
+    its budget for an API family is backed off or its circuit open, its UIDs temporarily go to
+    the next healthy account on the ring for that family.
+    """
+    def __init__(self, accounts, replicas=100):
+        """
+        Args:
+            accounts (list): Account instances.
+            replicas (int): Virtual nodes per account on the hash ring.
+        """
+        self.accounts = list(accounts)
+        self._ring = HashRing([account.name for account in self.accounts], replicas)
+
+    def __len__(self):
+        return len(self.accounts)
+
+    @classmethod
+    def from_env(cls, budget_factory):
+        """
+        Builds the pool from .env: the primary account (SESSDATA, ...) plus one account per
+        SESSDATA_<suffix> key. Accounts without credentials are skipped.
+        """
+        suffixes = [""] + sorted(m.group(1) for m in (re.match(r"^SESSDATA_(\w+)$", k) for k in os.environ) if m)
+        accounts = []
+        for suffix in suffixes:
+            auth = AuthManager(env_suffix=suffix)
+            if auth.setup():
+                accounts.append(Account(suffix or "primary", auth, budget_factory))
+        return cls(accounts)
+
+    def owner(self, uid):
+        """Returns the account a UID is assigned to, regardless of its health."""
+        return self._walk(uid, None)
+
+    def account_for(self, uid, family):
+        """Returns the account that should request `family` endpoints for a UID right now, preferring its owner if healthy."""
+        return self._walk(uid, family) or self.owner(uid)
+
+    def _walk(self, uid, family):
+        for index in self._ring.walk(uid):
+            account = self.accounts[index]
+            if family is None or account.is_healthy(family):
+                return account
+        return None
+
+    def healthy_count(self, family):
+        return sum(1 for account in self.accounts if account.is_healthy(family))
+
+    def valid_count(self):
+        return sum(1 for account in self.accounts if account.valid)
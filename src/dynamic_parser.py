@@ -0,0 +1,89 @@
+import json
+import re
+import time
+from datetime import datetime, timezone, timedelta
+from functools import lru_cache
+from logging_setup import get_logger
+
+log = get_logger("announce")
+
+# Item kinds that produce announcement events; everything else is ignored
+KIND_RESERVATION = "reservation"
+KIND_LIVE_RCMD = "live_rcmd"
+
+_TYPE_RESERVE = 'ADDITIONAL_TYPE_RESERVE'
+_TYPE_LIVE_RCMD = 'MAJOR_TYPE_LIVE_RCMD'
+
+_UTC8 = timezone(timedelta(hours=8))
+_RESERVE_TIME = re.compile(r'(\d{4})-(\d{2})-(\d{2})\s+(\d{2}):(\d{2})')
+# a withdrawn reservation has a negative state, or says so in its first line ("预约已取消", "已失效")
+_RESERVE_CANCELLED = re.compile(r'取消|失效')
+
+def classify(item):
+    """
+    Returns the kind of a dynamic item from its additional/major type, or None for
+    ordinary posts. Only looks at the two type fields, nothing else is decoded.
+    """
+    module_dynamic = item.get('modules', {}).get('module_dynamic')
+    if not module_dynamic:
+        return None
+
+    additional = module_dynamic.get('additional')
+    if additional and additional.get('type') == _TYPE_RESERVE:
+        return KIND_RESERVATION
+
+    major = module_dynamic.get('major')
+    if major and major.get('type') == _TYPE_LIVE_RCMD:
+        return KIND_LIVE_RCMD
+    return None
+
+def pub_ts(item):
+    return item.get('modules', {}).get('module_author', {}).get('pub_ts', int(time.time()))
+
+@lru_cache(maxsize=1024)
+def parse_reserve_time(text):
+    """
+    Extracts the start time from reservation text like "预计2024-05-03 12:00发布" (UTC+8).
+    Results are cached, since the same texts come back on every poll.
+    """
+    match = _RESERVE_TIME.search(text)
+    if not match:
+        return None
+    try:
+        year, month, day, hour, minute = map(int, match.groups())
+        return int(datetime(year, month, day, hour, minute, tzinfo=_UTC8).timestamp())
+    except ValueError as e:
+        log.warning("Failed to parse date '%s': %s", match.group(0), e)
+        return None
+
+def parse_reservation(item):
+    """Returns the details of a KIND_RESERVATION item."""
+    reserve = item['modules']['module_dynamic']['additional'].get('reserve') or {}
+    start_ts = reserve.get('stime')
+    desc1 = (reserve.get('desc1') or {}).get('text', '')
+
+    desc_text = ""
+    if not start_ts:
+        desc2 = (reserve.get('desc2') or {}).get('text', '')
+        desc_text = f"{desc1} {desc2}"
+        start_ts = parse_reserve_time(desc_text)
+
+    return {
+        'rid': reserve.get('rid'),
+        'title': reserve.get('title'),
+        'start_ts': start_ts,
+        'description': desc_text or desc1,
+        'total_count': reserve.get('stotal'),
+        'cancelled': (reserve.get('state') or 0) < 0 or bool(_RESERVE_CANCELLED.search(desc1)),
+    }
+
+def parse_live_rcmd(item):
+    """Returns the details of a KIND_LIVE_RCMD item. Its content is a JSON string, decoded only here."""
+    live_rcmd = item['modules']['module_dynamic']['major'].get('live_rcmd') or {}
+    live_info = json.loads(live_rcmd.get('content') or '{}').get('live_play_info', {})
+    return {
+        'title': live_info.get('title'),
+        'room_id': live_info.get('room_id'),
+        'live_status': live_info.get('live_status'),
+        'link': live_info.get('link'),
+    }
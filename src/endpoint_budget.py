@@ -0,0 +1,146 @@
+import time
+import api_errors
+from logging_setup import get_logger
+
+log = get_logger("ratelimit")
+
+class CircuitBreaker:
+    """
+    Stops requests to an endpoint that keeps failing.
+
+    closed      requests go through. `threshold` consecutive failures open the breaker.
+    open        requests are refused for `cooldown` seconds, doubled for every failed probe
+                up to max_cooldown.
+    half_open   after the cooldown a single probe request goes through. Its success closes
+                the breaker, its failure opens it again.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, threshold=5, cooldown=30, max_cooldown=600, probe_timeout=60, clock=time.monotonic):
+        """
+        Args:
+            threshold (int): Consecutive failures that open the breaker.
+            cooldown (float): Seconds the breaker stays open the first time.
+            max_cooldown (float): Upper bound of the cooldown after repeated failed probes.
+            probe_timeout (float): Seconds after which a probe without result is written off and another one is let through.
+            clock (callable): Monotonic time source, replaceable for simulation.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.probe_timeout = probe_timeout
+        self.clock = clock
+
+        self.state = self.CLOSED
+        self.failures = 0
+        self.current_cooldown = cooldown
+        self.open_until = 0
+        self._probe_started = None
+
+    def allow(self):
+        """Whether a request may go out now. In the half-open state this takes the single probe slot."""
+        if self.state == self.CLOSED:
+            return True
+        now = self.clock()
+        if self.state == self.OPEN:
+            if now < self.open_until:
+                return False
+            self.state = self.HALF_OPEN
+        elif self._probe_started is not None and now - self._probe_started < self.probe_timeout:
+            return False
+        self._probe_started = now
+        return True
+
+    def available(self):
+        """Like allow(), but without taking the probe slot."""
+        if self.state == self.CLOSED:
+            return True
+        now = self.clock()
+        if self.state == self.OPEN:
+            return now >= self.open_until
+        return self._probe_started is None or now - self._probe_started >= self.probe_timeout
+
+    def retry_after(self):
+        """Seconds until allow() may return True again."""
+        if self.state == self.OPEN:
+            return max(0, self.open_until - self.clock())
+        if self.state == self.HALF_OPEN and self._probe_started is not None:
+            return max(0, self._probe_started + self.probe_timeout - self.clock())
+        return 0
+
+    def record_success(self):
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self.state = self.CLOSED
+            self.current_cooldown = self.cooldown
+            self._probe_started = None
+            return True
+        return False
+
+    def record_failure(self):
+        """Returns True if this failure opened the breaker."""
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.current_cooldown = min(self.current_cooldown * 2, self.max_cooldown)
+        elif self.state == self.OPEN or self.failures < self.threshold:
+            return False
+        self.state = self.OPEN
+        self.open_until = self.clock() + self.current_cooldown
+        self._probe_started = None
+        return True
+
+class EndpointBudget:
+    """
+    Request budget of one account for one family of API endpoints: a rate limiter that
+    backs off on rate limit errors, and a circuit breaker that stops requests to an
+    endpoint that is down. Bilibili rate-limits its endpoint families separately, so each
+    family has its own budget and a failing one does not slow down the others.
+    """
+    def __init__(self, name, limiter, breaker):
+        """
+        Args:
+            name (str): For logs, e.g. "<account>/<family>".
+            limiter (GlobalRateLimiter): Spaces requests and backs off on rate limit errors.
+            breaker (CircuitBreaker): Stops requests while the endpoint keeps failing.
+        """
+        self.name = name
+        self.limiter = limiter
+        self.breaker = breaker
+
+    def available(self):
+        """Whether a request could go out without waiting for a backoff or an open breaker."""
+        return self.limiter.backoff_remaining() == 0 and self.breaker.available()
+
+    async def wait(self):
+        """Waits until the breaker lets a request through, then for the rate limiter's next slot."""
+        while not self.breaker.allow():
+            # while a probe is out its result may close the breaker at any moment
+            is_open = self.breaker.state == CircuitBreaker.OPEN
+            await self.limiter.sleep(max(self.breaker.retry_after(), 1.0) if is_open else 1.0)
+        await self.limiter.wait()
+
+    def report_success(self):
+        self.limiter.report_success()
+        if self.breaker.record_success():
+            log.info("✅ [%s] Endpoint recovered, circuit closed.", self.name)
+
+    def report_error(self, kind):
+        """
+        Feeds a failed request into the limiter and breaker. `kind` is an api_errors kind.
+        Errors that show the endpoint answering (auth, other) count as a sign of life for the breaker.
+        """
+        if kind == api_errors.RATE_LIMITED:
+            self.limiter.trigger_backoff()
+        if kind not in (api_errors.RATE_LIMITED, api_errors.UNAVAILABLE):
+            if self.breaker.record_success():
+                log.info("✅ [%s] Endpoint answering again, circuit closed.", self.name)
+            return
+        probing = self.breaker.state == CircuitBreaker.HALF_OPEN
+        if self.breaker.record_failure():
+            if probing:
+                log.warning("⚠️ [%s] Probe failed, circuit open for another %.0fs.", self.name, self.breaker.current_cooldown)
+            else:
+                log.warning("⚠️ [%s] %d failures in a row, circuit open for %.0fs.", self.name,
+                            self.breaker.failures, self.breaker.current_cooldown)
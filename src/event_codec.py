@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# container formats for the event log
+FORMAT_JSONL = "jsonl"
+FORMAT_MSGPACK = "msgpack"
+
+# what to do with the raw dynamic item attached to announcement events
+RAW_INLINE = "inline"
+RAW_DROP = "drop"
+RAW_STORE = "store"
+
+_LENGTH = struct.Struct(">I")
+
+class RawStore:
+    """
+    Content-addressed store for event raw_data.
+    Each payload is written once to <dir>/<aa>/<sha256>.json and referenced by its hash.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def _file(self, digest):
+        return os.path.join(self.path, digest[:2], f"{digest}.json")
+
+    def put(self, data):
+        """Stores a payload if it is not stored yet and returns its reference."""
+        body = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(body).hexdigest()
+        file_path = self._file(digest)
+        if not os.path.exists(file_path):
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = f"{file_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, file_path)
+        return f"sha256:{digest}"
+
+    def get(self, ref):
+        digest = ref.split(":", 1)[1]
+        with open(self._file(digest), "rb") as f:
+            return json.loads(f.read())
+
+class EventEncoder:
+    """
+    Turns events into the bytes appended to the event log.
+
+    JSONL writes one JSON object per line. MSGPACK writes each event as a
+    4-byte big-endian length followed by the msgpack body.
+    raw_data is kept inline, dropped, or moved to a RawStore and replaced by a `raw_ref` hash.
+    """
+    def __init__(self, fmt=FORMAT_JSONL, raw_data=RAW_INLINE, raw_store=None):
+        """
+        Args:
+            fmt (str): FORMAT_JSONL or FORMAT_MSGPACK.
+            raw_data (str): RAW_INLINE, RAW_DROP or RAW_STORE.
+            raw_store (RawStore, optional): Required with RAW_STORE.
+        """
+        if fmt not in (FORMAT_JSONL, FORMAT_MSGPACK):
+            raise ValueError(f"Unknown event format: {fmt}")
+        if raw_data not in (RAW_INLINE, RAW_DROP, RAW_STORE):
+            raise ValueError(f"Unknown raw_data mode: {raw_data}")
+        if fmt == FORMAT_MSGPACK and msgpack is None:
+            raise RuntimeError("The msgpack event format requires the msgpack package")
+        if raw_data == RAW_STORE and raw_store is None:
+            raise ValueError("raw_data='store' requires a raw_store")
+
+        self.fmt = fmt
+        self.raw_data = raw_data
+        self.raw_store = raw_store
+
+    def encode(self, event):
+        if 'raw_data' in event and self.raw_data != RAW_INLINE:
+            event = dict(event)
+            raw = event.pop('raw_data')
+            if self.raw_data == RAW_STORE:
+                event['raw_ref'] = self.raw_store.put(raw)
+
+        if self.fmt == FORMAT_MSGPACK:
+            body = msgpack.packb(event, use_bin_type=True)
+            return _LENGTH.pack(len(body)) + body
+        return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+def read_events(path, raw_store=None):
+    """
+    Yields the events of a log written by EventEncoder, in either format.
+    The format is detected from the first byte. When a RawStore is given,
+    `raw_ref` entries are resolved back into `raw_data`.
+    """
+    with open(path, "rb") as f:
+        first = f.read(1)
+        f.seek(0)
+        if not first:
+            return
+
+        if first == b"{":
+            events = (json.loads(line) for line in f if line.strip())
+        else:
+            if msgpack is None:
+                raise RuntimeError(f"{path} is in msgpack format, which requires the msgpack package")
+            events = _read_msgpack(f)
+
+        for event in events:
+            if raw_store and 'raw_ref' in event:
+                event['raw_data'] = raw_store.get(event['raw_ref'])
+            yield event
+
+def _read_msgpack(f):
+    while True:
+        header = f.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            return
+        (length,) = _LENGTH.unpack(header)
+        body = f.read(length)
+        if len(body) < length:
+            # truncated tail from an interrupted write
+            return
+        yield msgpack.unpackb(body, raw=False)
+
+def iter_records(buf, start=0, end=None):
+    """
+    Yields (offset, event) for the records of an encoded log held in a bytes-like object
+    (e.g. an mmap), from `start` up to `end`. The format is detected from the first byte of the buffer.
+    """
+    end = len(buf) if end is None else end
+    if start >= end:
+        return
+    if buf[0:1] == b"{":
+        offset = start
+        while offset < end:
+            newline = buf.find(b"\n", offset, end)
+            if newline == -1:
+                # truncated tail from an interrupted write
+                return
+            if newline > offset:
+                yield offset, json.loads(buf[offset:newline])
+            offset = newline + 1
+        return
+
+    if msgpack is None:
+        raise RuntimeError("This log is in msgpack format, which requires the msgpack package")
+    offset = start
+    while offset + _LENGTH.size <= end:
+        (length,) = _LENGTH.unpack_from(buf, offset)
+        body_end = offset + _LENGTH.size + length
+        if body_end > end:
+            return
+        yield offset, msgpack.unpackb(buf[offset + _LENGTH.size:body_end], raw=False)
+        offset = body_end
+
+def decode_at(buf, offset):
+    """Decodes the single record starting at `offset`. Raises ValueError if the record is truncated."""
+    if buf[0:1] == b"{":
+        newline = buf.find(b"\n", offset)
+        if newline == -1:
+            raise ValueError(f"Truncated record at offset {offset}")
+        return json.loads(buf[offset:newline])
+    if offset + _LENGTH.size > len(buf):
+        raise ValueError(f"Truncated record at offset {offset}")
+    (length,) = _LENGTH.unpack_from(buf, offset)
+    body_end = offset + _LENGTH.size + length
+    if body_end > len(buf):
+        raise ValueError(f"Truncated record at offset {offset}")
+    return msgpack.unpackb(buf[offset + _LENGTH.size:body_end], raw=False)
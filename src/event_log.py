@@ -0,0 +1,191 @@
+import json
+import mmap
+import os
+from collections import OrderedDict
+from event_codec import iter_records, decode_at
+
+# Segmented event log: the active file (e.g. output/stream_events.jsonl) is rotated into
+# sealed segments next to it. Each sealed segment gets a <segment>.idx with
+#   blocks: [offset, min_ts, max_ts] for every `block_size` events (a sparse time index)
+#   uids:   {uid: [[offset, ts], ...]} (a posting list per channel)
+# and a line in <base>.segments.jsonl with its time range, so queries only open segments
+# that overlap the requested range.
+
+INDEX_VERSION = 1
+
+def manifest_path(log_path):
+    base, _ = os.path.splitext(log_path)
+    return f"{base}.segments.jsonl"
+
+def _ts(event):
+    return event.get('timestamp') or 0
+
+class SegmentIndexer:
+    """Collects the index of the segment being written and writes it out when the segment is sealed."""
+    def __init__(self, log_path, block_size=256):
+        """
+        Args:
+            log_path (str): Active event log file; sealed segments are recorded in its manifest.
+            block_size (int): Events per entry of the sparse time index.
+        """
+        self.log_path = log_path
+        self.block_size = block_size
+        self.reset()
+
+    def reset(self):
+        self.blocks = []
+        self.uids = {}
+        self.count = 0
+        self.min_ts = None
+        self.max_ts = None
+
+    def add(self, offset, event):
+        ts = _ts(event)
+        if self.count % self.block_size == 0:
+            self.blocks.append([offset, ts, ts])
+        else:
+            block = self.blocks[-1]
+            block[1] = min(block[1], ts)
+            block[2] = max(block[2], ts)
+        uid = event.get('uid')
+        if uid is not None:
+            self.uids.setdefault(str(uid), []).append([offset, ts])
+        self.count += 1
+        self.min_ts = ts if self.min_ts is None else min(self.min_ts, ts)
+        self.max_ts = ts if self.max_ts is None else max(self.max_ts, ts)
+
+    def rebuild(self, path):
+        """Indexes the records already in a file, e.g. the active file after a restart."""
+        self.reset()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            for offset, event in iter_records(buf):
+                self.add(offset, event)
+
+    def seal(self, segment_path):
+        """Writes the index of a finished segment, records it in the manifest and starts over."""
+        index = {'version': INDEX_VERSION, 'blocks': self.blocks, 'uids': self.uids}
+        tmp_path = f"{segment_path}.idx.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+        os.replace(tmp_path, f"{segment_path}.idx")
+
+        entry = {'segment': os.path.basename(segment_path), 'min_ts': self.min_ts, 'max_ts': self.max_ts,
+                 'count': self.count, 'size': os.path.getsize(segment_path)}
+        with open(manifest_path(self.log_path), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self.reset()
+
+class EventLog:
+    """
+    Read side of the segmented log. query() opens only the sealed segments whose time range
+    overlaps the request, maps them with mmap and decodes just the indexed records:
+    the UID posting list for per-channel queries, the overlapping blocks for time ranges.
+    The active file has no index yet and is scanned; it is bounded by the rotation size.
+    """
+    def __init__(self, path, cache_size=16):
+        """
+        Args:
+            path (str): Active event log file (the writer's path).
+            cache_size (int): Segment indexes kept in memory between queries.
+        """
+        self.path = path
+        self.dir = os.path.dirname(os.path.abspath(path))
+        self.cache_size = cache_size
+        self._indexes = OrderedDict()
+
+    def segments(self):
+        """Returns the manifest entries of the sealed segments, oldest first."""
+        try:
+            with open(manifest_path(self.path), "r", encoding="utf-8") as f:
+                return [json.loads(line) for line in f if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def _index(self, segment):
+        index = self._indexes.pop(segment, None)
+        if index is None:
+            with open(os.path.join(self.dir, f"{segment}.idx"), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        self._indexes[segment] = index
+        while len(self._indexes) > self.cache_size:
+            self._indexes.popitem(last=False)
+        return index
+
+    def query(self, uid=None, since=None, until=None, event_type=None):
+        """
+        Yields events of a channel and/or a time range (inclusive timestamps), segment by segment.
+        """
+        def wanted(event):
+            ts = _ts(event)
+            return ((uid is None or event.get('uid') == uid)
+                    and (since is None or ts >= since)
+                    and (until is None or ts <= until)
+                    and (event_type is None or event.get('event_type') == event_type))
+
+        for entry in self.segments():
+            if entry['count'] == 0:
+                continue
+            if (since is not None and entry['max_ts'] < since) or (until is not None and entry['min_ts'] > until):
+                continue
+            yield from self._query_segment(entry['segment'], uid, since, until, wanted)
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for _, event in iter_records(buf):
+                    if wanted(event):
+                        yield event
+
+    def _query_segment(self, segment, uid, since, until, wanted):
+        index = self._index(segment)
+        with open(os.path.join(self.dir, segment), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            if uid is not None:
+                for offset, ts in index['uids'].get(str(uid), ()):
+                    if (since is None or ts >= since) and (until is None or ts <= until):
+                        event = decode_at(buf, offset)
+                        if wanted(event):
+                            yield event
+                return
+
+            blocks = index['blocks']
+            for i, (offset, min_ts, max_ts) in enumerate(blocks):
+                if (since is not None and max_ts < since) or (until is not None and min_ts > until):
+                    continue
+                end = blocks[i + 1][0] if i + 1 < len(blocks) else len(buf)
+                for _, event in iter_records(buf, offset, end):
+                    if wanted(event):
+                        yield event
+
+def import_events(log_path, events, encoder, segment_bytes=64 << 20, name="import"):
+    """
+    Writes events (e.g. from read_events() on an old JSONL file) as new sealed, indexed
+    segments of the log at log_path. Returns the number of events written.
+    """
+    base, ext = os.path.splitext(log_path)
+    os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+    indexer = SegmentIndexer(log_path)
+    written = 0
+    part = 0
+    f = None
+    try:
+        for event in events:
+            if f is None:
+                part += 1
+                segment_path = f"{base}.{name}-{part}{ext}"
+                while os.path.exists(segment_path):
+                    part += 1
+                    segment_path = f"{base}.{name}-{part}{ext}"
+                f = open(segment_path, "wb")
+            indexer.add(f.tell(), event)
+            f.write(encoder.encode(event))
+            written += 1
+            if f.tell() >= segment_bytes:
+                f.close()
+                f = None
+                indexer.seal(segment_path)
+    finally:
+        if f is not None:
+            f.close()
+            indexer.seal(segment_path)
+    return written
@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from event_codec import EventEncoder
+from logging_setup import get_logger
+
+log = get_logger("writer")
+
+async def collect_batch(queue, max_items, max_wait):
+    """
+    Waits for the first item on the queue, then keeps collecting until max_items
+    are gathered or max_wait seconds have passed since the first one.
+    A None item is the stop sentinel. Returns (batch, stop).
+    """
+    batch = [await queue.get()]
+    deadline = time.monotonic() + max_wait
+    while batch[-1] is not None and len(batch) < max_items:
+        try:
+            batch.append(queue.get_nowait())
+            continue
+        except asyncio.QueueEmpty:
+            pass
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+
+    stop = batch[-1] is None
+    if stop:
+        batch.pop()
+    return batch, stop
+
+class EventWriter:
+    """
+    Appends events to the event log from a background task.
+    Events are put on a bounded queue and written in batches to a file that stays open.
+    Serialization and file IO run in a worker thread, so callers on the event loop only pay for the enqueue.
+    """
+    def __init__(self, path, encoder=None, max_queue=10000, flush_every=100, flush_interval=0.5, fsync=False,
+                 max_bytes=0, rotate_interval=0, index=None):
+        """
+        Args:
+            path (str): Output event log file.
+            encoder (EventEncoder, optional): Event encoding. Defaults to full JSONL.
+            max_queue (int): Max events waiting to be written. write() blocks when full.
+            flush_every (int): Flush after this many events have been buffered.
+            flush_interval (float): Flush at least this often while events are pending (seconds).
+            fsync (bool): Also fsync the file on each flush.
+            max_bytes (int): Rotate the file once it reaches this size (0 = never).
+            rotate_interval (float): Rotate the file once it is this old (seconds, 0 = never).
+            index (SegmentIndexer, optional): Indexes each rotated segment for EventLog queries.
+        """
+        self.path = path
+        self.encoder = encoder or EventEncoder()
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.index = index
+
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._file = None
+        self._opened_at = 0
+
+    async def start(self):
+        if self._task is None:
+            await asyncio.to_thread(self._open)
+            self._task = asyncio.create_task(self._run())
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    async def write(self, event):
+        """Queues an event for writing. Only waits when the queue is full."""
+        await self._queue.put(event)
+
+    async def close(self):
+        """Writes out every queued event, then closes the file."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        await asyncio.to_thread(self._close)
+
+    async def _run(self):
+        while True:
+            batch, stop = await collect_batch(self._queue, self.flush_every, self.flush_interval)
+            if batch:
+                try:
+                    await asyncio.to_thread(self._write_batch, batch)
+                except Exception as e:
+                    log.error("Failed to write %d events: %s", len(batch), e)
+            if stop:
+                return
+
+    def _open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.index:
+            self.index.rebuild(self.path)
+        self._file = open(self.path, "ab")
+        self._opened_at = time.time()
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write_batch(self, batch):
+        chunks = [self.encoder.encode(event) for event in batch]
+        if self.index:
+            offset = self._file.tell()
+            for event, chunk in zip(batch, chunks):
+                self.index.add(offset, event)
+                offset += len(chunk)
+        self._file.write(b"".join(chunks))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        if self._should_rotate():
+            self._rotate()
+
+    def _should_rotate(self):
+        if self.max_bytes and self._file.tell() >= self.max_bytes:
+            return True
+        if self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval:
+            return True
+        return False
+
+    def _rotate(self):
+        self._close()
+        base, ext = os.path.splitext(self.path)
+        rotated = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        suffix = 1
+        while os.path.exists(rotated):
+            rotated = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}-{suffix}{ext}"
+            suffix += 1
+        os.replace(self.path, rotated)
+        if self.index:
+            self.index.seal(rotated)
+        log.info("Rotated %s -> %s", self.path, rotated)
+        self._open()
@@ -0,0 +1,44 @@
+import bisect
+import hashlib
+
+class HashRing:
+    """
+    Consistent hash ring over a list of nodes. Each node gets `replicas` virtual points,
+    so adding or removing a node only moves the keys of that node.
+    """
+    def __init__(self, nodes, replicas=100):
+        """
+        Args:
+            nodes (list): Node names. Keys map to indexes into this list.
+            replicas (int): Virtual points per node.
+        """
+        self.nodes = list(nodes)
+        ring = sorted((self.hash(f"{node}#{replica}"), index)
+                      for index, node in enumerate(self.nodes) for replica in range(replicas))
+        self._keys = [key for key, _ in ring]
+        self._indexes = [index for _, index in ring]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @staticmethod
+    def hash(value):
+        return int.from_bytes(hashlib.md5(str(value).encode()).digest()[:8], "big")
+
+    def walk(self, key):
+        """Yields the index of every node once, starting with the key's owner, in ring order."""
+        if not self._keys:
+            return
+        start = bisect.bisect(self._keys, self.hash(key))
+        seen = set()
+        for i in range(len(self._keys)):
+            index = self._indexes[(start + i) % len(self._keys)]
+            if index not in seen:
+                seen.add(index)
+                yield index
+                if len(seen) == len(self.nodes):
+                    return
+
+    def owner(self, key):
+        """Returns the index of the node a key is assigned to, or None if there are no nodes."""
+        return next(self.walk(key), None)
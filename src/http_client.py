@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from urllib.parse import urlsplit
+import asyncio
+import curl_cffi
+from curl_cffi import requests
+from curl_cffi.const import CurlInfo, CurlOpt
+from bilibili_api import user, register_client, get_registered_clients
+from bilibili_api.clients.CurlCFFIClient import CurlCFFIClient
+import metrics
+
+# Every poll goes to the same few hosts, so connections (and their TLS sessions) are kept open
+# between polls instead of being set up again for each request. Whether a request reused a
+# connection, and what a new one cost, is recorded from curl's own timings.
+
+TIMING_INFOS = [CurlInfo.NAMELOOKUP_TIME, CurlInfo.CONNECT_TIME, CurlInfo.APPCONNECT_TIME, CurlInfo.NUM_CONNECTS]
+
+def record_timing(response):
+    """Records connect and TLS handshake time of a response's connection, or that it was reused."""
+    infos = response.infos
+    host = urlsplit(response.url).hostname or ""
+    if not infos.get(CurlInfo.NUM_CONNECTS):
+        metrics.HTTP_CONNECTIONS.inc(host, "true")
+        return
+    metrics.HTTP_CONNECTIONS.inc(host, "false")
+    # curl's times are all measured from the start of the request
+    lookup, connect, tls = (infos.get(i, 0.0) for i in TIMING_INFOS[:3])
+    metrics.HTTP_CONNECT_SECONDS.observe(max(connect - lookup, 0.0), host)
+    if tls:
+        metrics.HTTP_TLS_SECONDS.observe(max(tls - connect, 0.0), host)
+
+class TimedSession(requests.AsyncSession):
+    """AsyncSession that asks curl for connection timings and records them for every response."""
+    def __init__(self, **kwargs):
+        super().__init__(curl_infos=TIMING_INFOS, **kwargs)
+
+    async def request(self, *args, **kwargs):
+        response = await super().request(*args, **kwargs)
+        record_timing(response)
+        return response
+
+class PooledCurlClient(CurlCFFIClient):
+    """
+    bilibili_api's curl_cffi client with a persistent connection pool: up to pool_size
+    concurrent requests, with connections kept open for up to keepalive seconds of idle
+    time and TCP keep-alive probes so that NAT and proxies do not drop them in between.
+    """
+    def __init__(self, proxy="", timeout=0.0, verify_ssl=True, trust_env=True, impersonate="", http2=False,
+                 pool_size=10, keepalive=300, session=None):
+        if session is None:
+            session = TimedSession(
+                loop=asyncio.get_event_loop(),
+                max_clients=pool_size,
+                timeout=timeout,
+                proxies={"all": proxy},
+                verify=verify_ssl,
+                trust_env=trust_env,
+                impersonate=impersonate,
+                http_version=(curl_cffi.CurlHttpVersion.V2_0 if http2 else None),
+                curl_options={
+                    CurlOpt.MAXAGE_CONN: int(keepalive),
+                    CurlOpt.TCP_KEEPALIVE: 1,
+                    CurlOpt.TCP_KEEPIDLE: min(int(keepalive), 60),
+                    CurlOpt.TCP_KEEPINTVL: 30,
+                },
+            )
+        super().__init__(proxy, timeout, verify_ssl, trust_env, impersonate, http2, session=session)
+
+def install(pool_size=10, keepalive=300):
+    """
+    Registers PooledCurlClient as the "curl_cffi" client that AuthManager.setup() selects.
+    A client that already extends it (such as the fake server's) is kept, with these settings.
+    """
+    cls = get_registered_clients().get("curl_cffi")
+    if cls is None or not issubclass(cls, PooledCurlClient):
+        cls = PooledCurlClient
+    register_client("curl_cffi", cls, {"impersonate": "", "http2": False, "pool_size": pool_size, "keepalive": keepalive})
+    return cls
+
+class UserCache:
+    """
+    bilibili_api User objects per UID, so polls do not build a new one every time.
+    An entry is rebuilt when the UID is polled with another account's credential.
+    """
+    def __init__(self, max_size=100000):
+        self.max_size = max_size
+        self._users = OrderedDict()
+
+    def __len__(self):
+        return len(self._users)
+
+    def get(self, uid, credential):
+        u = self._users.get(uid)
+        if u is not None and u.credential is credential:
+            self._users.move_to_end(uid)
+            return u
+        u = self._users[uid] = user.User(uid, credential=credential)
+        self._users.move_to_end(uid)
+        if len(self._users) > self.max_size:
+            self._users.popitem(last=False)
+        return u
+
+    def forget(self, uid):
+        self._users.pop(uid, None)
+
+users = UserCache()
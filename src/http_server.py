@@ -0,0 +1,118 @@
+import asyncio
+import inspect
+from urllib.parse import urlsplit, parse_qs
+from logging_setup import get_logger
+
+log = get_logger("http")
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 500: "Internal Server Error"}
+
+class Request:
+    def __init__(self, method, target, headers, body=b""):
+        parts = urlsplit(target)
+        self.method = method
+        self.path = parts.path
+        self.query = parse_qs(parts.query)
+        self.headers = headers
+        self.body = body
+
+class HttpServer:
+    """
+    Small HTTP/1.1 server running on the service's own event loop, for endpoints that
+    read in-process state (metrics, queries). Not meant to face the internet.
+
+    Handlers take a Request and return (status, headers, body), sync or async.
+    A route ending in "/" matches every path below it.
+    """
+    def __init__(self, host="127.0.0.1", port=0, max_body=1 << 20):
+        """
+        Args:
+            host (str): Interface to listen on.
+            port (int): Port to listen on (0 = any free port, see .port after start()).
+            max_body (int): Largest accepted request body (bytes).
+        """
+        self.host = host
+        self.port = port
+        self.max_body = max_body
+        self.routes = {}
+        self._server = None
+
+    def route(self, path, handler, methods=("GET",)):
+        self.routes[path] = (handler, methods)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _find(self, path):
+        if path in self.routes:
+            return self.routes[path]
+        prefix = path
+        while "/" in prefix:
+            prefix = prefix[:prefix.rindex("/")]
+            route = self.routes.get(prefix + "/")
+            if route:
+                return route
+        return None
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                status, headers, body = await self._dispatch(request)
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}",
+                        f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head += [f"{name}: {value}" for name, value in headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + (b"" if request.method == "HEAD" else body))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > self.max_body:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return Request(method, target, headers, body)
+
+    async def _dispatch(self, request):
+        route = self._find(request.path)
+        if route is None:
+            return 404, {"Content-Type": "text/plain"}, b"not found\n"
+        handler, methods = route
+        if request.method not in methods and not (request.method == "HEAD" and "GET" in methods):
+            return 405, {"Content-Type": "text/plain", "Allow": ", ".join(methods)}, b"method not allowed\n"
+        try:
+            result = handler(request)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            log.error("Error handling %s %s: %s", request.method, request.path, e)
+            return 500, {"Content-Type": "text/plain"}, b"internal error\n"
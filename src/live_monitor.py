@@ -1,114 +1,175 @@
 import asyncio
+import logging
 import time
-from bilibili_api import user, live
+from bilibili_api import live
+from bilibili_api.utils.network import Api
+import http_client
+import metrics
+from logging_setup import get_logger
+
+log = get_logger("monitor")
+
+# multi-UID room status endpoint, used in batch mode
+LIVE_STATUS_BATCH_API = "https://api.live.bilibili.com/room/v1/Room/get_status_info_by_uids"
 
 class LiveMonitor:
-    def __init__(self, auth_manager):
+    def __init__(self, auth_manager, status_api_url=LIVE_STATUS_BATCH_API, store=None, clock=time.time):
+        """
+        Args:
+            auth_manager (AuthManager): Provides the credential used for requests.
+            status_api_url (str): Multi-UID room status endpoint used by check_batch.
+            store (StateStore, optional): Checkpoint store to resume from and persist state changes to.
+            clock (callable): Unix time source for event timestamps, replaceable for simulation.
+        """
         self.auth = auth_manager
-        self.states = {}
+        self.store = store
+        self.clock = clock
+        self.states = store.load_live_states() if store else {}
+        self.status_api_url = status_api_url
         
-    async def check_channel(self, uid):
+    async def check_channel(self, uid, credential=None):
         """
         Polls live room status for the Single UID and yields events.
+        Uses the given credential, or the AuthManager's one if not set.
         """
-        if True:
-            print(f"[Monitor] Checking UID {uid}...")
-            
-            u = user.User(uid, credential=self.auth.credential)
+        log.debug("Checking UID %s...", uid)
+        
+        u = http_client.users.get(uid, credential or self.auth.credential)
+        with metrics.REQUEST_SECONDS.time("live_info"):
             info = await u.get_live_info()
-            
-            live_room = info.get('live_room', {})
-            room_id = live_room.get('roomid')
-            
+        
+        live_room = info.get('live_room', {})
+        room_id = live_room.get('roomid')
+        
+        if not room_id:
+            log.info("No room ID found for %s", uid, extra={'uid': uid})
+            return
+
+        for ev in self.apply_state(uid, room_id, live_room.get('liveStatus'), live_room.get('title'), live_room.get('url')):
+            yield ev
+
+    async def check_batch(self, uids, credential=None):
+        """
+        Polls live room status for several UIDs with a single request and yields events.
+        Uses the given credential, or the AuthManager's one if not set.
+        """
+        log.debug("Checking %d UIDs (batch)...", len(uids))
+
+        api = Api(url=self.status_api_url, method="POST", json_body=True, no_csrf=True, credential=credential or self.auth.credential)
+        with metrics.REQUEST_SECONDS.time("live_status_batch"):
+            rooms = await api.update_data(uids=[int(uid) for uid in uids]).result
+
+        # the endpoint returns an empty list instead of an object when no UID has a room
+        if not isinstance(rooms, dict):
+            rooms = {}
+
+        for uid in uids:
+            room = rooms.get(str(uid))
+            room_id = room.get('room_id') if room else None
+
             if not room_id:
-                print(f"[Monitor]  -> No room ID found for {uid}")
-                return
-                
-            curr_status = live_room.get('liveStatus')
-            curr_title = live_room.get('title')
-            curr_url = live_room.get('url')
-            
-            prev_state = self.states.get(uid, {})
-            prev_status = prev_state.get('live_status')
-            prev_title = prev_state.get('title')
+                log.info("No room ID found for %s", uid, extra={'uid': uid})
+                continue
+
+            curr_url = f"https://live.bilibili.com/{room_id}"
+
+            for ev in self.apply_state(uid, room_id, room.get('live_status'), room.get('title'), curr_url):
+                yield ev
+
+    def apply_state(self, uid, room_id, curr_status, curr_title, curr_url):
+        """
+        Compares a polled room against the stored state, updates it and returns the resulting events.
+        """
+        if curr_status not in (0, 1, 2):
+            # partial response, keep the previous state rather than reading it as offline
+            log.warning("No live status for %s, keeping its previous state", uid, extra={'uid': uid, 'room_id': room_id})
+            return []
+        # 2 means the room is rotating recorded videos, which is not a live stream. Stored
+        # states are normalized too, since older checkpoints may hold a 2.
+        curr_status = 1 if curr_status == 1 else 0
+        prev_state = self.states.get(uid, {})
+        prev_status = prev_state.get('live_status')
+        if prev_status is not None:
+            prev_status = 1 if prev_status == 1 else 0
+        prev_title = prev_state.get('title')
+        
+        if uid not in self.states:
+            self._set_state(uid, room_id, curr_status, curr_title)
+            status_str = "🔴 LIVE" if curr_status == 1 else "⚫ Offline"
+            log.info("Initialized %s: %s (Room %s)", uid, status_str, room_id, extra={'uid': uid, 'room_id': room_id})
             
-            if uid not in self.states:
-                self.states[uid] = {
-                    'room_id': room_id,
+            return [{
+                'event_type': 'STATE_SYNC',
+                'uid': uid,
+                'room_id': room_id,
+                'timestamp': int(self.clock()),
+                'details': {
+                    'title': curr_title,
                     'live_status': curr_status,
-                    'title': curr_title
+                    'link': curr_url
                 }
-                status_str = "🔴 LIVE" if curr_status == 1 else "⚫ Offline"
-                print(f"[Monitor]  -> Initialized {uid}: {status_str} (Room {room_id})")
-                
-                yield {
-                    'event_type': 'STATE_SYNC',
+            }]
+
+        events_to_yield = []
+
+        if curr_status != prev_status:
+            if curr_status == 1:
+                log.info("%s went LIVE!", uid, extra={'uid': uid, 'room_id': room_id})
+                events_to_yield.append({
+                    'event_type': 'STREAM_START',
                     'uid': uid,
                     'room_id': room_id,
-                    'timestamp': int(time.time()),
+                    'timestamp': int(self.clock()),
                     'details': {
                         'title': curr_title,
-                        'live_status': curr_status,
+                        'room_id': room_id,
                         'link': curr_url
                     }
-                }
-                return
-
-            events_to_yield = []
-
-            if curr_status != prev_status:
-                if curr_status == 1:
-                    print(f"[Monitor]  -> {uid} went LIVE!")
-                    events_to_yield.append({
-                        'event_type': 'STREAM_START',
-                        'uid': uid,
-                        'room_id': room_id,
-                        'timestamp': int(time.time()),
-                        'details': {
-                            'title': curr_title,
-                            'room_id': room_id,
-                            'link': curr_url
-                        }
-                    })
-                else:
-                    print(f"[Monitor]  -> {uid} went OFFLINE")
-                    events_to_yield.append({
-                        'event_type': 'STREAM_END',
-                        'uid': uid,
-                        'room_id': room_id,
-                        'timestamp': int(time.time()),
-                        'details': {
-                            'title': curr_title,
-                            'room_id': room_id
-                        }
-                    })
-            
-            if curr_title != prev_title:
-                print(f"[Monitor]  -> Title changed for {uid}")
+                })
+            else:
+                log.info("%s went OFFLINE", uid, extra={'uid': uid, 'room_id': room_id})
                 events_to_yield.append({
-                    'event_type': 'TITLE_CHANGE',
+                    'event_type': 'STREAM_END',
                     'uid': uid,
                     'room_id': room_id,
-                    'timestamp': int(time.time()),
+                    'timestamp': int(self.clock()),
                     'details': {
-                        'old_title': prev_title,
-                        'new_title': curr_title,
+                        'title': curr_title,
                         'room_id': room_id
                     }
                 })
+        
+        if curr_title != prev_title:
+            log.info("Title changed for %s", uid, extra={'uid': uid, 'room_id': room_id})
+            events_to_yield.append({
+                'event_type': 'TITLE_CHANGE',
+                'uid': uid,
+                'room_id': room_id,
+                'timestamp': int(self.clock()),
+                'details': {
+                    'old_title': prev_title,
+                    'new_title': curr_title,
+                    'room_id': room_id
+                }
+            })
 
-            if not events_to_yield:
-                print(f"[Monitor]  -> No changes for {uid}")
+        if not events_to_yield and log.isEnabledFor(logging.INFO):
+            log.info("No changes for %s", uid, extra={'uid': uid, 'sample': 'no_changes'})
 
-            if curr_status != prev_status or curr_title != prev_title:
-                    self.states[uid] = {
-                    'room_id': room_id,
-                    'live_status': curr_status,
-                    'title': curr_title
-                }
-            
-            for ev in events_to_yield:
-                yield ev
+        if curr_status != prev_status or curr_title != prev_title:
+            self._set_state(uid, room_id, curr_status, curr_title)
+        
+        return events_to_yield
+
+    def _set_state(self, uid, room_id, live_status, title):
+        state = {
+            'room_id': room_id,
+            'live_status': live_status,
+            'title': title
+        }
+        self.states[uid] = state
+        if self.store:
+            self.store.save_live_state(uid, state)
 
     async def stop(self):
         self.states.clear()
@@ -0,0 +1,119 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+
+# Logging for the service: one logger per component under "tracker.", records handed to
+# a background thread through a queue so the event loop never blocks on stdout, plain text
+# or JSON lines output, and sampling of repetitive per-poll messages.
+#
+# Pass extra={'sample': <key>} to log only every n-th record with that key, and other
+# extra fields (uid, room_id, ...) to have them appear as JSON keys.
+
+ROOT = "tracker"
+
+# LogRecord attributes that are not extra fields
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "component", "sample"}
+
+def get_logger(component):
+    return logging.getLogger(f"{ROOT}.{component}")
+
+def _component(record):
+    return record.name[len(ROOT) + 1:] if record.name.startswith(ROOT + ".") else record.name
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(component)s] %(message)s", "%Y-%m-%d %H:%M:%S")
+
+    def format(self, record):
+        record.component = _component(record)
+        return super().format(record)
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, component, msg and any extra fields."""
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'component': _component(record),
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class SampleFilter(logging.Filter):
+    """Passes the first and then every n-th record per `sample` key (n <= 0 drops them all)."""
+    def __init__(self, every):
+        super().__init__()
+        self.every = every
+        self._counts = {}
+
+    def filter(self, record):
+        key = getattr(record, 'sample', None)
+        if key is None:
+            return True
+        if self.every <= 0:
+            return False
+        count = self._counts.get(key, 0)
+        self._counts[key] = count + 1
+        return count % self.every == 0
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # format here, but keep the extra fields on the record for the JSON formatter
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_listener = None
+
+def setup_logging(level="INFO", json_lines=False, sample_every=100, stream=None, max_queue=10000):
+    """
+    Routes the tracker loggers through a queue to a stream written by a background thread.
+
+    Args:
+        level (str): Minimum level, e.g. "DEBUG" for per-poll messages.
+        json_lines (bool): Write JSON lines instead of text.
+        sample_every (int): Keep one of every n records marked for sampling (1 = all, 0 = none).
+        stream (file, optional): Output stream. Defaults to stdout.
+        max_queue (int): Records buffered for the writer thread; further records are dropped rather than blocking.
+    """
+    global _listener
+    if _listener:
+        _listener.stop()
+
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if json_lines else TextFormatter())
+
+    records = queue.Queue(max_queue)
+    handler = _QueueHandler(records)
+    handler.addFilter(SampleFilter(sample_every))
+    handler.handleError = lambda record: None  # a full queue drops the record
+
+    logger = logging.getLogger(ROOT)
+    logger.handlers = [handler]
+    logger.setLevel(level)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+    return logger
+
+def shutdown_logging():
+    """Writes out queued records and stops the writer thread."""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+atexit.register(shutdown_logging)
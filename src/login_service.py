@@ -1,10 +1,16 @@
 import asyncio
 import os
+import sys
 from bilibili_api import login_v2
 import qrcode
 from dotenv import set_key
 
 ENV_PATH = ".env"
+# optional account suffix for additional accounts, e.g. `python login_service.py 2` saves SESSDATA_2, ...
+ENV_SUFFIX = sys.argv[1] if len(sys.argv) > 1 else ""
+
+def env_key(name):
+    return f"{name}_{ENV_SUFFIX}" if ENV_SUFFIX else name
 
 async def main():
     print("Initializing QR Code Login...")
@@ -57,13 +63,13 @@ async def main():
             f.write("")
             
     try:
-        if cred.sessdata: set_key(ENV_PATH, "SESSDATA", cred.sessdata)
-        if cred.bili_jct: set_key(ENV_PATH, "BILI_JCT", cred.bili_jct)
-        if cred.buvid3: set_key(ENV_PATH, "BUVID3", cred.buvid3)
-        if cred.dedeuserid: set_key(ENV_PATH, "DEDEUSERID", str(cred.dedeuserid))
+        if cred.sessdata: set_key(ENV_PATH, env_key("SESSDATA"), cred.sessdata)
+        if cred.bili_jct: set_key(ENV_PATH, env_key("BILI_JCT"), cred.bili_jct)
+        if cred.buvid3: set_key(ENV_PATH, env_key("BUVID3"), cred.buvid3)
+        if cred.dedeuserid: set_key(ENV_PATH, env_key("DEDEUSERID"), str(cred.dedeuserid))
         
         if cred.ac_time_value:
-             set_key(ENV_PATH, "AC_TIME_VALUE", cred.ac_time_value)
+             set_key(ENV_PATH, env_key("AC_TIME_VALUE"), cred.ac_time_value)
              print(f"Saved Refresh Token (AC_TIME_VALUE): {cred.ac_time_value[:10]}...")
              
         print("\nCredentials saved successfully! You can now run main.py.")
@@ -71,11 +77,11 @@ async def main():
     except Exception as e:
         print(f"Error saving to .env: {e}")
         print("Please manually save these values:")
-        print(f"SESSDATA={cred.sessdata}")
-        print(f"BILI_JCT={cred.bili_jct}")
-        print(f"BUVID3={cred.buvid3}")
-        print(f"DEDEUSERID={cred.dedeuserid}")
-        print(f"AC_TIME_VALUE={cred.ac_time_value}")
+        print(f"{env_key('SESSDATA')}={cred.sessdata}")
+        print(f"{env_key('BILI_JCT')}={cred.bili_jct}")
+        print(f"{env_key('BUVID3')}={cred.buvid3}")
+        print(f"{env_key('DEDEUSERID')}={cred.dedeuserid}")
+        print(f"{env_key('AC_TIME_VALUE')}={cred.ac_time_value}")
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -1,17 +1,42 @@
 import asyncio
-import json
 import os
 import random
-from auth_manager import AuthManager
+import socket
+import time
+import api_errors
+from channel_set import ChannelSet, load_uids, parse_uids
+from cluster import Coordinator, WorkerLink
+from credential_pool import CredentialPool
+from endpoint_budget import EndpointBudget, CircuitBreaker
+from event_codec import EventEncoder, RawStore, FORMAT_JSONL, RAW_INLINE
+from event_log import SegmentIndexer
+from event_writer import EventWriter
+from http_server import HttpServer
+import http_client
+from logging_setup import get_logger, setup_logging, shutdown_logging
+import metrics
+from sinks import SinkFanout, StdoutSink, FileSink, WebhookSink
 from announcement_poller import AnnouncementPoller
 from live_monitor import LiveMonitor
-from scheduler import Scheduler, GlobalRateLimiter
-from dotenv import load_dotenv
+from query_api import QueryApi
+from session_tracker import SessionTracker
+from push_monitor import PushMonitor
+from scheduler import Scheduler, AdaptiveScheduler, GlobalRateLimiter
+from state_store import StateStore
+from dotenv import load_dotenv, find_dotenv
 
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-OUTPUT_FILE = os.path.join(BASE_DIR, "output", "stream_events.jsonl")
+
+# event log format: "jsonl" or "msgpack" (length-prefixed, needs the msgpack package)
+EVENT_FORMAT = FORMAT_JSONL
+# raw dynamic item on announcement events: "inline", "drop", or "store" (content-addressed files in RAW_STORE_DIR)
+EVENT_RAW_DATA = RAW_INLINE
+
+OUTPUT_FILE = os.path.join(BASE_DIR, "output", f"stream_events.{EVENT_FORMAT}")
+RAW_STORE_DIR = os.path.join(BASE_DIR, "output", "raw")
+STATE_DB = os.path.join(BASE_DIR, "output", "state.db")
 
 # target cycle to check all channel live status (seconds)
 TARGET_CYCLE_INTERVAL = 300
@@ -19,157 +44,512 @@ TARGET_CYCLE_INTERVAL = 300
 ANNOUNCEMENT_CYCLE_INTERVAL = 1800
 # min delay between API requests (seconds) (probably dont go lower than 1)
 MIN_REQUEST_DELAY = 5 
+# Bilibili rate-limits its API families separately, so every account has a budget (delay and backoff) per family:
+# "live" for live status, "dynamics" for the feed, "account" for cookie checks and refreshes.
+# per family delays where they should differ from MIN_REQUEST_DELAY (seconds)
+ENDPOINT_MIN_DELAY = {}
+# a family whose requests fail this many times in a row (rate limited or unreachable) is paused, then probed
+# with a single request, after CIRCUIT_COOLDOWN seconds doubling up to CIRCUIT_MAX_COOLDOWN
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 30
+CIRCUIT_MAX_COOLDOWN = 600
 # jitter for requests
 JITTER = 3.0
+# requests allowed back to back after an idle period
+REQUEST_BURST = 1
+# UIDs per live status request, using the multi-UID room status endpoint (1 = one get_live_info call per UID)
+LIVE_BATCH_SIZE = 1
+# poll live status by channel activity (live, upcoming reservation, usual stream hours, dormant) instead of round-robin
+ADAPTIVE_LIVE_SCHEDULING = True
+# channels kept on a room WebSocket connection for push-based live detection
+PUSH_UIDS = [int(u.strip()) for u in os.getenv("PUSH_UIDS", "").split(",") if u.strip().isdigit()]
+# also connect to any channel while it is live, up to PUSH_MAX_CONNECTIONS (0 disables push)
+PUSH_LIVE_ROOMS = True
+PUSH_MAX_CONNECTIONS = 50
+# event file write batching: flush every N events or after T seconds, optionally fsync
+EVENT_FLUSH_EVERY = 100
+EVENT_FLUSH_INTERVAL = 0.5
+EVENT_FSYNC = False
+# rotate the event file into segments by size (bytes) / age (seconds), 0 = never
+EVENT_ROTATE_BYTES = 64 * 1024 * 1024
+EVENT_ROTATE_INTERVAL = 0
+# index rotated segments by time and UID for scripts/query_events.py (the active file is scanned)
+EVENT_INDEX = True
+# webhook receiver for batched event delivery (disabled when unset)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_TOKEN = os.getenv("WEBHOOK_TOKEN", "")
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_FLUSH_INTERVAL = 1.0
+WEBHOOK_SPILL_FILE = os.path.join(BASE_DIR, "output", "webhook_spill.jsonl")
+# how often pending state changes are committed to STATE_DB (seconds)
+CHECKPOINT_INTERVAL = 30
+# concurrent requests per process, and how long an idle connection to the API is kept open for the next poll (seconds)
+HTTP_POOL_SIZE = 10
+HTTP_KEEPALIVE = 300
+
+# account health is inferred from the polling requests themselves. the validity endpoint is only
+# called right after a request was rejected as not logged in, or when nothing confirmed an account for this long (seconds)
+CREDENTIAL_CHECK_AFTER = 1800
+# refresh cookies this long before SESSDATA expires (seconds)
+CREDENTIAL_REFRESH_BEFORE = 3 * 86400
+# an invalid account is checked again when .env changes, and every this many seconds. also the refresh retry interval
+CREDENTIAL_RECHECK_INTERVAL = 600
+# local HTTP server for the /metrics endpoint and the query API (/live, /channel/{uid}, /upcoming), 0 disables
+HTTP_HOST = "127.0.0.1"
+HTTP_PORT = 9108
+SERVE_METRICS = True
+SERVE_QUERY_API = True
+# join reservation, announcement and live events of a stream into one STREAM_SESSION event when it ends
+SESSION_TRACKING = True
+# open sessions kept at most, and how long one may go without events before it is closed (seconds)
+SESSION_MAX_OPEN = 10000
+SESSION_MAX_AGE = 24 * 3600
+
+# DEBUG adds a line per request; LOG_JSON writes one JSON object per line for log shippers
+LOG_LEVEL = "INFO"
+LOG_JSON = False
+# log one of every n "no changes" poll results (1 = all, 0 = none)
+LOG_SAMPLE_NO_CHANGES = 100
+
+# channels can also be listed in a file (one or more UIDs per line, # comments) instead of TRACKED_UIDS
+CHANNELS_FILE = os.getenv("CHANNELS_FILE", "")
+# that file, or .env, is re-read when it changes so channels can be added and removed without a restart (seconds, 0 disables)
+CHANNEL_RELOAD_INTERVAL = 5
+# GET/POST/PUT /admin/channels on the HTTP server changes channels at runtime. it has no authentication, keep HTTP_HOST local
+SERVE_ADMIN_API = True
+
+# "standalone" polls every channel in this process. "coordinator" splits the channels across "worker"
+# processes, possibly on other machines with their own accounts in .env, and handles their events
+SERVICE_MODE = os.getenv("SERVICE_MODE", "standalone")
+# where the coordinator listens for workers
+COORDINATOR_HOST = os.getenv("COORDINATOR_HOST", "127.0.0.1")
+COORDINATOR_PORT = int(os.getenv("COORDINATOR_PORT", "9109"))
+# a worker's name decides its share of the channels, keep it stable across restarts
+WORKER_NAME = os.getenv("WORKER_NAME", socket.gethostname())
+# seconds without a heartbeat after which a worker's channels move to the others
+WORKER_HEARTBEAT_TIMEOUT = 30
+
+TRACKED_UIDS = load_uids(CHANNELS_FILE) if CHANNELS_FILE else parse_uids(os.getenv("TRACKED_UIDS", ""))
+CHANNEL_WATCH_FILE = CHANNELS_FILE or find_dotenv()
+
+log = get_logger("main")
 
-_uids_str = os.getenv("TRACKED_UIDS", "")
-TRACKED_UIDS = [int(u.strip()) for u in _uids_str.split(",") if u.strip().isdigit()] if _uids_str else []
-if not TRACKED_UIDS:
-    print("Warning: TRACKED_UIDS is empty in .env") 
+event_writer = EventWriter(
+    OUTPUT_FILE,
+    encoder=EventEncoder(EVENT_FORMAT, raw_data=EVENT_RAW_DATA, raw_store=RawStore(RAW_STORE_DIR)),
+    flush_every=EVENT_FLUSH_EVERY,
+    flush_interval=EVENT_FLUSH_INTERVAL,
+    fsync=EVENT_FSYNC,
+    max_bytes=EVENT_ROTATE_BYTES,
+    rotate_interval=EVENT_ROTATE_INTERVAL,
+    index=SegmentIndexer(OUTPUT_FILE) if EVENT_INDEX else None
+)
+
+sinks = SinkFanout([StdoutSink(), FileSink(event_writer)])
+if WEBHOOK_URL:
+    sinks.sinks.append(WebhookSink(
+        WEBHOOK_URL,
+        WEBHOOK_SPILL_FILE,
+        batch_size=WEBHOOK_BATCH_SIZE,
+        flush_interval=WEBHOOK_FLUSH_INTERVAL,
+        headers={"Authorization": f"Bearer {WEBHOOK_TOKEN}"} if WEBHOOK_TOKEN else None
+    ))
 
 async def event_handler(event):
     """Callback for handling events from Poller and Monitor."""
-    log_msg = f"[{event['event_type']}] Room/UID: {event.get('room_id') or event.get('uid')} - TS: {event.get('timestamp')}"
-    print(log_msg)
-    
-    if event['event_type'] == 'RESERVATION':
-        details = event.get('details', {})
-        print(f"  Scheduled: {details.get('title')} @ {details.get('description')} (TS: {details.get('start_ts')})")
-        
-    elif event['event_type'] == 'ANNOUNCEMENT_LIVE_START':
-        details = event.get('details', {})
-        print(f"  Live Announcement: {details.get('title')} (Room: {details.get('room_id')})")
-
-    elif event['event_type'] == 'STREAM_START':
-        details = event.get('details', {})
-        print(f"  🔴 Stream Begin: {details.get('title')} (Room: {details.get('room_id')})")
-
-    elif event['event_type'] == 'STREAM_END':
-        details = event.get('details', {})
-        print(f"  ⚫ Stream End: {details.get('title')} (Room: {details.get('room_id')})")
-
-    elif event['event_type'] == 'TITLE_CHANGE':
-        details = event.get('details', {})
-        print(f"  Title Updated: '{details.get('old_title')}' -> '{details.get('new_title')}'")
-
-    elif event['event_type'] == 'STATE_SYNC':
-        details = event.get('details', {})
-        status = "🔴 LIVE" if details.get('live_status') == 1 else "⚫ Offline"
-        print(f"  State Sync: {status} | Title: {details.get('title')}")
-
-    with open(OUTPUT_FILE, "a", encoding="utf-8") as f:
-        f.write(json.dumps(event, ensure_ascii=False) + "\n")
+    metrics.EVENTS.inc(event['event_type'])
+    await sinks.emit(event)
+
+CIRCUIT_STATES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+def make_budget(account, family):
+    limiter = GlobalRateLimiter(min_delay=ENDPOINT_MIN_DELAY.get(family, MIN_REQUEST_DELAY), burst=REQUEST_BURST)
+    breaker = CircuitBreaker(threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown=CIRCUIT_COOLDOWN, max_cooldown=CIRCUIT_MAX_COOLDOWN)
+    return EndpointBudget(f"{account}/{family}", limiter, breaker)
+
+def budgets(pool, value):
+    """{(account, family): value(budget)} for every budget in use, for the gauges."""
+    return {(a.name, family): value(b) for a in pool.accounts for family, b in a.budgets.items()}
+
+def register_metrics(pool, schedulers, coordinator=None):
+    """Registers gauges that are read from the live objects at scrape time."""
+    registry = metrics.REGISTRY
+    registry.gauge("sink_queue_depth", "Events waiting in a sink's queue.", ("sink",),
+                   lambda: {(type(s).__name__,): s.queue_depth() for s in sinks.sinks if hasattr(s, 'queue_depth')})
+    if coordinator:
+        registry.gauge("cluster_worker_channels", "Channels assigned to each connected worker.", ("worker",),
+                       lambda: {(name,): count for name, count in coordinator.shares().items()})
+        return
+    registry.gauge("rate_limiter_min_delay_seconds", "Current delay between requests per account and API family.", ("account", "family"),
+                   lambda: budgets(pool, lambda b: b.limiter.current_min_delay))
+    registry.gauge("rate_limiter_backoff_remaining_seconds", "Time left in the current backoff per account and API family.", ("account", "family"),
+                   lambda: budgets(pool, lambda b: b.limiter.backoff_remaining()))
+    registry.gauge("circuit_breaker_state", "Circuit breaker per account and API family: 0 closed, 1 half open, 2 open.", ("account", "family"),
+                   lambda: budgets(pool, lambda b: CIRCUIT_STATES[b.breaker.state]))
+    registry.gauge("account_valid", "Whether an account's cookies are valid.", ("account",),
+                   lambda: {(a.name,): int(a.valid) for a in pool.accounts})
+    registry.gauge("account_cookie_expiry_timestamp_seconds", "When an account's SESSDATA expires.", ("account",),
+                   lambda: {(a.name,): a.auth.expires_at() for a in pool.accounts})
+    registry.gauge("scheduler_cycle_seconds", "Duration of the last full pass over all channels.", ("scheduler",),
+                   lambda: {(name,): s.last_cycle_duration for name, s in schedulers.items()})
+    registry.gauge("scheduler_target_cycle_seconds", "Configured cycle interval.", ("scheduler",),
+                   lambda: {(name,): s.interval for name, s in schedulers.items()})
+    registry.gauge("scheduler_poll_lag_seconds", "How late the last polled channel was past its due time.", ("scheduler",),
+                   lambda: {(name,): getattr(s, 'last_lag', None) for name, s in schedulers.items()})
+
+async def start_http(query, channels, pool=None, schedulers=None, coordinator=None):
+    if not HTTP_PORT or not (SERVE_METRICS or SERVE_QUERY_API or SERVE_ADMIN_API):
+        return None
+    http = HttpServer(HTTP_HOST, HTTP_PORT)
+    if SERVE_METRICS:
+        register_metrics(pool, schedulers, coordinator)
+        http.route("/metrics", metrics.REGISTRY.handle)
+    if SERVE_QUERY_API:
+        query.routes(http)
+    if SERVE_ADMIN_API:
+        channels.routes(http)
+    await http.start()
+    log.info("Serving HTTP on http://%s:%d", HTTP_HOST, http.port)
+    return http
+
+def reservation_event(entry):
+    """A RESERVATION event for a restored reservation, to seed the components that collect them from events."""
+    return {'event_type': 'RESERVATION', 'uid': entry['uid'], 'dynamic_id': entry['dynamic_id'],
+            'details': {'rid': entry['rid'], 'title': entry['title'], 'start_ts': entry['start_ts']}}
+
+async def run_coordinator():
+    """Hands the channels out to workers and processes their events. Does not poll by itself."""
+    await sinks.start()
+    store = StateStore(STATE_DB)
+    monitor = LiveMonitor(None, store=store)
+    query = QueryApi(monitor)
+    sessions = SessionTracker(max_open=SESSION_MAX_OPEN, max_age=SESSION_MAX_AGE) if SESSION_TRACKING else None
+
+    async def dispatch(event):
+        query.observe(event)
+        await event_handler(event)
+        if sessions:
+            for session in sessions.observe(event):
+                await event_handler(session)
+
+    channels = ChannelSet(TRACKED_UIDS)
+    coordinator = Coordinator(channels, dispatch, monitor, store, COORDINATOR_HOST, COORDINATOR_PORT,
+                              heartbeat_timeout=WORKER_HEARTBEAT_TIMEOUT)
+    channels.on_change = coordinator.rebalance
+    if sessions:
+        for uid, state in monitor.states.items():
+            sessions.observe({'event_type': 'STATE_SYNC', 'uid': uid, 'room_id': state.get('room_id'), 'details': {'live_status': state.get('live_status')}})
+    for entry in coordinator.reservations.values():
+        query.observe(reservation_event(entry))
+        if sessions:
+            sessions.observe(reservation_event(entry))
+
+    await coordinator.start()
+    log.info("Coordinating %d channels for workers on %s:%d", len(channels), COORDINATOR_HOST, coordinator.port)
+    http = await start_http(query, channels, coordinator=coordinator)
+
+    async def checkpoint_loop():
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
+            try:
+                store.flush()
+            except Exception as e:
+                log.error("Error writing checkpoint: %s", e)
+
+    loops = [coordinator.watch_heartbeats(), checkpoint_loop()]
+    if CHANNEL_RELOAD_INTERVAL and CHANNEL_WATCH_FILE:
+        loops.append(channels.watch(CHANNEL_WATCH_FILE, CHANNEL_RELOAD_INTERVAL))
+    try:
+        await asyncio.gather(*loops)
+    finally:
+        if http:
+            await http.close()
+        await coordinator.close()
+        await sinks.close()
+        store.close()
+        log.info("Service stopped.")
+        shutdown_logging()
 
 async def main():
-    print("Starting Bilibili Stream Tracker PoC...")
-    
-    auth = AuthManager()
-    cred = auth.setup()
-    if not cred:
-        print("Authentication failed or config missing. Exiting.")
+    setup_logging(LOG_LEVEL, json_lines=LOG_JSON, sample_every=LOG_SAMPLE_NO_CHANGES)
+    log.info("Starting Bilibili Stream Tracker PoC...")
+    if not TRACKED_UIDS and SERVICE_MODE != "worker":
+        log.warning("TRACKED_UIDS is empty in .env")
+    if SERVICE_MODE == "coordinator":
+        await run_coordinator()
         return
 
-    poller = AnnouncementPoller(auth)
-    monitor = LiveMonitor(auth)
-    
-    live_scheduler = Scheduler(TRACKED_UIDS, interval=TARGET_CYCLE_INTERVAL, min_delay=MIN_REQUEST_DELAY, jitter=JITTER)
-    announce_scheduler = Scheduler(TRACKED_UIDS, interval=ANNOUNCEMENT_CYCLE_INTERVAL, min_delay=MIN_REQUEST_DELAY, jitter=JITTER)
+    http_client.install(HTTP_POOL_SIZE, HTTP_KEEPALIVE)
+    pool = CredentialPool.from_env(make_budget)
+    if not pool.accounts:
+        log.error("Authentication failed or config missing. Exiting.")
+        return
+    log.info("Loaded %d account(s): %s", len(pool), ', '.join(a.name for a in pool.accounts))
+    auth = pool.accounts[0].auth
+
+    # a worker gets its channels and their state from the coordinator and sends its events there
+    link = None
+    uids = TRACKED_UIDS
+    if SERVICE_MODE == "worker":
+        link = WorkerLink(WORKER_NAME, COORDINATOR_HOST, COORDINATOR_PORT)
+        await link.connect()
+        sinks.sinks = [link]
+        uids = link.assigned
+
+    await sinks.start()
+    store = link or StateStore(STATE_DB)
+    poller = AnnouncementPoller(auth, store=store)
+    monitor = LiveMonitor(auth, store=store)
+    log.info("Loaded checkpoint: %d channel states, %d dynamic watermarks, %d reservations",
+             len(monitor.states), len(poller.seen), len(poller.reservations))
     
-    global_limiter = GlobalRateLimiter(min_delay=MIN_REQUEST_DELAY)
+    live_scheduler_cls = AdaptiveScheduler if ADAPTIVE_LIVE_SCHEDULING else Scheduler
+    # every account has its own budget per family, so the schedulers may go as fast as all of them together
+    def pool_delay(family):
+        return ENDPOINT_MIN_DELAY.get(family, MIN_REQUEST_DELAY) / len(pool)
+    live_scheduler = live_scheduler_cls(uids, interval=TARGET_CYCLE_INTERVAL, min_delay=pool_delay("live"), jitter=JITTER)
+    announce_scheduler = Scheduler(uids, interval=ANNOUNCEMENT_CYCLE_INTERVAL, min_delay=pool_delay("dynamics"), jitter=JITTER)
+
+    query = QueryApi(monitor)
+    # sessions are joined on the coordinator, which sees the events of all workers
+    sessions = SessionTracker(max_open=SESSION_MAX_OPEN, max_age=SESSION_MAX_AGE) if SESSION_TRACKING and not link else None
+
+    def apply_channels(added, removed):
+        for uid in removed:
+            live_scheduler.remove(uid)
+            announce_scheduler.remove(uid)
+            push.forget(uid)
+            query.forget(uid)
+            http_client.users.forget(uid)
+            if link:
+                # the coordinator has the state and hands it to the channel's next worker
+                monitor.states.pop(uid, None)
+                poller.seen.forget(uid)
+                poller.reservations.forget(uid)
+        for uid in added:
+            live_scheduler.add(uid)
+            announce_scheduler.add(uid)
+
+    channels = ChannelSet(uids, on_change=apply_channels)
+
+    async def dispatch(event):
+        live_scheduler.observe(event)
+        push.observe(event)
+        query.observe(event)
+        await event_handler(event)
+        if sessions:
+            for session in sessions.observe(event):
+                await event_handler(session)
+
+    push = PushMonitor(
+        monitor,
+        dispatch,
+        credential_for=lambda uid: pool.account_for(uid, "live").credential,
+        priority_uids=PUSH_UIDS,
+        watch_live=PUSH_LIVE_ROOMS,
+        max_connections=PUSH_MAX_CONNECTIONS
+    )
 
     is_monitoring = False
     
     async def start_monitoring():
         nonlocal is_monitoring
         if not is_monitoring:
-            print("Starting live monitor (polling mode)...")
+            log.info("Starting live monitor (polling mode)...")
             is_monitoring = True
 
     async def stop_monitoring():
         nonlocal is_monitoring
         if is_monitoring:
-            print("Pausing live monitor...")
+            log.info("Pausing live monitor...")
             await monitor.stop()
+            query.reset()
             is_monitoring = False
 
-    if await auth.check_validity():
+    for account in pool.accounts:
+        account.valid = await account.auth.verify()
+        if not account.valid:
+            log.warning("Cookies of account %s are invalid at startup. Waiting for updates...", account.name)
+    if pool.valid_count():
         await start_monitoring()
+
+    # channels restored from the checkpoint or handed over by the coordinator emit no STATE_SYNC or
+    # RESERVATION, so seed their live state and reservations directly
+    def restore(states, reservations):
+        for uid, state in states.items():
+            restored = {'event_type': 'STATE_SYNC', 'uid': uid, 'room_id': state.get('room_id'), 'details': {'live_status': state.get('live_status')}}
+            live_scheduler.observe(restored)
+            push.observe(restored)
+            if sessions:
+                sessions.observe(restored)
+        for entry in reservations:
+            restored = reservation_event(entry)
+            live_scheduler.observe(restored)
+            query.observe(restored)
+            if sessions:
+                sessions.observe(restored)
+
+    restore(monitor.states, poller.reservations.entries())
+
+    def assign(assigned, states, windows, reservations):
+        monitor.states.update(states)
+        poller.seen.load(windows)
+        poller.reservations.load(reservations)
+        channels.replace(assigned)
+        restore(states, reservations)
+
+    http = None
+    if link:
+        link.on_assign = assign
     else:
-        print("Warning: Cookies are invalid at startup. Waiting for updates...")
-    
-    print("Service running. Press Ctrl+C to stop.")
+        http = await start_http(query, channels, pool, {'live': live_scheduler, 'announce': announce_scheduler})
+
+    log.info("Service running. Press Ctrl+C to stop.")
     
+    async def check_account(account):
+        auth = account.auth
+        now = time.time()
+        if account.valid and auth.refresh_due(CREDENTIAL_REFRESH_BEFORE, CREDENTIAL_RECHECK_INTERVAL, now):
+            log.info("[%s] Cookies expire in %.1f days, refreshing ahead of time...", account.name, (auth.expires_at() - now) / 86400)
+            await account.budget("account").wait()
+            await auth.refresh_cookies()
+        if not account.valid and auth.env_changed():
+            auth.reload()
+
+        healthy = auth.health(CREDENTIAL_CHECK_AFTER, now, recheck_after=CREDENTIAL_RECHECK_INTERVAL)
+        if healthy is None:
+            # a rejected request also asks for a check of an invalid account, keep those to one per interval
+            if not account.valid and now - auth.last_check < CREDENTIAL_RECHECK_INTERVAL:
+                return
+            # no recent signal from polling, ask the API, counting against the account's rate limit
+            await account.budget("account").wait()
+            healthy = await auth.verify()
+
+        if healthy:
+            if not account.valid:
+                log.info("✅ [%s] Cookies updated and valid! Resuming...", account.name)
+                account.valid = True
+            return
+
+        if account.valid:
+            log.warning("⚠️ [%s] Cookies Invalid/Expired! Attempting auto-refresh...", account.name)
+            await account.budget("account").wait()
+            if await auth.refresh_cookies():
+                log.info("✅ [%s] Cookies refreshed automatically via refresh_token!", account.name)
+                return
+            log.error("❌ [%s] Auto-refresh failed. Please login using login_service.py %s", account.name, '' if account.name == 'primary' else account.name)
+            account.valid = False
+
     async def cookie_watchdog():
         while True:
-            await asyncio.sleep(60) 
+            # only local bookkeeping unless an account needs a check or refresh
+            await asyncio.sleep(10)
+            for account in pool.accounts:
+                try:
+                    await check_account(account)
+                except Exception as e:
+                    log.error("Error in cookie watchdog for account %s: %s", account.name, e)
+
+            if pool.valid_count():
+                await start_monitoring()
+            else:
+                await stop_monitoring()
+
+    async def checkpoint_loop():
+        while True:
+            await asyncio.sleep(CHECKPOINT_INTERVAL)
             try:
-                if not await auth.check_validity():
-                    print("⚠️ Cookies Invalid/Expired! Attempting auto-refresh...")
-                    if await auth.refresh_cookies():
-                         print("✅ Cookies refreshed automatically via refresh_token!")
-                    else:
-                        print("❌ Auto-refresh failed. Please login using login_service.py")
-                        await stop_monitoring()
-                        
-                        while not await auth.check_validity():
-                            await asyncio.sleep(10)
-                            auth.reload()
-                        
-                        print("✅ Cookies updated and valid! Resuming...")
-                        await start_monitoring()
+                if poller.seen.has_legacy() and announce_scheduler.last_cycle_duration is not None:
+                    # every channel had its first poll, what is left of the old table belongs to none of them
+                    poller.seen.clear_legacy()
+                    store.drop_legacy_seen()
+                store.flush()
             except Exception as e:
-                print(f"Error in cookie watchdog: {e}")
+                log.error("Error writing checkpoint: %s", e)
+
+    def report_error(account, family, e):
+        """Feeds a failed request into the account's health and its budget for `family`. Returns the error kind."""
+        kind = api_errors.classify(e)
+        account.budget(family).report_error(kind)
+        metrics.REQUEST_ERRORS.inc(family, kind)
+        if kind == api_errors.RATE_LIMITED:
+            metrics.RATE_LIMITED.inc(family, api_errors.error_code(e))
+        elif kind == api_errors.AUTH:
+            account.auth.report_auth_error()
+        return kind
 
     async def live_loop():
         while True:
-            uid = await live_scheduler.next_uid()
-            if not uid: continue
+            uids = await live_scheduler.next_batch(LIVE_BATCH_SIZE)
+            # rooms with a push connection don't need polling
+            uids = [uid for uid in uids if not push.is_connected(uid)]
+            if not uids: continue
             
-            try:
-                await global_limiter.wait()
-                
-                if is_monitoring:
-                    async for event in monitor.check_channel(uid):
-                        await event_handler(event)
-                    global_limiter.report_success()
-                else:
-                    await asyncio.sleep(5)
-            except Exception as e:
-                err_str = str(e)
-                if "412" in err_str or "429" in err_str:
-                     global_limiter.trigger_backoff()
+            # one request per account, so each one's budget only pays for its own channels
+            by_account = {}
+            for uid in uids:
+                by_account.setdefault(pool.account_for(uid, "live"), []).append(uid)
+            for account, account_uids in by_account.items():
+                await check_live(account, account_uids)
+
+    async def check_live(account, uids):
+        budget = account.budget("live")
+        try:
+            await budget.wait()
+            
+            if is_monitoring:
+                if LIVE_BATCH_SIZE > 1:
+                    events = monitor.check_batch(uids, credential=account.credential)
                 else:
-                    print(f"[Monitor] Error checking live status for {uid}: {e}")
+                    events = monitor.check_channel(uids[0], credential=account.credential)
+                async for event in events:
+                    await dispatch(event)
+                budget.report_success()
+                account.auth.report_success()
+            else:
+                await asyncio.sleep(5)
+        except Exception as e:
+            if report_error(account, "live", e) in (api_errors.UNAVAILABLE, api_errors.OTHER):
+                get_logger("monitor").error("Error checking live status for %s: %s", uids, e)
 
     async def announce_loop():
         while True:
             uid = await announce_scheduler.next_uid()
             if not uid: continue
             
+            account = pool.account_for(uid, "dynamics")
+            budget = account.budget("dynamics")
             try:
-                await global_limiter.wait()
+                await budget.wait()
                 
-                async for ann in poller.check_channel(uid):
-                    await event_handler(ann)
-                global_limiter.report_success()
+                async for ann in poller.check_channel(uid, credential=account.credential, limiter=budget.limiter):
+                    await dispatch(ann)
+                budget.report_success()
+                account.auth.report_success()
             except Exception as e:
-                err_str = str(e)
-                if "412" in err_str or "429" in err_str:
-                     global_limiter.trigger_backoff()
-                else:
-                    print(f"[Announce] Error polling channel {uid}: {e}")
+                if report_error(account, "dynamics", e) in (api_errors.UNAVAILABLE, api_errors.OTHER):
+                    get_logger("announce").error("Error polling channel %s: %s", uid, e, extra={'uid': uid})
+
+    loops = [cookie_watchdog(), checkpoint_loop(), live_loop(), announce_loop()]
+    if link:
+        loops.append(link.run())
+    elif CHANNEL_RELOAD_INTERVAL and CHANNEL_WATCH_FILE:
+        loops.append(channels.watch(CHANNEL_WATCH_FILE, CHANNEL_RELOAD_INTERVAL))
 
     try:
-        await asyncio.gather(
-            cookie_watchdog(),
-            live_loop(),
-            announce_loop()
-        )
+        await asyncio.gather(*loops)
     except KeyboardInterrupt:
-        print("Stopping service...")
+        log.info("Stopping service...")
     finally:
+        if http:
+            await http.close()
+        await push.close()
+        await sinks.close()
+        if not link:
+            store.close()
         await monitor.stop()
-        print("Service stopped.")
+        log.info("Service stopped.")
+        shutdown_logging()
 
 if __name__ == "__main__":
     asyncio.run(main())
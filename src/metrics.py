@@ -0,0 +1,148 @@
+import bisect
+import time
+from contextlib import contextmanager
+from logging_setup import get_logger
+
+log = get_logger("metrics")
+
+# Prometheus text exposition without the client library. Metrics are kept in plain
+# dicts keyed by label values and only formatted when /metrics is scraped.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+HANDSHAKE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in self._values.items()]
+        return lines
+
+class Gauge:
+    """A gauge set directly, or read from a callback returning {label values: value} at scrape time."""
+    def __init__(self, name, help, labelnames=(), fn=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self._values = {}
+
+    def set(self, value, *labels):
+        self._values[labels] = value
+
+    def render(self):
+        values = self.fn() if self.fn else self._values
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in values.items()
+                  if v is not None]
+        return lines
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._values = {}
+
+    def observe(self, value, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), fn=None):
+        return self.register(Gauge(name, help, labelnames, fn))
+
+    def histogram(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines += metric.render()
+            except Exception as e:
+                log.error("Failed to collect %s: %s", metric.name, e)
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def handle(self, request):
+        """HttpServer handler for /metrics."""
+        return 200, {"Content-Type": CONTENT_TYPE}, self.render()
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "bilibili_request_seconds", "Bilibili API request latency by endpoint, including failed requests.", ("endpoint",))
+RATE_LIMITED = REGISTRY.counter(
+    "bilibili_rate_limited_total", "Rate limit responses (HTTP 412/429 or a risk control code) by API family and status or code.", ("family", "status"))
+REQUEST_ERRORS = REGISTRY.counter(
+    "bilibili_request_errors_total", "Failed requests by API family and kind (rate_limited, auth, unavailable, other).", ("family", "kind"))
+EVENTS = REGISTRY.counter(
+    "events_total", "Events emitted by type.", ("event_type",))
+HTTP_CONNECT_SECONDS = REGISTRY.histogram(
+    "http_connect_seconds", "TCP connect time of new connections by host.", ("host",), HANDSHAKE_BUCKETS)
+HTTP_TLS_SECONDS = REGISTRY.histogram(
+    "http_tls_handshake_seconds", "TLS handshake time of new connections by host.", ("host",), HANDSHAKE_BUCKETS)
+HTTP_CONNECTIONS = REGISTRY.counter(
+    "http_requests_by_connection_total", "HTTP requests by host and whether they reused an open connection.", ("host", "reused"))
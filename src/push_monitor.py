@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import time
+from bilibili_api import live
+from logging_setup import get_logger
+
+log = get_logger("push")
+
+def _danmaku_connection(room_id, credential):
+    room = live.LiveDanmaku(room_id, credential=credential, max_retry=2)
+    room.logger.setLevel(logging.WARNING)
+    return room
+
+class PushMonitor:
+    """
+    Keeps room WebSocket connections open for hot channels and turns LIVE / PREPARING /
+    ROOM_CHANGE push messages into the same STREAM_START / STREAM_END / TITLE_CHANGE events
+    LiveMonitor emits, within seconds and without spending polling budget.
+
+    Priority channels are always connected once their room is known. Other channels are
+    connected while they are live if there is capacity left. State transitions go through
+    LiveMonitor.apply_state, so push and polling never report the same change twice.
+    Channels without an established connection are left to polling.
+    """
+    def __init__(self, monitor, on_event, credential_for, priority_uids=(), watch_live=True,
+                 max_connections=50, reconnect_delay=30, connection_factory=_danmaku_connection):
+        """
+        Args:
+            monitor (LiveMonitor): Holds the channel states that push messages are applied to.
+            on_event (callable): Async callback for events produced from push messages.
+            credential_for (callable): Returns the credential to connect with for a UID.
+            priority_uids (iterable): Channels to keep connected at all times.
+            watch_live (bool): Also connect to other channels while they are live.
+            max_connections (int): Max concurrent room connections.
+            reconnect_delay (float): First delay before reconnecting a priority channel, doubled per failure (seconds).
+            connection_factory (callable): Builds a connection for (room_id, credential). The default
+                uses LiveDanmaku; any object with add_event_listener/connect/disconnect/get_status works.
+        """
+        self.monitor = monitor
+        self.on_event = on_event
+        self.credential_for = credential_for
+        self.priority_uids = set(priority_uids)
+        self.watch_live = watch_live
+        self.max_connections = max_connections
+        self.reconnect_delay = reconnect_delay
+        self.connection_factory = connection_factory
+
+        self._conns = {}
+        self._tasks = {}
+        self._closing = False
+
+    def is_connected(self, uid):
+        conn = self._conns.get(uid)
+        return conn is not None and conn.get_status() == live.LiveDanmaku.STATUS_ESTABLISHED
+
+    def connected_count(self):
+        return sum(1 for uid in self._conns if self.is_connected(uid))
+
+    def observe(self, event):
+        """Starts or stops watching a channel based on an emitted event."""
+        if self.max_connections <= 0 or self._closing:
+            return
+        uid = event.get('uid')
+        room_id = event.get('room_id')
+        event_type = event.get('event_type')
+        is_live = event_type == 'STREAM_START' or (
+            event_type == 'STATE_SYNC' and event.get('details', {}).get('live_status') == 1
+        )
+
+        if uid in self.priority_uids and room_id:
+            self.watch(uid, room_id)
+        elif is_live and room_id and self.watch_live:
+            self.watch(uid, room_id)
+        elif event_type == 'STREAM_END' and uid not in self.priority_uids:
+            self.unwatch(uid)
+
+    def watch(self, uid, room_id):
+        """Connects to a channel's room. Returns False if there is no capacity for it."""
+        if uid in self._tasks:
+            return True
+        if len(self._tasks) >= self.max_connections:
+            if uid not in self.priority_uids or not self._evict_one():
+                return False
+        self._tasks[uid] = asyncio.create_task(self._run(uid, room_id))
+        return True
+
+    def unwatch(self, uid):
+        task = self._tasks.pop(uid, None)
+        if task:
+            task.cancel()
+
+    def forget(self, uid):
+        """Stops watching a channel that is no longer tracked, priority or not."""
+        self.priority_uids.discard(uid)
+        self.unwatch(uid)
+
+    def _evict_one(self):
+        for uid in list(self._tasks):
+            if uid not in self.priority_uids:
+                log.info("Dropping connection for %s to make room for a priority channel", uid, extra={'uid': uid})
+                self.unwatch(uid)
+                return True
+        return False
+
+    async def _run(self, uid, room_id):
+        delay = self.reconnect_delay
+        conn = None
+        try:
+            while not self._closing:
+                conn = self.connection_factory(room_id, self.credential_for(uid))
+                for cmd in ("LIVE", "PREPARING", "ROOM_CHANGE"):
+                    conn.add_event_listener(cmd, self._listener(uid, room_id))
+                self._conns[uid] = conn
+
+                log.info("Connecting to room %s (%s)...", room_id, uid, extra={'uid': uid, 'room_id': room_id})
+                connected_at = time.monotonic()
+                try:
+                    await conn.connect()
+                except Exception as e:
+                    log.warning("Connection to room %s failed: %s", room_id, e, extra={'uid': uid, 'room_id': room_id})
+                finally:
+                    self._conns.pop(uid, None)
+
+                if uid not in self.priority_uids or self._closing:
+                    break
+                if time.monotonic() - connected_at > 600:
+                    # the connection was stable for a while, so this is not a repeated failure
+                    delay = self.reconnect_delay
+                log.warning("Room %s (%s) disconnected. Falling back to polling, reconnecting in %ss", room_id, uid, delay,
+                            extra={'uid': uid, 'room_id': room_id})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 600)
+        except asyncio.CancelledError:
+            # cancelling connect() leaves the websocket and heartbeat of LiveDanmaku running
+            if conn and conn.get_status() == live.LiveDanmaku.STATUS_ESTABLISHED:
+                await conn.disconnect()
+            raise
+        finally:
+            if self._tasks.get(uid) is asyncio.current_task():
+                del self._tasks[uid]
+
+    def _listener(self, uid, room_id):
+        async def on_push(info):
+            try:
+                await self._handle(uid, room_id, info)
+            except Exception as e:
+                log.error("Error handling %s for %s: %s", info.get('type'), uid, e, extra={'uid': uid})
+        return on_push
+
+    async def _handle(self, uid, room_id, info):
+        state = self.monitor.states.get(uid)
+        if state is None:
+            # no baseline yet, the next poll syncs this channel
+            return
+
+        cmd = info.get('type')
+        data = info.get('data', {})
+        status = state.get('live_status')
+        title = state.get('title')
+
+        if cmd == 'LIVE':
+            status = 1
+        elif cmd == 'PREPARING':
+            status = 0
+        elif cmd == 'ROOM_CHANGE':
+            title = data.get('data', {}).get('title', title)
+
+        for event in self.monitor.apply_state(uid, room_id, status, title, f"https://live.bilibili.com/{room_id}"):
+            event['source'] = 'push'
+            await self.on_event(event)
+
+    async def close(self):
+        self._closing = True
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,184 @@
+import bisect
+import itertools
+import json
+import time
+
+STATE_EVENTS = ('STATE_SYNC', 'STREAM_START', 'STREAM_END', 'TITLE_CHANGE')
+RESERVATION_EVENTS = ('RESERVATION', 'RESERVATION_UPDATED', 'RESERVATION_CANCELLED')
+
+def _json(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+class QueryApi:
+    """
+    Read API over the current channel states and pending reservations:
+        GET /live                 channels that are live right now
+        GET /channel/{uid}        one channel's state and its upcoming reservations
+        GET /upcoming?before=ts   reservations starting between now and ts (default: all)
+
+    Response bodies are built once and reused until an event changes what they contain,
+    so a request is a dict lookup plus an ETag comparison; If-None-Match gets a 304.
+    Live state is read from LiveMonitor.states, reservations are collected from RESERVATION,
+    RESERVATION_UPDATED and RESERVATION_CANCELLED events.
+    """
+    def __init__(self, monitor):
+        """
+        Args:
+            monitor (LiveMonitor): Source of the current channel states.
+        """
+        self.monitor = monitor
+        self._live = {uid for uid, state in monitor.states.items() if state.get('live_status') == 1}
+        self._live_since = {}
+        self._reservations = {}
+        self._upcoming = None
+
+        # ETags only have to differ between versions of a body, also across restarts
+        self._epoch = f"{int(time.time()):x}"
+        self._versions = itertools.count()
+        self._bodies = {}
+
+    def routes(self, server):
+        server.route("/live", self.handle_live)
+        server.route("/channel/", self.handle_channel)
+        server.route("/upcoming", self.handle_upcoming)
+
+    def observe(self, event):
+        """Applies an emitted event and drops the bodies it invalidates."""
+        uid = event.get('uid')
+        event_type = event.get('event_type')
+
+        if event_type in STATE_EVENTS:
+            state = self.monitor.states.get(uid, {})
+            if state.get('live_status') == 1:
+                if uid not in self._live or event_type == 'STREAM_START':
+                    self._live_since[uid] = event.get('timestamp')
+                self._live.add(uid)
+            else:
+                self._live.discard(uid)
+                self._live_since.pop(uid, None)
+            self._bodies.pop('live', None)
+            self._bodies.pop(('channel', uid), None)
+
+        elif event_type in RESERVATION_EVENTS:
+            details = event.get('details', {})
+            dynamic_id = event.get('dynamic_id')
+            if event_type == 'RESERVATION_CANCELLED':
+                pending = self._reservations.get(uid, {})
+                if pending.pop(dynamic_id, None) is None:
+                    return
+                if not pending:
+                    del self._reservations[uid]
+            elif not details.get('start_ts'):
+                return
+            else:
+                self._reservations.setdefault(uid, {})[dynamic_id] = {
+                    'uid': uid,
+                    'dynamic_id': dynamic_id,
+                    'title': details.get('title'),
+                    'start_ts': details['start_ts'],
+                    'description': details.get('description'),
+                }
+            self._upcoming = None
+            self._bodies.pop(('channel', uid), None)
+
+    def reset(self):
+        """Forgets live state, e.g. after LiveMonitor.stop() cleared it. Reservations are kept."""
+        self._live.clear()
+        self._live_since.clear()
+        self._bodies.clear()
+
+    def forget(self, uid):
+        """Stops listing a channel that is no longer tracked as live."""
+        self._live.discard(uid)
+        self._live_since.pop(uid, None)
+        self._bodies.pop('live', None)
+        self._bodies.pop(('channel', uid), None)
+
+    def _etag(self):
+        return f'"{self._epoch}-{next(self._versions)}"'
+
+    def _cached(self, key, build):
+        cached = self._bodies.get(key)
+        if cached is None:
+            cached = self._bodies[key] = (self._etag(), _json(build()))
+        return cached
+
+    @staticmethod
+    def _respond(request, etag, body):
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _matches(request.headers.get("if-none-match"), etag):
+            return 304, headers, b""
+        return 200, {"Content-Type": "application/json", **headers}, body
+
+    def _channel(self, uid):
+        state = self.monitor.states.get(uid)
+        if state is None:
+            return None
+        room_id = state.get('room_id')
+        return {
+            'uid': uid,
+            'room_id': room_id,
+            'live_status': state.get('live_status'),
+            'title': state.get('title'),
+            'link': f"https://live.bilibili.com/{room_id}" if room_id else None,
+            'live_since': self._live_since.get(uid),
+        }
+
+    def _upcoming_list(self, now):
+        """Reservations sorted by start time, rebuilt after a RESERVATION event or once the earliest has started."""
+        if self._upcoming is not None and (not self._upcoming[0] or self._upcoming[0][0] >= now):
+            return self._upcoming
+        for uid in list(self._reservations):
+            pending = {k: r for k, r in self._reservations[uid].items() if r['start_ts'] >= now}
+            if pending:
+                self._reservations[uid] = pending
+            else:
+                del self._reservations[uid]
+        entries = sorted((r['start_ts'], r['dynamic_id'] or "", r) for rs in self._reservations.values() for r in rs.values())
+        self._upcoming = ([ts for ts, _, _ in entries], [_json(r) for _, _, r in entries], self._etag())
+        return self._upcoming
+
+    def handle_live(self, request):
+        etag, body = self._cached('live', lambda: {
+            'channels': [c for c in (self._channel(uid) for uid in sorted(self._live)) if c and c['live_status'] == 1]
+        })
+        return self._respond(request, etag, body)
+
+    def handle_channel(self, request):
+        uid = request.path[len("/channel/"):]
+        if not uid.isdigit():
+            return 400, {"Content-Type": "text/plain"}, b"uid must be a number\n"
+        uid = int(uid)
+        if uid not in self.monitor.states and uid not in self._reservations:
+            return 404, {"Content-Type": "text/plain"}, b"unknown channel\n"
+
+        now = int(time.time())
+        reservations = self._reservations.get(uid, {})
+        if any(r['start_ts'] < now for r in reservations.values()):
+            self._bodies.pop(('channel', uid), None)
+            self._upcoming_list(now)
+        etag, body = self._cached(('channel', uid), lambda: {
+            **(self._channel(uid) or {'uid': uid}),
+            'reservations': sorted(self._reservations.get(uid, {}).values(), key=lambda r: r['start_ts']),
+        })
+        return self._respond(request, etag, body)
+
+    def handle_upcoming(self, request):
+        now = int(time.time())
+        try:
+            before = int(request.query.get('before', ['0'])[0]) or None
+        except ValueError:
+            return 400, {"Content-Type": "text/plain"}, b"before must be a unix timestamp\n"
+
+        starts, bodies, version = self._upcoming_list(now)
+        lo = bisect.bisect_left(starts, now)
+        hi = bisect.bisect_right(starts, before) if before else len(starts)
+        etag = f'{version[:-1]}-{lo}-{max(lo, hi)}"'
+        body = b'{"reservations":[' + b",".join(bodies[lo:hi]) + b']}'
+        return self._respond(request, etag, body)
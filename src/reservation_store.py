@@ -0,0 +1,134 @@
+import bisect
+import hashlib
+
+def _round_count(count):
+    """Rounds a subscriber count to two significant digits, so not every new subscriber is a change."""
+    if not count:
+        return 0
+    step = 10 ** max(len(str(int(count))) - 2, 0)
+    return int(count) // step * step
+
+def fingerprint(details):
+    """A 64-bit hash of the parts of a parsed reservation that make up a change."""
+    key = f"{details.get('start_ts')}\x00{details.get('title')}\x00{bool(details.get('cancelled'))}\x00{_round_count(details.get('total_count'))}"
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+class ReservationStore:
+    """
+    Stream reservations found in the channels' feeds, keyed by reservation ID.
+
+    An entry keeps the reservation's channel, dynamic, start time and title, plus a fingerprint
+    of its start time, title, cancellation and subscriber count (to two significant digits).
+    check() compares a freshly parsed reservation with the entry and tells whether it is new,
+    updated, cancelled or unchanged, so a dynamic that was processed long ago can still report
+    a moved start time.
+
+    Entries are ordered by start time for upcoming() and evicted `grace` seconds after it;
+    cancelled reservations are dropped right away. With a store, every change is persisted.
+    """
+    def __init__(self, store=None, grace=3600):
+        """
+        Args:
+            store (StateStore, optional): Persists entries with save_reservation() and delete_reservation().
+            grace (int): Seconds after a reservation's start time to keep tracking it.
+        """
+        self.store = store
+        self.grace = grace
+        self._entries = {}
+        # (start_ts, rid), sorted
+        self._order = []
+        self._dynamics = {}
+        self._channels = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, dynamic_id):
+        """Whether a dynamic holds a tracked reservation."""
+        return str(dynamic_id) in self._dynamics
+
+    def load(self, entries):
+        """Restores entries as returned by StateStore.load_reservations()."""
+        for entry in entries:
+            if entry['rid'] in self._entries:
+                self._remove(entry['rid'], persist=False)
+            self._put(dict(entry))
+
+    def entries(self, uid=None):
+        if uid is None:
+            return list(self._entries.values())
+        return [self._entries[rid] for rid in self._channels.get(uid, ())]
+
+    def upcoming(self, now, before=None):
+        """Entries starting between now and `before` (default: all), by start time."""
+        lo = bisect.bisect_left(self._order, (now,))
+        hi = bisect.bisect_right(self._order, (before, float("inf"))) if before else len(self._order)
+        return [self._entries[rid] for _, rid in self._order[lo:hi]]
+
+    def check(self, uid, dynamic_id, details, now):
+        """
+        Records a parsed reservation (see dynamic_parser.parse_reservation) and returns
+        (event type, previous entry): 'RESERVATION' for a new one, 'RESERVATION_UPDATED' or
+        'RESERVATION_CANCELLED' when its fingerprint changed. The type is None if nothing changed
+        or the reservation was already cancelled when first seen. New reservations without a
+        start time, or one that is already past, are reported but not tracked.
+        """
+        self.evict(now)
+        rid = details.get('rid') or int(dynamic_id)
+        previous = self._entries.get(rid)
+        if previous is None and str(dynamic_id) in self._dynamics:
+            # the reservation ID changed in place
+            previous = self._entries.get(self._dynamics[str(dynamic_id)])
+        current = fingerprint(details)
+
+        if previous is None:
+            if details.get('cancelled'):
+                return None, None
+            if details.get('start_ts') and details['start_ts'] >= now - self.grace:
+                self._put({'rid': rid, 'uid': uid, 'dynamic_id': str(dynamic_id), 'start_ts': details['start_ts'],
+                           'title': details.get('title'), 'fingerprint': current}, persist=True)
+            return 'RESERVATION', None
+
+        if previous['fingerprint'] == current:
+            return None, previous
+        self._remove(previous['rid'])
+        if details.get('cancelled') or not details.get('start_ts'):
+            return 'RESERVATION_CANCELLED', previous
+        self._put({**previous, 'rid': rid, 'start_ts': details['start_ts'], 'title': details.get('title'),
+                   'fingerprint': current}, persist=True)
+        return 'RESERVATION_UPDATED', previous
+
+    def evict(self, now):
+        """Drops the entries whose start time is more than `grace` seconds past. Returns how many."""
+        cutoff = now - self.grace
+        count = 0
+        while self._order and self._order[0][0] < cutoff:
+            self._remove(self._order[0][1])
+            count += 1
+        return count
+
+    def forget(self, uid):
+        """Drops a channel's entries from memory only, e.g. when another worker takes the channel over."""
+        for rid in list(self._channels.get(uid, ())):
+            self._remove(rid, persist=False)
+
+    def _put(self, entry, persist=False):
+        rid = entry['rid']
+        self._entries[rid] = entry
+        bisect.insort(self._order, (entry['start_ts'], rid))
+        self._dynamics[entry['dynamic_id']] = rid
+        self._channels.setdefault(entry['uid'], set()).add(rid)
+        if persist and self.store:
+            self.store.save_reservation(entry)
+
+    def _remove(self, rid, persist=True):
+        entry = self._entries.pop(rid)
+        i = bisect.bisect_left(self._order, (entry['start_ts'], rid))
+        del self._order[i]
+        self._dynamics.pop(entry['dynamic_id'], None)
+        rids = self._channels[entry['uid']]
+        rids.discard(rid)
+        if not rids:
+            del self._channels[entry['uid']]
+        if persist and self.store:
+            self.store.delete_reservation(rid)
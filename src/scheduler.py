@@ -1,101 +1,434 @@
 import asyncio
+import heapq
+import itertools
+import math
 import random
 import time
+from logging_setup import get_logger
+
+log = get_logger("ratelimit")
 
 class Scheduler:
-    def __init__(self, uids, interval=300, min_delay=1.0, jitter=1.0):
+    """
+    Round-robin over the UIDs. Channels added while running are appended to the end of
+    the current pass; removed ones are skipped and dropped from the order when it wraps.
+    """
+    def __init__(self, uids, interval=300, min_delay=1.0, jitter=1.0, clock=time.monotonic):
         """
         Args:
             uids (list): List of UIDs to track.
             interval (int): Target loop interval in seconds (default 300s / 5m).
             min_delay (float): Minimum delay between requests in seconds to protect API.
             jitter (float): Max random deviation in seconds added/subtracted from delay.
+            clock (callable): Monotonic time source for cycle durations, replaceable for simulation.
         """
-        self.uids = uids
+        self.uids = list(uids)
         self.interval = interval
         self.min_delay = min_delay
         self.jitter = jitter
+        self.clock = clock
+        self._members = set(self.uids)
+        # removed UIDs still in self.uids until the pass wraps around
+        self._removed = set()
         self._index = 0
         self._first_run = True
+        # duration of the last full pass over all UIDs, for comparison with interval
+        self.last_cycle_duration = None
+        self._cycle_started = None
+
+    def __len__(self):
+        return len(self._members)
+
+    def add(self, uid):
+        if uid in self._members:
+            return
+        self._members.add(uid)
+        if uid in self._removed:
+            self._removed.discard(uid)
+        else:
+            self.uids.append(uid)
+
+    def remove(self, uid):
+        if uid in self._members:
+            self._members.discard(uid)
+            self._removed.add(uid)
         
+    def observe(self, event, now=None):
+        """Round-robin polling does not depend on channel activity."""
+        pass
+
     async def next_uid(self):
         """
         Waits for the calculated delay and returns the next UID to poll.
         """
-        if not self.uids:
-            await asyncio.sleep(self.interval)
-            return None
+        batch = await self.next_batch(1)
+        return batch[0] if batch else None
 
-        count = len(self.uids)
+    async def next_batch(self, size):
+        """
+        Waits for the calculated delay and returns the next `size` UIDs to poll.
+        The cycle interval is spread over the number of batches instead of the number of UIDs.
+        """
+        if not self._members:
+            # channels can be added at any time
+            await asyncio.sleep(max(self.min_delay, 1.0))
+            return []
+
+        count = len(self._members)
+        size = max(1, min(size, count))
+        batches = math.ceil(count / size)
         if self._first_run:
             target_delay = self.min_delay
         else:
-            target_delay = max(self.interval / max(count, 1), self.min_delay)
+            target_delay = max(self.interval / batches, self.min_delay)
         
         noise = random.uniform(-self.jitter, self.jitter)
         sleep_time = max(0.1, target_delay + noise)
         
         await asyncio.sleep(sleep_time)
         
-        uid = self.uids[self._index]
-        self._index = (self._index + 1) % count
-        
         if self._index == 0:
+            now = self.clock()
+            if self._cycle_started is not None:
+                self.last_cycle_duration = now - self._cycle_started
+            self._cycle_started = now
+
+        batch = []
+        while len(batch) < size and self._index < len(self.uids):
+            uid = self.uids[self._index]
+            self._index += 1
+            if uid in self._members:
+                batch.append(uid)
+        
+        if self._index >= len(self.uids):
+            self._index = 0
             self._first_run = False
+            if self._removed:
+                self.uids = [uid for uid in self.uids if uid in self._members]
+                self._removed.clear()
         
-        return uid
+        return batch
 
 class GlobalRateLimiter:
     """
-    Enforces a strict minimum delay between requests across multiple concurrent tasks.
-    Supports progressive backoff on rate limit errors.
+    Token bucket shared by all polling tasks.
+    Each wait() reserves the next free slot and then sleeps outside of any lock, so
+    waiters are released in FIFO order without blocking each other.
+    On 412/429 the request rate is cut in half and requests pause for a while;
+    after sustained success the rate grows back additively to its ceiling (AIMD).
     """
-    def __init__(self, min_delay=1.0):
+    def __init__(self, min_delay=1.0, burst=1, max_delay=30.0, backoff_base=60, backoff_max=600,
+                 recovery_successes=20, recovery_step=None, clock=time.monotonic, sleep=asyncio.sleep):
+        """
+        Args:
+            min_delay (float): Delay between requests at the ceiling rate, in seconds.
+            burst (int): Requests that may go out back to back after an idle period.
+            max_delay (float): Upper bound of the delay after repeated rate limit errors.
+            backoff_base (float): Pause after a rate limit error, multiplied by the consecutive error count (seconds).
+            backoff_max (float): Upper bound of that pause (seconds).
+            recovery_successes (int): Consecutive successes needed for each additive rate increase.
+            recovery_step (float, optional): Requests/s added per increase. Defaults to 10% of the ceiling rate.
+            clock (callable): Monotonic time source, replaceable for simulation.
+            sleep (callable): Async sleep matching the clock.
+        """
+        if min_delay <= 0:
+            # the backoff doubles the delay and the recovery works on its inverse
+            raise ValueError(f"min_delay must be positive, got {min_delay}")
         self.min_delay = min_delay
         self.current_min_delay = min_delay
-        self.last_req_time = 0
-        self._lock = asyncio.Lock()
-        
+        self.burst = max(1, burst)
+        self.max_delay = max_delay
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.recovery_successes = recovery_successes
+        self.recovery_step = recovery_step if recovery_step is not None else 0.1 / min_delay
+        self.clock = clock
+        self.sleep = sleep
+
         self.backoff_until = 0
         self.consecutive_errors = 0
+        self.success_streak = 0
+        self._tat = 0
+
+    def _reserve(self):
+        """Takes the next free slot and returns the time it starts at."""
+        now = self.clock()
+        tolerance = (self.burst - 1) * self.current_min_delay
+        slot = max(now, self._tat - tolerance, self.backoff_until)
+        self._tat = max(self._tat, slot) + self.current_min_delay
+        return slot
 
     async def wait(self):
         """
-        Blocks until enough time has passed since the last granted request.
-        Respects active backoff timers.
+        Blocks until this caller's slot comes up.
+        Respects active backoff timers, including ones triggered while already waiting.
         """
-        async with self._lock:
-            now = time.time()
-            
-            if now < self.backoff_until:
-                wait_time = self.backoff_until - now
-                print(f"[RateLimiter] 🛑 Backoff active. Pausing for {wait_time:.1f}s...")
-                await asyncio.sleep(wait_time)
-                now = time.time()
-
-            elapsed = now - self.last_req_time
-            delay_needed = self.current_min_delay
-            
-            if elapsed < delay_needed:
-                wait_time = delay_needed - elapsed
-                await asyncio.sleep(wait_time)
-            
-            self.last_req_time = time.time()
+        slot = self._reserve()
+        while True:
+            now = self.clock()
+            if slot > now:
+                if self.backoff_until > now:
+                    log.info("🛑 Backoff active. Pausing for %.1fs...", slot - now)
+                await self.sleep(slot - now)
+                now = self.clock()
+            if now >= self.backoff_until:
+                return
+            slot = self._reserve()
+
+    def backoff_remaining(self):
+        return max(0, self.backoff_until - self.clock())
 
     def trigger_backoff(self):
         """Called when a 412/429 error is detected."""
         self.consecutive_errors += 1
+        self.success_streak = 0
         
-        penalty = 60 * self.consecutive_errors
-        self.backoff_until = time.time() + penalty
-        
-        if self.consecutive_errors > 1:
-            self.current_min_delay = min(self.current_min_delay + 2.0, 30.0)
+        penalty = min(self.backoff_base * self.consecutive_errors, self.backoff_max)
+        self.backoff_until = self.clock() + penalty
+        self._tat = max(self._tat, self.backoff_until)
+        self.current_min_delay = min(self.current_min_delay * 2, self.max_delay)
             
-        print(f"[RateLimiter] ⚠️ RATE LIMIT HIT! Pausing {penalty}s. New min_delay={self.current_min_delay}s")
+        log.warning("⚠️ RATE LIMIT HIT! Pausing %ss. New min_delay=%.1fs", penalty, self.current_min_delay)
 
     def report_success(self):
-        """Resets consecutive error count on success."""
+        """Resets consecutive error count on success and raises the rate after sustained success."""
         if self.consecutive_errors > 0:
             self.consecutive_errors = 0
-            print("[RateLimiter] ✅ API call successful. Error count reset.")
+            log.info("✅ API call successful. Error count reset.")
+
+        if self.current_min_delay <= self.min_delay:
+            return
+        self.success_streak += 1
+        if self.success_streak >= self.recovery_successes:
+            self.success_streak = 0
+            rate = 1 / self.current_min_delay + self.recovery_step
+            self.current_min_delay = max(self.min_delay, 1 / rate)
+            log.info("📈 Sustained success. New min_delay=%.1fs", self.current_min_delay)
+
+class AdaptiveScheduler:
+    """
+    Spends the same request budget as Scheduler (one request or batch per interval / count),
+    but instead of round-robin it always polls the UIDs with the earliest next-due time.
+    Each channel's own polling interval follows its recent activity:
+    shorter while live, around a reservation's start time and during the hours it usually
+    goes live, longer once it has been dormant for a while.
+    Activity is fed in through observe() with the events the pollers emit.
+    Channels added while running get a random due time within one interval, so a large
+    addition is spread over the schedule instead of being polled all at once.
+    """
+    def __init__(self, uids, interval=300, min_delay=1.0, jitter=1.0,
+                 live_factor=0.5, hot_factor=0.2, active_hour_factor=0.5, dormant_factor=4.0,
+                 reservation_lead=1800, reservation_grace=3600, dormant_after=14 * 86400, clock=time.time):
+        """
+        Args:
+            uids (list): List of UIDs to track.
+            interval (int): Target loop interval in seconds, also the base per-channel interval.
+            min_delay (float): Minimum delay between requests in seconds to protect API.
+            jitter (float): Max random deviation in seconds added/subtracted from delay.
+            live_factor (float): Interval multiplier while a channel is live.
+            hot_factor (float): Interval multiplier from reservation_lead before to reservation_grace after a reservation's start time.
+            active_hour_factor (float): Interval multiplier during (and the hour before) hours the channel often goes live.
+            dormant_factor (float): Interval multiplier after dormant_after seconds without any activity.
+            reservation_lead (int): Seconds before a reservation's start time to start polling faster.
+            reservation_grace (int): Seconds after a reservation's start time to keep polling faster.
+            dormant_after (int): Seconds without activity after which a channel counts as dormant.
+            clock (callable): Unix time source, replaceable for simulation.
+        """
+        self.uids = set(uids)
+        self.interval = interval
+        self.min_delay = min_delay
+        self.jitter = jitter
+        self.live_factor = live_factor
+        self.hot_factor = hot_factor
+        self.active_hour_factor = active_hour_factor
+        self.dormant_factor = dormant_factor
+        self.reservation_lead = reservation_lead
+        self.reservation_grace = reservation_grace
+        self.dormant_after = dormant_after
+        self.clock = clock
+
+        self._heap = []
+        self._entry = {}
+        self._due = {}
+        self._seq = itertools.count()
+        self._last_polled = {}
+        self._activity = {}
+        self._unpolled = set(uids)
+
+        # a cycle ends once every UID has been polled at least once
+        self.last_cycle_duration = None
+        self.last_lag = 0
+        self._cycle_pending = set(uids)
+        self._cycle_started = None
+
+        now = self.clock()
+        for uid in uids:
+            self._activity[uid] = self._new_activity(now)
+            self._push(uid, 0)
+
+    def __len__(self):
+        return len(self.uids)
+
+    def add(self, uid, now=None):
+        if uid in self.uids:
+            return
+        now = self.clock() if now is None else now
+        self.uids.add(uid)
+        self._activity[uid] = self._new_activity(now)
+        self._push(uid, now + random.uniform(0, self.interval))
+
+    def remove(self, uid):
+        """Forgets a channel. Its heap entry is skipped when popped."""
+        if uid not in self.uids:
+            return
+        self.uids.discard(uid)
+        for per_uid in (self._entry, self._due, self._activity, self._last_polled):
+            per_uid.pop(uid, None)
+        self._unpolled.discard(uid)
+        self._cycle_pending.discard(uid)
+
+    def _new_activity(self, now):
+        return {'live': False, 'reservations': [], 'hours': [0] * 24, 'starts': 0, 'last_active': now}
+
+    def _push(self, uid, due):
+        seq = next(self._seq)
+        self._entry[uid] = seq
+        self._due[uid] = due
+        heapq.heappush(self._heap, (due, seq, uid))
+
+    @staticmethod
+    def _hour(ts):
+        # Bilibili schedules are in UTC+8
+        return int((ts + 8 * 3600) // 3600) % 24
+
+    def _is_active_hour(self, activity, now):
+        if activity['starts'] < 3:
+            return False
+        hour = self._hour(now)
+        threshold = activity['starts'] * 0.15
+        return activity['hours'][hour] >= threshold or activity['hours'][(hour + 1) % 24] >= threshold
+
+    def channel_interval(self, uid, now):
+        """Returns the polling interval a channel currently wants, in seconds."""
+        activity = self._activity.get(uid)
+        if activity is None:
+            return self.interval
+
+        factor = 1.0
+        if activity['live']:
+            factor = min(factor, self.live_factor)
+
+        activity['reservations'] = [ts for ts in activity['reservations'] if ts + self.reservation_grace >= now]
+        for start_ts in activity['reservations']:
+            if start_ts - self.reservation_lead <= now:
+                factor = min(factor, self.hot_factor)
+
+        if self._is_active_hour(activity, now):
+            factor = min(factor, self.active_hour_factor)
+
+        if factor == 1.0 and now - activity['last_active'] > self.dormant_after:
+            factor = self.dormant_factor
+
+        return self.interval * factor
+
+    def observe(self, event, now=None):
+        """Updates a channel's activity from an emitted event and moves it forward in the queue if it got hotter."""
+        uid = event.get('uid')
+        activity = self._activity.get(uid)
+        if activity is None:
+            return
+        now = self.clock() if now is None else now
+        event_type = event.get('event_type')
+        details = event.get('details', {})
+
+        if event_type == 'STATE_SYNC':
+            activity['live'] = details.get('live_status') == 1
+            if activity['live']:
+                activity['last_active'] = now
+        elif event_type == 'STREAM_START':
+            activity['live'] = True
+            activity['hours'][self._hour(event.get('timestamp') or now)] += 1
+            activity['starts'] += 1
+            activity['last_active'] = now
+        elif event_type == 'STREAM_END':
+            activity['live'] = False
+            activity['last_active'] = now
+        elif event_type == 'TITLE_CHANGE':
+            activity['last_active'] = now
+        elif event_type in ('RESERVATION', 'RESERVATION_UPDATED', 'RESERVATION_CANCELLED'):
+            previous = details.get('previous')
+            if previous and previous.get('start_ts') in activity['reservations']:
+                activity['reservations'].remove(previous['start_ts'])
+            if details.get('start_ts') and event_type != 'RESERVATION_CANCELLED':
+                activity['reservations'].append(details['start_ts'])
+            activity['last_active'] = now
+        elif event_type == 'ANNOUNCEMENT_LIVE_START':
+            # the room should be live already, poll it as if a reservation started now
+            activity['reservations'].append(now)
+            activity['last_active'] = now
+        else:
+            return
+
+        last_polled = self._last_polled.get(uid)
+        if last_polled is None:
+            return
+        due = max(now, last_polled + self.channel_interval(uid, now))
+        if due < self._due[uid]:
+            self._push(uid, due)
+
+    def pop_batch(self, size, now):
+        """Takes the `size` most overdue UIDs and reschedules them from `now`."""
+        batch = []
+        lag = 0
+        while self._heap and len(batch) < size:
+            due, seq, uid = heapq.heappop(self._heap)
+            if self._entry.get(uid) != seq:
+                continue
+            batch.append(uid)
+            lag = max(lag, now - due) if due else lag
+
+        if self._cycle_started is None:
+            self._cycle_started = now
+        for uid in batch:
+            self._last_polled[uid] = now
+            self._unpolled.discard(uid)
+            self._cycle_pending.discard(uid)
+            self._push(uid, now + self.channel_interval(uid, now))
+        if batch:
+            self.last_lag = lag
+        if not self._cycle_pending:
+            self.last_cycle_duration = now - self._cycle_started
+            self._cycle_started = now
+            self._cycle_pending = set(self.uids)
+        return batch
+
+    async def next_uid(self):
+        """
+        Waits for the calculated delay and returns the next UID to poll.
+        """
+        batch = await self.next_batch(1)
+        return batch[0] if batch else None
+
+    async def next_batch(self, size):
+        """
+        Waits for the calculated delay and returns the next `size` UIDs to poll.
+        """
+        if not self.uids:
+            # channels can be added at any time
+            await asyncio.sleep(max(self.min_delay, 1.0))
+            return []
+
+        count = len(self.uids)
+        size = max(1, min(size, count))
+        batches = math.ceil(count / size)
+        if self._unpolled:
+            target_delay = self.min_delay
+        else:
+            target_delay = max(self.interval / batches, self.min_delay)
+
+        noise = random.uniform(-self.jitter, self.jitter)
+        sleep_time = max(0.1, target_delay + noise)
+
+        await asyncio.sleep(sleep_time)
+
+        return self.pop_batch(size, self.clock())
@@ -0,0 +1,80 @@
+import bisect
+
+class SeenDynamics:
+    """
+    Per-channel dedup of dynamic IDs.
+
+    Dynamic IDs increase monotonically, so each channel only keeps a bounded, sorted
+    window of the most recent IDs it has processed. The newest one is the channel's
+    high-water mark. IDs older than the window are treated as already seen, which also
+    covers pinned posts that keep reappearing at the top of the feed. IDs inside the
+    window that were never processed are new (out-of-order or late-approved items).
+    Memory is O(channels * window) instead of O(history).
+    """
+    def __init__(self, window=32):
+        """
+        Args:
+            window (int): Number of recent dynamic IDs remembered per channel.
+        """
+        self.window = window
+        self._recent = {}
+        # processed IDs from the checkpoint format before per-channel windows, not tied to a channel
+        self._legacy = set()
+
+    def __len__(self):
+        return len(self._recent)
+
+    def is_new(self, uid, dynamic_id):
+        """Returns True if the dynamic has not been processed for this channel yet."""
+        recent = self._recent.get(uid)
+        if not recent:
+            return True
+
+        dynamic_id = int(dynamic_id)
+        if len(recent) >= self.window and dynamic_id < recent[0]:
+            return False
+
+        i = bisect.bisect_left(recent, dynamic_id)
+        return i == len(recent) or recent[i] != dynamic_id
+
+    def add(self, uid, dynamic_id):
+        """Marks a dynamic as processed, dropping the oldest ID once the window is full."""
+        recent = self._recent.setdefault(uid, [])
+        bisect.insort(recent, int(dynamic_id))
+        if len(recent) > self.window:
+            del recent[0]
+
+    def watermark(self, uid):
+        """Returns the newest processed dynamic ID of a channel, or None."""
+        recent = self._recent.get(uid)
+        return recent[-1] if recent else None
+
+    def recent(self, uid):
+        return list(self._recent.get(uid, ()))
+
+    def load_legacy(self, dynamic_ids):
+        """Restores the processed IDs of the old checkpoint format. adopt() moves them into the channels' windows."""
+        self._legacy = {int(i) for i in dynamic_ids}
+
+    def has_legacy(self):
+        return bool(self._legacy)
+
+    def clear_legacy(self):
+        self._legacy = set()
+
+    def adopt(self, uid, dynamic_id):
+        """Moves an ID of the old checkpoint into a channel's window. Returns False if it was not one."""
+        dynamic_id = int(dynamic_id)
+        if dynamic_id not in self._legacy:
+            return False
+        self._legacy.discard(dynamic_id)
+        self.add(uid, dynamic_id)
+        return True
+
+    def forget(self, uid):
+        self._recent.pop(uid, None)
+
+    def load(self, windows):
+        """Restores the windows from a {uid: [dynamic_id, ...]} mapping."""
+        for uid, ids in windows.items():
+            self._recent[uid] = sorted(int(i) for i in ids)[-self.window:]
@@ -0,0 +1,168 @@
+import time
+from collections import OrderedDict
+
+class SessionTracker:
+    """
+    Joins the events of one stream into a single session record:
+    the RESERVATION that scheduled it, the ANNOUNCEMENT_LIVE_START post, STREAM_START,
+    every TITLE_CHANGE and STREAM_END. Each event is applied with dict lookups on its UID
+    (a channel has a single room).
+
+    A STREAM_SESSION event is returned when a session closes: on STREAM_END, when the
+    channel turns up offline, or when it is dropped to bound memory. Sessions untouched
+    for max_age are expired, and the least recently updated one is evicted once there are
+    more than max_open. Both close with a close_reason saying so.
+    """
+    def __init__(self, max_open=10000, max_age=24 * 3600, match_window=3 * 3600,
+                 reservations_per_channel=5, max_titles=20):
+        """
+        Args:
+            max_open (int): Max sessions held open at once.
+            max_age (int): Seconds without any event after which an open session is expired.
+            match_window (int): Max distance between a reservation's start time and the actual start to link them (seconds).
+            reservations_per_channel (int): Pending reservations remembered per channel.
+            max_titles (int): Title history entries kept per session.
+        """
+        self.max_open = max_open
+        self.max_age = max_age
+        self.match_window = match_window
+        self.reservations_per_channel = reservations_per_channel
+        self.max_titles = max_titles
+
+        # uid -> session, least recently updated first
+        self._open = OrderedDict()
+        # uid -> {dynamic_id: (start_ts, title)}
+        self._reservations = {}
+
+    def __len__(self):
+        return len(self._open)
+
+    def observe(self, event, now=None):
+        """Applies an event and returns the STREAM_SESSION events of sessions that closed."""
+        now = time.time() if now is None else now
+        closed = self._expire(now)
+
+        uid = event.get('uid')
+        event_type = event.get('event_type')
+        details = event.get('details', {})
+        ts = event.get('timestamp') or int(now)
+
+        if event_type in ('RESERVATION', 'RESERVATION_UPDATED'):
+            if details.get('start_ts'):
+                pending = self._reservations.setdefault(uid, {})
+                pending[event.get('dynamic_id')] = (details['start_ts'], details.get('title'))
+                while len(pending) > self.reservations_per_channel:
+                    del pending[min(pending, key=lambda k: pending[k][0])]
+            return closed
+
+        if event_type == 'RESERVATION_CANCELLED':
+            pending = self._reservations.get(uid)
+            if pending:
+                pending.pop(event.get('dynamic_id'), None)
+                if not pending:
+                    del self._reservations[uid]
+            return closed
+
+        if event_type == 'ANNOUNCEMENT_LIVE_START':
+            if ts < now - self.match_window:
+                # an old post seen on a channel's first poll, its stream is long over
+                return closed
+            session = self._session(uid, details.get('room_id'), now, closed)
+            if session['announced_at'] is None:
+                session['announced_at'] = ts
+                session['announcement_id'] = event.get('dynamic_id')
+            return closed
+
+        if event_type == 'STREAM_START' or (event_type == 'STATE_SYNC' and details.get('live_status') == 1):
+            session = self._session(uid, event.get('room_id'), now, closed)
+            if event_type == 'STREAM_START' and session['started_at'] is None:
+                session['started_at'] = ts
+                self._link_reservation(uid, session, ts, now)
+            self._add_title(session, ts, details.get('title'))
+            return closed
+
+        if event_type == 'TITLE_CHANGE':
+            session = self._open.get(uid)
+            if session:
+                self._touch(uid, session, now)
+                self._add_title(session, ts, details.get('new_title'))
+            return closed
+
+        if event_type == 'STREAM_END' or (event_type == 'STATE_SYNC' and details.get('live_status') != 1):
+            session = self._open.pop(uid, None)
+            if session:
+                session['ended_at'] = ts
+                closed.append(self._record(session, 'ended', now))
+        return closed
+
+    def _session(self, uid, room_id, now, closed):
+        session = self._open.get(uid)
+        if session is None:
+            session = {
+                'uid': uid, 'room_id': room_id, 'first_seen': int(now),
+                'scheduled_start': None, 'reservation_id': None, 'reservation_title': None,
+                'announced_at': None, 'announcement_id': None,
+                'started_at': None, 'ended_at': None, 'titles': [], 'updated_at': now,
+            }
+            self._open[uid] = session
+            if len(self._open) > self.max_open:
+                _, evicted = self._open.popitem(last=False)
+                closed.append(self._record(evicted, 'evicted', now))
+        else:
+            self._touch(uid, session, now)
+        if room_id:
+            session['room_id'] = room_id
+        return session
+
+    def _touch(self, uid, session, now):
+        session['updated_at'] = now
+        self._open.move_to_end(uid)
+
+    def _expire(self, now):
+        closed = []
+        while self._open:
+            uid, session = next(iter(self._open.items()))
+            if now - session['updated_at'] < self.max_age:
+                break
+            del self._open[uid]
+            closed.append(self._record(session, 'expired', now))
+        return closed
+
+    def _link_reservation(self, uid, session, started_at, now):
+        pending = self._reservations.get(uid)
+        if not pending:
+            return
+        best = None
+        for dynamic_id, (start_ts, title) in list(pending.items()):
+            distance = abs(start_ts - started_at)
+            if distance <= self.match_window and (best is None or distance < best[0]):
+                best = (distance, dynamic_id, start_ts, title)
+            elif start_ts + self.match_window < now:
+                del pending[dynamic_id]
+        if best:
+            _, dynamic_id, start_ts, title = best
+            del pending[dynamic_id]
+            session.update(scheduled_start=start_ts, reservation_id=dynamic_id, reservation_title=title)
+        if not pending:
+            del self._reservations[uid]
+
+    def _add_title(self, session, ts, title):
+        titles = session['titles']
+        if title is not None and (not titles or titles[-1]['title'] != title):
+            titles.append({'ts': ts, 'title': title})
+            del titles[:-self.max_titles]
+
+    def _record(self, session, reason, now):
+        started_at = session['started_at']
+        ended_at = session['ended_at']
+        details = {k: v for k, v in session.items() if k not in ('uid', 'room_id', 'updated_at')}
+        details['close_reason'] = reason
+        details['duration'] = ended_at - started_at if started_at and ended_at else None
+        details['start_delay'] = started_at - session['scheduled_start'] if started_at and session['scheduled_start'] else None
+        return {
+            'event_type': 'STREAM_SESSION',
+            'uid': session['uid'],
+            'room_id': session['room_id'],
+            'timestamp': ended_at or int(now),
+            'details': details,
+        }
@@ -0,0 +1,310 @@
+import asyncio
+import collections
+import itertools
+import json
+import os
+import random
+import shutil
+import time
+from event_writer import collect_batch
+from logging_setup import get_logger
+
+log = get_logger("sinks")
+event_log = get_logger("events")
+
+class StdoutSink:
+    """Logs a human-readable line per event to the "events" logger, which writes to stdout."""
+    async def start(self):
+        pass
+
+    async def send(self, event):
+        log_msg = f"[{event['event_type']}] Room/UID: {event.get('room_id') or event.get('uid')} - TS: {event.get('timestamp')}"
+        details = event.get('details', {})
+
+        if event['event_type'] == 'RESERVATION':
+            log_msg += f"\n  Scheduled: {details.get('title')} @ {details.get('description')} (TS: {details.get('start_ts')})"
+
+        elif event['event_type'] == 'RESERVATION_UPDATED':
+            previous = details.get('previous') or {}
+            log_msg += f"\n  Reservation Updated: {details.get('title')} @ {details.get('description')} (TS: {previous.get('start_ts')} -> {details.get('start_ts')}, {details.get('total_count')} subscribed)"
+
+        elif event['event_type'] == 'RESERVATION_CANCELLED':
+            log_msg += f"\n  Reservation Cancelled: {details.get('title')} (TS: {details.get('start_ts')})"
+
+        elif event['event_type'] == 'ANNOUNCEMENT_LIVE_START':
+            log_msg += f"\n  Live Announcement: {details.get('title')} (Room: {details.get('room_id')})"
+
+        elif event['event_type'] == 'STREAM_START':
+            log_msg += f"\n  🔴 Stream Begin: {details.get('title')} (Room: {details.get('room_id')})"
+
+        elif event['event_type'] == 'STREAM_END':
+            log_msg += f"\n  ⚫ Stream End: {details.get('title')} (Room: {details.get('room_id')})"
+
+        elif event['event_type'] == 'TITLE_CHANGE':
+            log_msg += f"\n  Title Updated: '{details.get('old_title')}' -> '{details.get('new_title')}'"
+
+        elif event['event_type'] == 'STATE_SYNC':
+            status = "🔴 LIVE" if details.get('live_status') == 1 else "⚫ Offline"
+            log_msg += f"\n  State Sync: {status} | Title: {details.get('title')}"
+
+        elif event['event_type'] == 'STREAM_SESSION':
+            duration = f"{details['duration'] // 60}min" if details.get('duration') else "unknown duration"
+            titles = details.get('titles') or [{}]
+            log_msg += f"\n  Session closed ({details.get('close_reason')}): {titles[-1].get('title')} ({duration}, scheduled: {details.get('scheduled_start')})"
+
+        event_log.info(log_msg, extra={'event_type': event['event_type'], 'uid': event.get('uid')})
+
+    async def close(self):
+        pass
+
+class FileSink:
+    """
+    Writes events to the local event log through an EventWriter.
+    This is the durable record, so it applies backpressure once the writer queue is full instead of dropping.
+    """
+    def __init__(self, writer):
+        self.writer = writer
+
+    def queue_depth(self):
+        return self.writer.queue_depth()
+
+    async def start(self):
+        await self.writer.start()
+
+    async def send(self, event):
+        await self.writer.write(event)
+
+    async def close(self):
+        await self.writer.close()
+
+class WebhookSink:
+    """
+    POSTs batches of events as {"events": [...]} to an HTTP endpoint.
+
+    send() never waits on the receiver or the disk: events go on a bounded queue, and
+    when the queue is full they are set aside in memory for the background task, which
+    appends them to a spill file along with the batches it cannot deliver. All file
+    I/O runs in a worker thread.
+    Repeated STATE_SYNC/TITLE_CHANGE events for the same UID within a batch are coalesced.
+    Failed batches are retried with exponential backoff. Spilled events are
+    replayed once a delivery succeeds again.
+    """
+    def __init__(self, url, spill_path, batch_size=100, flush_interval=1.0, max_queue=10000,
+                 max_retries=3, backoff_base=1.0, backoff_max=60.0, timeout=10, headers=None,
+                 include_raw_data=False, max_overflow=10000):
+        """
+        Args:
+            url (str): Receiver endpoint.
+            spill_path (str): JSONL file for events that could not be queued or delivered.
+            batch_size (int): Max events per POST.
+            flush_interval (float): Max time an event waits for its batch to fill (seconds).
+            max_queue (int): Max events held in memory before spilling to disk.
+            max_retries (int): Retries per batch before it is spilled and the receiver is considered down.
+            backoff_base (float): First retry delay, doubled on each retry (seconds).
+            backoff_max (float): Upper bound of the retry delay and of the down period (seconds).
+            timeout (float): Request timeout (seconds).
+            headers (dict, optional): Extra request headers, e.g. authorization.
+            include_raw_data (bool): Send the raw dynamic item along with announcement events.
+            max_overflow (int): Max events waiting to be spilled while the queue is full. Beyond it the
+                oldest are dropped and counted in `dropped`.
+        """
+        self.url = url
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self.include_raw_data = include_raw_data
+
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._task = None
+        self._session = None
+        self._down_until = 0
+        # events that did not fit on the queue, written to the spill file by _run()
+        self._overflow = collections.deque(maxlen=max_overflow)
+        self._replay_path = f"{spill_path}.replay"
+        # a .replay file is left over when the process stopped during a replay
+        self._spilled = any(os.path.exists(path) and os.path.getsize(path) > 0
+                            for path in (spill_path, self._replay_path))
+
+        self.delivered = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    async def start(self):
+        if self._task is None:
+            from curl_cffi.requests import AsyncSession
+            self._session = AsyncSession()
+            self._task = asyncio.create_task(self._run())
+
+    async def send(self, event):
+        if not self.include_raw_data and 'raw_data' in event:
+            event = {k: v for k, v in event.items() if k != 'raw_data'}
+        try:
+            self._queue.put_nowait(event)
+        except asyncio.QueueFull:
+            if len(self._overflow) == self._overflow.maxlen:
+                self.dropped += 1
+                if self.dropped % 1000 == 1:
+                    log.warning("Webhook spill is falling behind, dropped %d events so far", self.dropped)
+            self._overflow.append(event)
+
+    async def close(self):
+        """Delivers what is still queued (one attempt) and spills the rest."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        await self._session.close()
+
+    async def _run(self):
+        while True:
+            batch, stop = await collect_batch(self._queue, self.batch_size, self.flush_interval)
+            if batch:
+                await self._handle(self._coalesce(batch), retries=0 if stop else self.max_retries)
+            if self._overflow:
+                overflow = list(self._overflow)
+                self._overflow.clear()
+                await self._spill(overflow)
+            if stop:
+                return
+
+    async def _handle(self, batch, retries):
+        if time.monotonic() < self._down_until:
+            await self._spill(batch)
+            return
+
+        if await self._deliver(batch, retries):
+            if self._spilled:
+                await self._replay_spill()
+        else:
+            self._down_until = time.monotonic() + self.backoff_max
+            log.warning("Webhook receiver unavailable. Spilling events for %.0fs", self.backoff_max)
+            await self._spill(batch)
+
+    async def _deliver(self, batch, retries):
+        body = json.dumps({'events': batch}, ensure_ascii=False).encode("utf-8")
+        for attempt in range(retries + 1):
+            try:
+                resp = await self._session.post(self.url, data=body, headers=self.headers, timeout=self.timeout)
+                if 200 <= resp.status_code < 300:
+                    self.delivered += len(batch)
+                    return True
+                log.warning("Webhook receiver returned HTTP %s", resp.status_code)
+            except Exception as e:
+                log.warning("Webhook delivery failed: %s", e)
+
+            if attempt < retries:
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+        return False
+
+    def _coalesce(self, batch):
+        """Keeps only the latest STATE_SYNC per UID and merges consecutive TITLE_CHANGEs per UID."""
+        out = []
+        latest = {}
+        for event in batch:
+            event_type = event.get('event_type')
+            if event_type not in ('STATE_SYNC', 'TITLE_CHANGE'):
+                out.append(event)
+                continue
+
+            key = (event_type, event.get('uid'))
+            if key not in latest:
+                latest[key] = len(out)
+                out.append(event)
+                continue
+
+            i = latest[key]
+            if event_type == 'TITLE_CHANGE':
+                event = dict(event)
+                event['details'] = {**event.get('details', {}), 'old_title': out[i].get('details', {}).get('old_title')}
+            out[i] = event
+        return out
+
+    def _append_spill(self, events):
+        os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+
+    async def _spill(self, events):
+        await asyncio.to_thread(self._append_spill, events)
+        self._spilled = True
+        self.spilled += len(events)
+
+    async def _replay_spill(self):
+        """
+        Delivers the spilled events in order, reading them batch_size at a time.
+        A .replay file left over from a crash goes first, then the spill file.
+        """
+        self._spilled = False
+        while await asyncio.to_thread(self._next_replay):
+            if not await self._replay_file():
+                return
+
+    def _next_replay(self):
+        """Moves the spill file to the .replay path unless one is left over. Returns False if there is nothing to replay."""
+        if os.path.exists(self._replay_path):
+            return True
+        if not os.path.exists(self.spill_path):
+            return False
+        os.replace(self.spill_path, self._replay_path)
+        return True
+
+    async def _replay_file(self):
+        """Replays the .replay file and removes it. On failure keeps what is left of it and returns False."""
+        log.info("Replaying spilled webhook events...")
+        f = await asyncio.to_thread(open, self._replay_path, "r", encoding="utf-8")
+        try:
+            while True:
+                lines = await asyncio.to_thread(lambda: list(itertools.islice(f, self.batch_size)))
+                if not lines:
+                    break
+                chunk = [json.loads(line) for line in lines if line.strip()]
+                if chunk and not await self._deliver(chunk, self.max_retries):
+                    self._down_until = time.monotonic() + self.backoff_max
+                    await asyncio.to_thread(self._keep_rest, lines, f)
+                    self._spilled = True
+                    return False
+        finally:
+            f.close()
+        await asyncio.to_thread(os.remove, self._replay_path)
+        return True
+
+    def _keep_rest(self, lines, f):
+        """Rewrites the .replay file to the undelivered lines and the rest of f, so the order is kept."""
+        tmp_path = f"{self._replay_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as out:
+            out.writelines(lines)
+            shutil.copyfileobj(f, out)
+        os.replace(tmp_path, self._replay_path)
+
+class SinkFanout:
+    """Sends every event to each sink. A failing sink does not affect the others."""
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    async def start(self):
+        for sink in self.sinks:
+            await sink.start()
+
+    async def emit(self, event):
+        for sink in self.sinks:
+            try:
+                await sink.send(event)
+            except Exception as e:
+                log.error("%s failed to handle event: %s", type(sink).__name__, e)
+
+    async def close(self):
+        for sink in self.sinks:
+            try:
+                await sink.close()
+            except Exception as e:
+                log.error("Error closing %s: %s", type(sink).__name__, e)
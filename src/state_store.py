@@ -0,0 +1,102 @@
+import os
+import sqlite3
+
+class StateStore:
+    """
+    SQLite checkpoint of the live states, per-channel dynamic windows and tracked reservations,
+    so a restart resumes with the previous state instead of re-syncing every channel.
+    Writes go into the open transaction and are only committed by flush().
+    """
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the SQLite database file. Created if missing.
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS live_state ("
+            "uid INTEGER PRIMARY KEY, room_id INTEGER, live_status INTEGER, title TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS dynamic_window (uid INTEGER PRIMARY KEY, recent TEXT)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reservation ("
+            "rid INTEGER PRIMARY KEY, uid INTEGER, dynamic_id TEXT, start_ts INTEGER, title TEXT, fingerprint INTEGER)"
+        )
+        # seen_dynamic, the format before dynamic_window, is read by load_legacy_seen() and
+        # dropped once the poller has moved its IDs into the channels' windows
+        self._conn.commit()
+        self._dirty = False
+
+    def load_live_states(self):
+        """Returns the stored LiveMonitor states keyed by UID."""
+        rows = self._conn.execute("SELECT uid, room_id, live_status, title FROM live_state")
+        return {
+            uid: {'room_id': room_id, 'live_status': live_status, 'title': title}
+            for uid, room_id, live_status, title in rows
+        }
+
+    def save_live_state(self, uid, state):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO live_state (uid, room_id, live_status, title) VALUES (?, ?, ?, ?)",
+            (uid, state.get('room_id'), state.get('live_status'), state.get('title'))
+        )
+        self._dirty = True
+
+    def load_dynamic_windows(self):
+        """Returns the recent processed dynamic IDs of each channel, keyed by UID."""
+        rows = self._conn.execute("SELECT uid, recent FROM dynamic_window")
+        return {uid: [int(i) for i in recent.split(",") if i] for uid, recent in rows}
+
+    def save_dynamic_window(self, uid, dynamic_ids):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO dynamic_window (uid, recent) VALUES (?, ?)",
+            (uid, ",".join(str(i) for i in dynamic_ids))
+        )
+        self._dirty = True
+
+    def load_legacy_seen(self):
+        """Returns the processed dynamic IDs of the old seen_dynamic table, if the database has one."""
+        exists = self._conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'seen_dynamic'").fetchone()
+        if not exists:
+            return []
+        return [int(row[0]) for row in self._conn.execute("SELECT dynamic_id FROM seen_dynamic") if str(row[0]).isdigit()]
+
+    def drop_legacy_seen(self):
+        self._conn.execute("DROP TABLE IF EXISTS seen_dynamic")
+        self._dirty = True
+
+    def load_reservations(self):
+        """Returns the ReservationStore entries."""
+        rows = self._conn.execute("SELECT rid, uid, dynamic_id, start_ts, title, fingerprint FROM reservation")
+        return [
+            {'rid': rid, 'uid': uid, 'dynamic_id': dynamic_id, 'start_ts': start_ts, 'title': title, 'fingerprint': fp}
+            for rid, uid, dynamic_id, start_ts, title, fp in rows
+        ]
+
+    def save_reservation(self, entry):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO reservation (rid, uid, dynamic_id, start_ts, title, fingerprint) VALUES (?, ?, ?, ?, ?, ?)",
+            (entry['rid'], entry['uid'], entry['dynamic_id'], entry['start_ts'], entry['title'], entry['fingerprint'])
+        )
+        self._dirty = True
+
+    def delete_reservation(self, rid):
+        self._conn.execute("DELETE FROM reservation WHERE rid = ?", (rid,))
+        self._dirty = True
+
+    def flush(self):
+        """Commits pending writes. Cheap when nothing changed since the last flush."""
+        if self._dirty:
+            self._conn.commit()
+            self._dirty = False
+
+    def close(self):
+        self.flush()
+        self._conn.close()
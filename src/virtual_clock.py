@@ -0,0 +1,70 @@
+import asyncio
+import selectors
+
+class _InstantSelector:
+    """
+    Selector wrapper for VirtualClock's event loop. When nothing is ready it moves the clock
+    to the loop's next timer instead of blocking until then.
+    """
+    def __init__(self, clock, selector):
+        self.clock = clock
+        self.selector = selector
+
+    def select(self, timeout=None):
+        if timeout is None:
+            # no timers pending, only I/O can wake the loop
+            return self.selector.select(None)
+        ready = self.selector.select(0)
+        if not ready and timeout > 0:
+            self.clock.elapsed += timeout
+        return ready
+
+    def __getattr__(self, name):
+        return getattr(self.selector, name)
+
+class _VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(_InstantSelector(clock, selectors.DefaultSelector()))
+        self.clock = clock
+
+    def time(self):
+        return self.clock.elapsed
+
+class VirtualClock:
+    """
+    Simulated time, for running the pollers and schedulers many times faster than real time.
+
+    run() executes a coroutine on an event loop whose timers fire in order without waiting:
+    whenever all tasks are blocked on a timer, the clock jumps ahead to the earliest one, so
+    asyncio.sleep(), wait_for() and everything built on them follow the clock. time() and
+    monotonic() are passed as the `clock` of the components under simulation.
+    Real I/O still works, but no time passes while waiting for it.
+    """
+    def __init__(self, start=0.0):
+        """
+        Args:
+            start (float): Unix time the simulation starts at, returned by time() before run().
+        """
+        self.start = start
+        self.elapsed = 0.0
+
+    def time(self):
+        """Simulated Unix time."""
+        return self.start + self.elapsed
+
+    def monotonic(self):
+        """Simulated seconds since the start."""
+        return self.elapsed
+
+    def run(self, coro):
+        """Runs a coroutine to completion in simulated time and returns its result."""
+        loop = _VirtualTimeLoop(self)
+        asyncio.set_event_loop(loop)
+        try:
+            return loop.run_until_complete(coro)
+        finally:
+            try:
+                loop.run_until_complete(loop.shutdown_asyncgens())
+            finally:
+                asyncio.set_event_loop(None)
+                loop.close()